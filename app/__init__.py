@@ -1,28 +1,36 @@
 from flask import Flask, jsonify
+import logging
 import os
 import sys
 from dotenv import load_dotenv
+from app.logging_config import configure_logging
 
-# Print debugging information
-print(f"Python version: {sys.version}")
-print(f"Current directory: {os.getcwd()}")
-print(f"Files in current directory: {os.listdir('.')}")
-print(f"Files in app directory: {os.listdir('./app')}")
-
-# Load environment variables
-print("Loading environment variables...")
+# Load environment variables before logging so LOG_LEVEL and friends apply
 load_dotenv()
+configure_logging()
+
+logger = logging.getLogger(__name__)
+
+# Startup details for debugging
+logger.debug("Python version: %s", sys.version)
+logger.debug("Current directory: %s", os.getcwd())
+logger.debug("Files in current directory: %s", os.listdir('.'))
+logger.debug("Files in app directory: %s", os.listdir('./app'))
 
 # Celery is initialized in celery_app.py
 
 def create_app():
-    print("Creating Flask application...")
+    logger.info("Creating Flask application...")
     app = Flask(__name__)
 
     # Configure the application
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-webreconlite')
     app.config['RESULTS_DIR'] = os.path.join(app.root_path, 'results')
     app.config['DEBUG'] = os.environ.get('DEBUG', 'False').lower() == 'true'
+    # Probe subdomains with Httpx while enumeration is still running
+    app.config['PIPELINE_PROBING'] = os.environ.get('PIPELINE_PROBING', 'True').lower() == 'true'
+    # Only probe new or stale subdomains unless a scan asks otherwise
+    app.config['INCREMENTAL_SCANS'] = os.environ.get('INCREMENTAL_SCANS', 'False').lower() == 'true'
 
     # Configure Celery
     app.config['CELERY_BROKER_URL'] = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -31,25 +39,29 @@ def create_app():
     app.config['CELERY_RESULT_SERIALIZER'] = 'json'
     app.config['CELERY_ACCEPT_CONTENT'] = ['json']
 
-    print(f"App config: SECRET_KEY={app.config['SECRET_KEY'][:5]}..., DEBUG={app.config['DEBUG']}")
+    logger.debug("App config: SECRET_KEY=%s..., DEBUG=%s", app.config['SECRET_KEY'][:5], app.config['DEBUG'])
 
     # Ensure results directory exists
-    print(f"Creating results directory: {app.config['RESULTS_DIR']}")
+    logger.debug("Creating results directory: %s", app.config['RESULTS_DIR'])
     os.makedirs(app.config['RESULTS_DIR'], exist_ok=True)
 
     # Initialize database
-    print("Initializing database...")
+    logger.debug("Initializing database...")
     from app.database import init_db
     if init_db():
-        print("Database initialized successfully")
+        logger.info("Database initialized successfully")
     else:
-        print("Failed to initialize database")
+        logger.error("Failed to initialize database")
+
+    # Scans left running by a worker that died have expired leases by now
+    from app.scan_registry import reap
+    reap(app.config['RESULTS_DIR'], force=True)
 
     # Register blueprints
-    print("Registering blueprints...")
+    logger.debug("Registering blueprints...")
     from app.routes import main
     app.register_blueprint(main)
-    print("Blueprints registered successfully")
+    logger.debug("Blueprints registered successfully")
 
     @app.route('/debug')
     def debug():
@@ -67,7 +79,6 @@ def create_app():
     @app.route('/db-status')
     def db_status():
         """Check the status of the database."""
-        import sqlite3
         from app.database import DB_FILE, get_db_connection
 
         # Check if the database file exists
@@ -107,5 +118,5 @@ def create_app():
     # Celery is initialized in celery_app.py
     # We'll set up Flask app context for Celery tasks in celery_worker.py
 
-    print("Flask application created successfully")
+    logger.info("Flask application created successfully")
     return app
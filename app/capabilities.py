@@ -0,0 +1,169 @@
+"""
+Tool capability registry.
+
+Each external tool is fingerprinted once (version and supported flags, read
+from its help output) and the result is persisted to disk keyed by binary
+path and modification time. The run_* functions in app.tools use it to pick
+the right invocation straight away instead of paying for a failed run every
+time they rediscover that a flag isn't supported. Upgrading a binary changes
+its mtime, which invalidates the stored fingerprint.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from app.orchestrator import orchestrator, resolver, ToolJob
+
+logger = logging.getLogger(__name__)
+
+# File the fingerprints are persisted to, shared by every worker
+CAPABILITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'capabilities.json')
+
+# Arguments that make each tool print its help text
+HELP_ARGS = {
+    'subfinder': ['-h'],
+    'assetfinder': ['-h'],
+    'chaos': ['-h'],
+    'sublist3r': ['-h'],
+    'httpx': ['-h'],
+    'gau': ['--help'],
+    'waybackurls': ['-h'],
+    'naabu': ['-h'],
+    'nmap': ['--help'],
+}
+
+# Arguments that make each tool print its version, where it has one
+VERSION_ARGS = {
+    'subfinder': ['-version'],
+    'chaos': ['-version'],
+    'httpx': ['-version'],
+    'gau': ['--version'],
+    'naabu': ['-version'],
+    'nmap': ['--version'],
+}
+
+# Seconds allowed for each help/version probe
+PROBE_TIMEOUT = 30
+
+FLAG_PATTERN = re.compile(r'(?<![\w-])(--?[a-zA-Z][\w-]*)')
+VERSION_PATTERN = re.compile(r'v?(\d+\.\d+(?:\.\d+)?)')
+
+_capabilities = None
+_lock = threading.Lock()
+
+
+def _load():
+    """Load persisted fingerprints from disk."""
+    try:
+        with open(CAPABILITIES_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save(capabilities):
+    """Persist fingerprints atomically so concurrent readers never see a partial file."""
+    os.makedirs(os.path.dirname(CAPABILITIES_FILE), exist_ok=True)
+    temp_file = f"{CAPABILITIES_FILE}.{os.getpid()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(capabilities, f, indent=2)
+    os.replace(temp_file, CAPABILITIES_FILE)
+
+
+def _run_probe(tool, path, args):
+    """Run a probe command and return its combined stdout/stderr."""
+    lines = []
+    job = ToolJob(f"{tool} probe", [path] + args, timeout=PROBE_TIMEOUT,
+                  line_callback=lines.append, merge_stderr=True)
+    orchestrator.run_job_sync(job)
+    return '\n'.join(lines)
+
+
+def fingerprint(tool, path):
+    """
+    Probe a tool binary for its version and supported flags.
+
+    Returns:
+        dict: path, mtime, version (or None) and a sorted list of flags
+    """
+    help_text = _run_probe(tool, path, HELP_ARGS.get(tool, ['-h']))
+    flags = sorted(set(FLAG_PATTERN.findall(help_text)))
+
+    version = None
+    if tool in VERSION_ARGS:
+        match = VERSION_PATTERN.search(_run_probe(tool, path, VERSION_ARGS[tool]))
+        if match:
+            version = match.group(1)
+
+    logger.info("capabilities: %s at %s: version %s, %s flags", tool, path, version, len(flags))
+    return {
+        'path': path,
+        'mtime': os.path.getmtime(path),
+        'version': version,
+        'flags': flags
+    }
+
+
+def get_capabilities(tool):
+    """
+    Get the fingerprint for a tool, probing it only if it is unknown or changed.
+
+    Returns:
+        dict: The fingerprint, or None if the tool is not installed
+    """
+    global _capabilities
+
+    path = resolver.resolve(tool)
+    if not path:
+        return None
+    mtime = os.path.getmtime(path)
+
+    with _lock:
+        if _capabilities is None:
+            _capabilities = _load()
+        entry = _capabilities.get(tool)
+        if entry and entry.get('path') == path and entry.get('mtime') == mtime:
+            return entry
+
+        # Another worker may have fingerprinted it since we loaded the file
+        entry = _load().get(tool)
+        if entry and entry.get('path') == path and entry.get('mtime') == mtime:
+            _capabilities[tool] = entry
+            return entry
+
+        entry = fingerprint(tool, path)
+        _capabilities = _load()
+        _capabilities[tool] = entry
+        try:
+            _save(_capabilities)
+        except OSError as e:
+            logger.info("capabilities: Could not persist fingerprints: %s", e)
+        return entry
+
+
+def has_flag(tool, *flags):
+    """Check whether a tool supports any of the given flags."""
+    entry = get_capabilities(tool)
+    if not entry:
+        return False
+    return any(flag in entry['flags'] for flag in flags)
+
+
+def get_version(tool):
+    """Get a tool's version string, or None if unknown."""
+    entry = get_capabilities(tool)
+    return entry['version'] if entry else None
+
+
+def fingerprint_all():
+    """Fingerprint every known tool; run once at worker start."""
+    results = {}
+    for tool in HELP_ARGS:
+        try:
+            results[tool] = get_capabilities(tool)
+        except Exception as e:
+            logger.error("capabilities: Failed to fingerprint %s: %s", tool, e)
+            results[tool] = None
+    return results
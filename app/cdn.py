@@ -0,0 +1,69 @@
+"""
+CDN address ranges.
+
+Port scanning a CDN edge only finds the CDN's own listeners, and every
+customer behind it shares them, so by default addresses in these ranges are
+not scanned and are only flagged IsCDN in the IPS table (set
+NAABU_SKIP_CDN=false to scan them anyway). The built-in
+list covers Cloudflare and Fastly from their published ranges; more CIDRs
+can be added, one per line, in the file named by CDN_RANGES_FILE.
+"""
+
+import ipaddress
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_CDN_RANGES = (
+    # Cloudflare
+    '173.245.48.0/20', '103.21.244.0/22', '103.22.200.0/22', '103.31.4.0/22',
+    '141.101.64.0/18', '108.162.192.0/18', '190.93.240.0/20', '188.114.96.0/20',
+    '197.234.240.0/22', '198.41.128.0/17', '162.158.0.0/15', '104.16.0.0/13',
+    '104.24.0.0/14', '172.64.0.0/13', '131.0.72.0/22',
+    '2400:cb00::/32', '2606:4700::/32', '2803:f800::/32', '2405:b500::/32',
+    '2405:8100::/32', '2a06:98c0::/29', '2c0f:f248::/32',
+    # Fastly
+    '23.235.32.0/20', '43.249.72.0/22', '103.244.50.0/24', '103.245.222.0/23',
+    '103.245.224.0/24', '104.156.80.0/20', '140.248.64.0/18', '140.248.128.0/17',
+    '146.75.0.0/17', '151.101.0.0/16', '157.52.64.0/18', '167.82.0.0/17',
+    '167.82.128.0/20', '167.82.160.0/20', '167.82.224.0/20', '172.111.64.0/18',
+    '185.31.16.0/22', '199.27.72.0/21', '199.232.0.0/16',
+)
+
+_networks = []
+
+
+def cdn_skip_enabled():
+    return os.environ.get('NAABU_SKIP_CDN', 'True').lower() == 'true'
+
+
+def load_cdn_ranges():
+    """The built-in ranges plus any listed in CDN_RANGES_FILE."""
+    specs = list(BUILTIN_CDN_RANGES)
+    ranges_file = os.environ.get('CDN_RANGES_FILE')
+    if ranges_file:
+        try:
+            with open(ranges_file, 'r') as f:
+                specs.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        except OSError as e:
+            logger.error("cdn: Could not read CDN_RANGES_FILE %s: %s", ranges_file, e)
+
+    networks = []
+    for spec in specs:
+        try:
+            networks.append(ipaddress.ip_network(spec, strict=False))
+        except ValueError:
+            logger.error("cdn: Ignoring invalid CDN range %s", spec)
+    return networks
+
+
+def is_cdn_address(address):
+    """Whether an IP address belongs to a known CDN."""
+    if not _networks:
+        _networks.extend(load_cdn_ranges())
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _networks if network.version == ip.version)
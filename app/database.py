@@ -1,11 +1,141 @@
+import json
+import logging
 import os
 import sqlite3
 from sqlite3 import Error
+import threading
 import time
+from app.logging_config import log_sampled
+
+logger = logging.getLogger(__name__)
 
 # Database file path
 DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'webreconlite.db')
 
+# Seconds a connection waits on a lock held by another process before failing
+BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', 30))
+
+# Applied to every pooled connection. WAL lets the gunicorn and Celery workers
+# read while one of them writes, and synchronous=NORMAL is safe under WAL.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # 20 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Schema migrations, applied in order by init_db after the base tables exist.
+# PRAGMA user_version records how many have been applied to a database.
+MIGRATIONS = [
+    # 1: Covering indexes for the history queries. UNIQUE(SID, link) and
+    # UNIQUE(SID, port) already serve the GAU and Naabu lookups.
+    [
+        """CREATE INDEX IF NOT EXISTS idx_subdomains_domain
+           ON SUBDOMAINS(DomainID, Subdomain, StatusCode, Technology, GauScanned, NaabuScanned, NucleiScanned)""",
+        "CREATE INDEX IF NOT EXISTS idx_nuclei_sid ON NUCLEI_TABLE(SID, severity DESC, vulnerability)",
+    ],
+    # 2: Per-domain subdomain count kept up to date by triggers, so the domain
+    # list doesn't have to join every subdomain
+    [
+        "ALTER TABLE DOMAINS ADD COLUMN SubdomainCount INTEGER NOT NULL DEFAULT 0",
+        "UPDATE DOMAINS SET SubdomainCount = (SELECT COUNT(*) FROM SUBDOMAINS WHERE DomainID = DOMAINS.ID)",
+        """CREATE TRIGGER IF NOT EXISTS trg_subdomains_insert AFTER INSERT ON SUBDOMAINS
+           BEGIN
+               UPDATE DOMAINS SET SubdomainCount = SubdomainCount + 1 WHERE ID = NEW.DomainID;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_subdomains_delete AFTER DELETE ON SUBDOMAINS
+           BEGIN
+               UPDATE DOMAINS SET SubdomainCount = SubdomainCount - 1 WHERE ID = OLD.DomainID;
+           END""",
+        "CREATE INDEX IF NOT EXISTS idx_domains_summary ON DOMAINS(Domain, SubdomainCount)",
+    ],
+    # 3: Registry of running scans shared by every web and Celery worker, with
+    # a lease the owner keeps renewing so abandoned scans can be reaped
+    [
+        """CREATE TABLE IF NOT EXISTS SCANS (
+               SessionID TEXT PRIMARY KEY,
+               Domain TEXT NOT NULL,
+               TaskID TEXT,
+               Status TEXT NOT NULL,
+               Owner TEXT,
+               StartedAt REAL NOT NULL,
+               HeartbeatAt REAL NOT NULL,
+               LeaseExpiresAt REAL NOT NULL,
+               CancelRequested INTEGER NOT NULL DEFAULT 0
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_scans_lease ON SCANS(Status, LeaseExpiresAt)",
+    ],
+    # 4: When each subdomain was last probed, so incremental scans can skip
+    # the ones probed recently
+    [
+        "ALTER TABLE SUBDOMAINS ADD COLUMN LastProbedAt REAL",
+    ],
+    # 5: What each subdomain resolved to at its last scan, as comma-separated
+    # addresses and the CNAME chain in order
+    [
+        "ALTER TABLE SUBDOMAINS ADD COLUMN A TEXT",
+        "ALTER TABLE SUBDOMAINS ADD COLUMN AAAA TEXT",
+        "ALTER TABLE SUBDOMAINS ADD COLUMN CNAME TEXT",
+        "ALTER TABLE SUBDOMAINS ADD COLUMN ResolvedAt REAL",
+    ],
+    # 6: Port scans by IP address. Subdomains map to the IPv4 addresses they
+    # resolve to, each address is scanned once and its ports are copied to
+    # every subdomain behind it in NAABU_TABLE
+    [
+        """CREATE TABLE IF NOT EXISTS IPS (
+               ID INTEGER PRIMARY KEY AUTOINCREMENT,
+               Address TEXT NOT NULL UNIQUE,
+               IsCDN INTEGER NOT NULL DEFAULT 0,
+               PortsScannedAt REAL
+           )""",
+        """CREATE TABLE IF NOT EXISTS SUBDOMAIN_IPS (
+               SID INTEGER NOT NULL,
+               IPID INTEGER NOT NULL,
+               PRIMARY KEY (SID, IPID),
+               FOREIGN KEY (SID) REFERENCES SUBDOMAINS(ID),
+               FOREIGN KEY (IPID) REFERENCES IPS(ID)
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_subdomain_ips_ip ON SUBDOMAIN_IPS(IPID, SID)",
+        """CREATE TABLE IF NOT EXISTS IP_PORTS (
+               IPID INTEGER NOT NULL,
+               port INTEGER NOT NULL,
+               PRIMARY KEY (IPID, port),
+               FOREIGN KEY (IPID) REFERENCES IPS(ID)
+           ) WITHOUT ROWID""",
+    ],
+    # 7: Subdomains a running scan has already handed to Httpx, so the
+    # enumerator tasks probing in parallel never probe a name twice
+    [
+        """CREATE TABLE IF NOT EXISTS SCAN_HOSTS (
+               SessionID TEXT NOT NULL,
+               Subdomain TEXT NOT NULL,
+               PRIMARY KEY (SessionID, Subdomain)
+           ) WITHOUT ROWID""",
+    ],
+]
+
+# Scan registry statuses of scans that are still in progress
+ACTIVE_SCAN_STATUSES = ('queued', 'running')
+
+_local = threading.local()
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection that is kept open and reused by its thread.
+
+    The functions in this module call close() when they are done; for a pooled
+    connection that only rolls back anything left uncommitted, so the next
+    caller on the thread starts from a clean state.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
 def ensure_data_dir():
     """Ensure the data directory exists"""
     data_dir = os.path.dirname(DB_FILE)
@@ -13,21 +143,33 @@ def ensure_data_dir():
         os.makedirs(data_dir)
 
 def get_db_connection():
-    """Create a database connection to the SQLite database"""
+    """Get this thread's pooled connection to the SQLite database"""
+    conn = getattr(_local, 'conn', None)
+    # A connection inherited across fork() must not be used by the child
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
     ensure_data_dir()
-    conn = None
     try:
-        print(f"Connecting to database at {DB_FILE}")
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT, factory=PooledConnection)
         conn.row_factory = sqlite3.Row  # This enables column access by name
-        print(f"Successfully connected to database")
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        logger.info("Opened database connection to %s (pid %s, thread %s)", DB_FILE, os.getpid(), threading.current_thread().name)
         return conn
     except Error as e:
-        print(f"Error connecting to database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error connecting to database: %s", e)
         return None
 
+def close_db_connection():
+    """Close this thread's pooled connection, if it has one"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close_for_real()
+    _local.conn = None
+
 def init_db():
     """Initialize the database with the required tables"""
     conn = get_db_connection()
@@ -101,42 +243,61 @@ def init_db():
         ''')
 
         conn.commit()
-        print("Database initialized successfully")
+        migrate_db(conn)
+        logger.info("Database initialized successfully")
         return True
     except Error as e:
-        print(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
         return False
     finally:
         if conn:
             conn.close()
 
+def migrate_db(conn):
+    """Apply any MIGRATIONS this database hasn't seen yet"""
+    cursor = conn.cursor()
+    for number, statements in enumerate(MIGRATIONS, start=1):
+        # Lock first so concurrent workers starting up apply each migration once
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= number:
+                conn.rollback()
+                continue
+            logger.info("Applying database migration %s", number)
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+
 # Domain operations
 def add_domain(domain):
     """Add a domain to the database if it doesn't exist"""
-    print(f"Adding domain to database: {domain}")
+    logger.info("Adding domain to database: %s", domain)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for adding domain: {domain}")
+        logger.error("Failed to get database connection for adding domain: %s", domain)
         return None
 
     try:
         cursor = conn.cursor()
-        print(f"Executing INSERT OR IGNORE for domain: {domain}")
+        logger.debug("Executing INSERT OR IGNORE for domain: %s", domain)
         cursor.execute("INSERT OR IGNORE INTO DOMAINS (Domain) VALUES (?)", (domain,))
         conn.commit()
-        print(f"Committed domain insert for: {domain}")
+        logger.debug("Committed domain insert for: %s", domain)
 
         # Get the domain ID (either newly inserted or existing)
-        print(f"Querying for domain ID for: {domain}")
+        logger.debug("Querying for domain ID for: %s", domain)
         cursor.execute("SELECT ID FROM DOMAINS WHERE Domain = ?", (domain,))
         domain_id = cursor.fetchone()
         result = domain_id[0] if domain_id else None
-        print(f"Domain ID for {domain}: {result}")
+        logger.debug("Domain ID for %s: %s", domain, result)
         return result
     except Error as e:
-        print(f"Error adding domain: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error adding domain: %s", e)
         return None
     finally:
         if conn:
@@ -154,7 +315,25 @@ def get_domain_id(domain):
         result = cursor.fetchone()
         return result[0] if result else None
     except Error as e:
-        print(f"Error getting domain ID: {e}")
+        logger.error("Error getting domain ID: %s", e)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def get_domain(domain_id):
+    """Get a domain's name and subdomain count by ID"""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ID, Domain, SubdomainCount FROM DOMAINS WHERE ID = ?", (domain_id,))
+        result = cursor.fetchone()
+        return dict(result) if result else None
+    except Error as e:
+        logger.error("Error getting domain: %s", e)
         return None
     finally:
         if conn:
@@ -163,36 +342,244 @@ def get_domain_id(domain):
 # Subdomain operations
 def add_subdomain(domain_id, subdomain, status_code=None, technology=None):
     """Add a subdomain to the database if it doesn't exist"""
-    print(f"Adding subdomain to database: {subdomain} (Domain ID: {domain_id}, Status: {status_code}, Tech: {technology})")
+    log_sampled(logger, logging.INFO, "Adding subdomain to database: %s (Domain ID: %s, Status: %s, Tech: %s)", subdomain, domain_id, status_code, technology)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for adding subdomain: {subdomain}")
+        logger.error("Failed to get database connection for adding subdomain: %s", subdomain)
         return None
 
     try:
         cursor = conn.cursor()
-        print(f"Executing INSERT OR IGNORE for subdomain: {subdomain}")
+        logger.debug("Executing INSERT OR IGNORE for subdomain: %s", subdomain)
         cursor.execute(
             "INSERT OR IGNORE INTO SUBDOMAINS (DomainID, Subdomain, StatusCode, Technology) VALUES (?, ?, ?, ?)",
             (domain_id, subdomain, status_code, technology)
         )
         conn.commit()
-        print(f"Committed subdomain insert for: {subdomain}")
+        logger.debug("Committed subdomain insert for: %s", subdomain)
 
         # Get the subdomain ID (either newly inserted or existing)
-        print(f"Querying for subdomain ID for: {subdomain}")
+        logger.debug("Querying for subdomain ID for: %s", subdomain)
         cursor.execute(
             "SELECT ID FROM SUBDOMAINS WHERE DomainID = ? AND Subdomain = ?",
             (domain_id, subdomain)
         )
         subdomain_id = cursor.fetchone()
         result = subdomain_id[0] if subdomain_id else None
-        print(f"Subdomain ID for {subdomain}: {result}")
+        logger.debug("Subdomain ID for %s: %s", subdomain, result)
+        return result
+    except Error as e:
+        logger.exception("Error adding subdomain: %s", e)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def upsert_subdomains(domain_id, records):
+    """
+    Insert or update many subdomains of a domain in a single transaction.
+
+    records is an iterable of subdomain names or of dicts with a 'subdomain'
+    key and optional 'status_code' and 'technology'. Existing rows keep their
+    status code and technology unless a record provides new ones.
+
+    Returns:
+        dict: Subdomain name -> ID for every record
+    """
+    rows = []
+    for record in records:
+        if isinstance(record, str):
+            rows.append((domain_id, record, None, None))
+        else:
+            rows.append((domain_id, record['subdomain'], record.get('status_code'), record.get('technology')))
+    if not rows:
+        return {}
+
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for upserting %s subdomains", len(rows))
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO SUBDOMAINS (DomainID, Subdomain, StatusCode, Technology) VALUES (?, ?, ?, ?)
+            ON CONFLICT(DomainID, Subdomain) DO UPDATE SET
+                StatusCode = COALESCE(excluded.StatusCode, StatusCode),
+                Technology = COALESCE(excluded.Technology, Technology)
+            WHERE excluded.StatusCode IS NOT NULL OR excluded.Technology IS NOT NULL
+        """, rows)
+        conn.commit()
+
+        names = {row[1] for row in rows}
+        cursor.execute("SELECT ID, Subdomain FROM SUBDOMAINS WHERE DomainID = ?", (domain_id,))
+        result = {row['Subdomain']: row['ID'] for row in cursor if row['Subdomain'] in names}
+        logger.info("Upserted %s subdomains for domain ID %s", len(rows), domain_id)
         return result
     except Error as e:
-        print(f"Error adding subdomain: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error upserting subdomains: %s", e)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+def diff_subdomains(domain_id, subdomains, stale_before):
+    """
+    Compare a freshly enumerated subdomain list with the ones stored for a domain.
+
+    Returns:
+        dict: 'added' (not stored yet), 'removed' (stored but not enumerated
+        this time) and 'stale' (stored but never probed, or last probed
+        before the stale_before timestamp) subdomain names
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    try:
+        cursor = conn.execute("SELECT Subdomain, LastProbedAt FROM SUBDOMAINS WHERE DomainID = ?", (domain_id,))
+        known = {row['Subdomain']: row['LastProbedAt'] for row in cursor}
+    except Error as e:
+        logger.error("Error diffing subdomains for domain ID %s: %s", domain_id, e)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+    names = list(dict.fromkeys(subdomains))
+    enumerated = set(names)
+    return {
+        'added': [name for name in names if name not in known],
+        'removed': sorted(name for name in known if name not in enumerated),
+        'stale': [name for name in names
+                  if name in known and (known[name] is None or known[name] < stale_before)]
+    }
+
+def record_probe_results(domain_id, probed, live_hosts, probed_at=None):
+    """
+    Store the outcome of probing subdomains and stamp them with LastProbedAt.
+
+    live_hosts is a list of dicts with 'subdomain', 'status_code' and
+    'technology'. Probed subdomains that aren't among them are stored as not
+    live (no status code or technology).
+
+    Returns:
+        list: A dict with 'subdomain', 'old' and 'new' for every stored
+        subdomain whose status code or technology changed
+    """
+    probed_at = probed_at or time.time()
+    results = {name: (None, None) for name in probed}
+    for host in live_hosts:
+        results[host['subdomain']] = (host.get('status_code'), host.get('technology'))
+    if not results:
+        return []
+
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for recording %s probe results", len(results))
+        return []
+
+    try:
+        cursor = conn.cursor()
+        names = list(results)
+        previous = {}
+        # Stay well below SQLite's bound parameter limit
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT Subdomain, StatusCode, Technology FROM SUBDOMAINS WHERE DomainID = ? AND Subdomain IN ({placeholders})",
+                [domain_id] + chunk
+            )
+            for row in cursor.fetchall():
+                previous[row['Subdomain']] = (row['StatusCode'], row['Technology'])
+
+        cursor.executemany("""
+            INSERT INTO SUBDOMAINS (DomainID, Subdomain, StatusCode, Technology, LastProbedAt) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(DomainID, Subdomain) DO UPDATE SET
+                StatusCode = excluded.StatusCode,
+                Technology = excluded.Technology,
+                LastProbedAt = excluded.LastProbedAt
+        """, [(domain_id, name, status_code, technology, probed_at)
+              for name, (status_code, technology) in results.items()])
+        conn.commit()
+        logger.info("Recorded probe results for %s subdomains of domain ID %s", len(results), domain_id)
+
+        changes = []
+        for name, new in results.items():
+            old = previous.get(name)
+            if old is not None and old != new:
+                changes.append({
+                    'subdomain': name,
+                    'old': {'status_code': old[0], 'technology': old[1]},
+                    'new': {'status_code': new[0], 'technology': new[1]}
+                })
+        return changes
+    except Error as e:
+        logger.exception("Error recording probe results: %s", e)
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+def record_dns_results(domain_id, answers, resolved_at=None):
+    """
+    Store what subdomains resolved to and stamp them with ResolvedAt.
+
+    answers maps each subdomain to a dict with 'a', 'aaaa' and 'cname'
+    lists; empty lists are stored as NULL.
+
+    Returns:
+        int: The number of subdomains stored
+    """
+    if not answers:
+        return 0
+    resolved_at = resolved_at or time.time()
+
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for recording %s DNS results", len(answers))
+        return 0
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO SUBDOMAINS (DomainID, Subdomain, A, AAAA, CNAME, ResolvedAt) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(DomainID, Subdomain) DO UPDATE SET
+                A = excluded.A,
+                AAAA = excluded.AAAA,
+                CNAME = excluded.CNAME,
+                ResolvedAt = excluded.ResolvedAt
+        """, [(domain_id, name,
+               ','.join(answer['a']) or None,
+               ','.join(answer['aaaa']) or None,
+               ','.join(answer['cname']) or None,
+               resolved_at)
+              for name, answer in answers.items()])
+        conn.commit()
+        logger.info("Recorded DNS results for %s subdomains of domain ID %s", len(answers), domain_id)
+        return len(answers)
+    except Error as e:
+        logger.exception("Error recording DNS results: %s", e)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def get_probed_subdomains(domain_id, probed_after):
+    """Names of a domain's subdomains last probed at or after the probed_after timestamp"""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    try:
+        cursor = conn.execute(
+            "SELECT Subdomain FROM SUBDOMAINS WHERE DomainID = ? AND LastProbedAt >= ?",
+            (domain_id, probed_after)
+        )
+        return {row['Subdomain'] for row in cursor}
+    except Error as e:
+        logger.error("Error getting probed subdomains for domain ID %s: %s", domain_id, e)
         return None
     finally:
         if conn:
@@ -213,47 +600,104 @@ def get_subdomain_id(domain_id, subdomain):
         result = cursor.fetchone()
         return result[0] if result else None
     except Error as e:
-        print(f"Error getting subdomain ID: {e}")
+        logger.error("Error getting subdomain ID: %s", e)
         return None
     finally:
         if conn:
             conn.close()
 
+def get_subdomain_ids(domain_id, subdomains):
+    """Get a name -> ID map for many subdomains of a domain in one pass"""
+    if not subdomains:
+        return {}
+
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        result = {}
+        # Stay well below SQLite's bound parameter limit
+        names = list(subdomains)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT ID, Subdomain FROM SUBDOMAINS WHERE DomainID = ? AND Subdomain IN ({placeholders})",
+                [domain_id] + chunk
+            )
+            for row in cursor.fetchall():
+                result[row['Subdomain']] = row['ID']
+        return result
+    except Error as e:
+        logger.error("Error getting subdomain IDs: %s", e)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+def update_subdomains_scan_status(subdomain_ids, scan_type, status=1):
+    """Update the scan status of many subdomains in one transaction"""
+    if scan_type not in ['GauScanned', 'NaabuScanned', 'NucleiScanned']:
+        logger.error("Invalid scan type: %s", scan_type)
+        return False
+    if not subdomain_ids:
+        return True
+
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE SUBDOMAINS SET {scan_type} = ? WHERE ID = ?",
+            [(status, subdomain_id) for subdomain_id in subdomain_ids]
+        )
+        conn.commit()
+        logger.info("Updated %s = %s for %s subdomains", scan_type, status, len(subdomain_ids))
+        return True
+    except Error as e:
+        logger.error("Error updating subdomain scan status batch: %s", e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
 def update_subdomain_scan_status(subdomain_id, scan_type, status=1):
     """Update the scan status of a subdomain"""
-    print(f"Updating scan status for subdomain ID {subdomain_id}: {scan_type} = {status}")
+    logger.info("Updating scan status for subdomain ID %s: %s = %s", subdomain_id, scan_type, status)
     if scan_type not in ['GauScanned', 'NaabuScanned', 'NucleiScanned']:
-        print(f"Invalid scan type: {scan_type}")
+        logger.error("Invalid scan type: %s", scan_type)
         return False
 
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for updating scan status")
+        logger.error("Failed to get database connection for updating scan status")
         return False
 
     try:
         cursor = conn.cursor()
-        print(f"Executing UPDATE for subdomain ID {subdomain_id}: {scan_type} = {status}")
+        logger.debug("Executing UPDATE for subdomain ID %s: %s = %s", subdomain_id, scan_type, status)
         cursor.execute(
             f"UPDATE SUBDOMAINS SET {scan_type} = ? WHERE ID = ?",
             (status, subdomain_id)
         )
         conn.commit()
-        print(f"Committed scan status update for subdomain ID {subdomain_id}")
+        logger.debug("Committed scan status update for subdomain ID %s", subdomain_id)
 
         # Verify the update was successful
         cursor.execute(f"SELECT {scan_type} FROM SUBDOMAINS WHERE ID = ?", (subdomain_id,))
         result = cursor.fetchone()
         if result and result[0] == status:
-            print(f"Verified scan status update for subdomain ID {subdomain_id}: {scan_type} = {result[0]}")
+            logger.debug("Verified scan status update for subdomain ID %s: %s = %s", subdomain_id, scan_type, result[0])
             return True
         else:
-            print(f"Failed to verify scan status update for subdomain ID {subdomain_id}")
+            logger.error("Failed to verify scan status update for subdomain ID %s", subdomain_id)
             return False
     except Error as e:
-        print(f"Error updating subdomain scan status: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating subdomain scan status: %s", e)
         return False
     finally:
         if conn:
@@ -261,11 +705,11 @@ def update_subdomain_scan_status(subdomain_id, scan_type, status=1):
 
 def update_subdomain_info(subdomain_id, status_code=None, technology=None):
     """Update the status code and technology information for a subdomain"""
-    print(f"Updating info for subdomain ID {subdomain_id}: Status={status_code}, Tech={technology}")
+    log_sampled(logger, logging.INFO, "Updating info for subdomain ID %s: Status=%s, Tech=%s", subdomain_id, status_code, technology)
 
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for updating subdomain info")
+        logger.error("Failed to get database connection for updating subdomain info")
         return False
 
     try:
@@ -284,7 +728,7 @@ def update_subdomain_info(subdomain_id, status_code=None, technology=None):
             params.append(technology)
 
         if not update_fields:
-            print("No fields to update")
+            logger.debug("No fields to update")
             return True
 
         # Add the subdomain ID to the parameters
@@ -292,7 +736,7 @@ def update_subdomain_info(subdomain_id, status_code=None, technology=None):
 
         # Execute the update query
         query = f"UPDATE SUBDOMAINS SET {', '.join(update_fields)} WHERE ID = ?"
-        print(f"Executing query: {query} with params: {params}")
+        logger.debug("Executing query: %s with params: %s", query, params)
         cursor.execute(query, params)
         conn.commit()
 
@@ -300,15 +744,13 @@ def update_subdomain_info(subdomain_id, status_code=None, technology=None):
         cursor.execute("SELECT StatusCode, Technology FROM SUBDOMAINS WHERE ID = ?", (subdomain_id,))
         result = cursor.fetchone()
         if result:
-            print(f"Updated subdomain info: Status={result['StatusCode']}, Tech={result['Technology']}")
+            logger.debug("Updated subdomain info: Status=%s, Tech=%s", result['StatusCode'], result['Technology'])
             return True
         else:
-            print(f"Failed to verify subdomain info update for ID {subdomain_id}")
+            logger.error("Failed to verify subdomain info update for ID %s", subdomain_id)
             return False
     except Error as e:
-        print(f"Error updating subdomain info: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating subdomain info: %s", e)
         return False
     finally:
         if conn:
@@ -330,7 +772,7 @@ def add_gau_result(subdomain_id, link):
         conn.commit()
         return True
     except Error as e:
-        print(f"Error adding GAU result: {e}")
+        logger.error("Error adding GAU result: %s", e)
         return False
     finally:
         if conn:
@@ -356,7 +798,34 @@ def add_gau_results_batch(subdomain_id, links):
         conn.commit()
         return True
     except Error as e:
-        print(f"Error adding GAU results batch: {e}")
+        logger.error("Error adding GAU results batch: %s", e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def add_gau_results_bulk(results):
+    """
+    Add GAU results for many subdomains in a single transaction.
+
+    results is an iterable of (subdomain_id, link) pairs; it is consumed
+    lazily, so a generator over a large output file is never held in memory.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO GAU_TABLE (SID, link) VALUES (?, ?)",
+            results
+        )
+        conn.commit()
+        return True
+    except Error as e:
+        logger.error("Error adding GAU results bulk: %s", e)
+        conn.rollback()
         return False
     finally:
         if conn:
@@ -378,7 +847,7 @@ def add_naabu_result(subdomain_id, port):
         conn.commit()
         return True
     except Error as e:
-        print(f"Error adding NAABU result: {e}")
+        logger.error("Error adding NAABU result: %s", e)
         return False
     finally:
         if conn:
@@ -404,12 +873,215 @@ def add_naabu_results_batch(subdomain_id, ports):
         conn.commit()
         return True
     except Error as e:
-        print(f"Error adding NAABU results batch: {e}")
+        logger.error("Error adding NAABU results batch: %s", e)
         return False
     finally:
         if conn:
             conn.close()
 
+# IP operations
+def map_subdomain_ips(subdomain_ips, cdn_addresses=()):
+    """
+    Record the addresses subdomains resolve to, replacing their old mapping.
+
+    subdomain_ips maps subdomain IDs to lists of IP addresses; addresses in
+    cdn_addresses are flagged IsCDN.
+
+    Returns:
+        dict: Address -> IP ID for every address given
+    """
+    if not subdomain_ips:
+        return {}
+
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for mapping %s subdomains to IPs", len(subdomain_ips))
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        cdn_addresses = set(cdn_addresses)
+        addresses = sorted({address for ips in subdomain_ips.values() for address in ips})
+        cursor.executemany("""
+            INSERT INTO IPS (Address, IsCDN) VALUES (?, ?)
+            ON CONFLICT(Address) DO UPDATE SET IsCDN = excluded.IsCDN
+        """, [(address, int(address in cdn_addresses)) for address in addresses])
+
+        ip_ids = {}
+        # Stay well below SQLite's bound parameter limit
+        for i in range(0, len(addresses), 500):
+            chunk = addresses[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT ID, Address FROM IPS WHERE Address IN ({placeholders})", chunk)
+            for row in cursor.fetchall():
+                ip_ids[row['Address']] = row['ID']
+
+        cursor.executemany("DELETE FROM SUBDOMAIN_IPS WHERE SID = ?", [(sid,) for sid in subdomain_ips])
+        cursor.executemany(
+            "INSERT OR IGNORE INTO SUBDOMAIN_IPS (SID, IPID) VALUES (?, ?)",
+            [(sid, ip_ids[address]) for sid, ips in subdomain_ips.items() for address in ips]
+        )
+        conn.commit()
+        logger.info("Mapped %s subdomains to %s IPs", len(subdomain_ips), len(ip_ids))
+        return ip_ids
+    except Error as e:
+        logger.exception("Error mapping subdomains to IPs: %s", e)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+def get_ip_ids(addresses):
+    """Get an address -> ID map for the given IPs that are stored"""
+    if not addresses:
+        return {}
+
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        result = {}
+        addresses = list(addresses)
+        for i in range(0, len(addresses), 500):
+            chunk = addresses[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT ID, Address FROM IPS WHERE Address IN ({placeholders})", chunk)
+            for row in cursor.fetchall():
+                result[row['Address']] = row['ID']
+        return result
+    except Error as e:
+        logger.error("Error getting IP IDs: %s", e)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+def get_ip_ports(ip_ids, scanned_after):
+    """
+    Get the stored ports of IPs port scanned since scanned_after.
+
+    Returns:
+        dict: IP ID -> sorted ports, only for IPs scanned recently enough
+    """
+    if not ip_ids:
+        return {}
+
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+
+    try:
+        cursor = conn.cursor()
+        result = {}
+        ids = list(ip_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT ID FROM IPS WHERE ID IN ({placeholders}) AND PortsScannedAt >= ?",
+                chunk + [scanned_after]
+            )
+            for row in cursor.fetchall():
+                result[row['ID']] = []
+            cursor.execute(
+                f"SELECT IPID, port FROM IP_PORTS WHERE IPID IN ({placeholders}) ORDER BY IPID, port",
+                chunk
+            )
+            for row in cursor.fetchall():
+                if row['IPID'] in result:
+                    result[row['IPID']].append(row['port'])
+        return result
+    except Error as e:
+        logger.error("Error getting IP ports: %s", e)
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+def record_ip_ports(ports_by_ip, scanned_at=None):
+    """
+    Store the open ports found on IPs, replacing their previous ports.
+
+    PortsScannedAt is stamped so the ports can be reused for a while; use
+    fan_out_ip_ports to copy them to the subdomains behind the IPs.
+
+    Returns:
+        bool: Whether the ports were stored
+    """
+    if not ports_by_ip:
+        return True
+    scanned_at = scanned_at or time.time()
+
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM IP_PORTS WHERE IPID = ?", [(ip_id,) for ip_id in ports_by_ip])
+        cursor.executemany(
+            "INSERT OR IGNORE INTO IP_PORTS (IPID, port) VALUES (?, ?)",
+            [(ip_id, port) for ip_id, ports in ports_by_ip.items() for port in ports]
+        )
+        cursor.executemany("UPDATE IPS SET PortsScannedAt = ? WHERE ID = ?",
+                           [(scanned_at, ip_id) for ip_id in ports_by_ip])
+        conn.commit()
+        return True
+    except Error as e:
+        logger.error("Error recording IP ports: %s", e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def fan_out_ip_ports(ip_ids):
+    """
+    Copy the stored ports of IPs to every subdomain mapped to them.
+
+    The ports go into NAABU_TABLE and the subdomains are marked NaabuScanned;
+    subdomains behind IPs without stored ports are left as they are.
+
+    Returns:
+        int: The number of subdomains updated
+    """
+    if not ip_ids:
+        return 0
+
+    conn = get_db_connection()
+    if conn is None:
+        return 0
+
+    try:
+        cursor = conn.cursor()
+        subdomain_ids = set()
+        ids = list(ip_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO NAABU_TABLE (SID, port)
+                SELECT m.SID, p.port FROM SUBDOMAIN_IPS m JOIN IP_PORTS p ON p.IPID = m.IPID
+                WHERE m.IPID IN ({placeholders})
+            """, chunk)
+            cursor.execute(f"""
+                SELECT DISTINCT m.SID FROM SUBDOMAIN_IPS m
+                WHERE m.IPID IN ({placeholders}) AND EXISTS (SELECT 1 FROM IP_PORTS p WHERE p.IPID = m.IPID)
+            """, chunk)
+            subdomain_ids.update(row['SID'] for row in cursor.fetchall())
+        cursor.executemany("UPDATE SUBDOMAINS SET NaabuScanned = 1 WHERE ID = ?",
+                           [(subdomain_id,) for subdomain_id in subdomain_ids])
+        conn.commit()
+        logger.info("Copied the ports of %s IPs to %s subdomains", len(ids), len(subdomain_ids))
+        return len(subdomain_ids)
+    except Error as e:
+        logger.error("Error copying IP ports to subdomains: %s", e)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
 # NUCLEI operations
 def add_nuclei_result(subdomain_id, vulnerability, severity=None, details=None):
     """Add a NUCLEI result to the database"""
@@ -426,7 +1098,7 @@ def add_nuclei_result(subdomain_id, vulnerability, severity=None, details=None):
         conn.commit()
         return True
     except Error as e:
-        print(f"Error adding NUCLEI result: {e}")
+        logger.error("Error adding NUCLEI result: %s", e)
         return False
     finally:
         if conn:
@@ -435,53 +1107,34 @@ def add_nuclei_result(subdomain_id, vulnerability, severity=None, details=None):
 # Query operations for the scan history page
 def get_domains_with_scans():
     """Get all domains that have subdomains"""
-    print("Getting domains from database...")
+    logger.debug("Getting domains from database...")
     conn = get_db_connection()
     if conn is None:
-        print("Failed to get database connection for getting domains")
+        logger.error("Failed to get database connection for getting domains")
         return []
 
     try:
         cursor = conn.cursor()
 
-        # First, check if there are any domains in the database
-        cursor.execute("SELECT COUNT(*) FROM DOMAINS")
-        domain_count = cursor.fetchone()[0]
-        print(f"Total domains in database: {domain_count}")
-
-        # Then check if there are any subdomains
-        cursor.execute("SELECT COUNT(*) FROM SUBDOMAINS")
-        subdomain_count = cursor.fetchone()[0]
-        print(f"Total subdomains in database: {subdomain_count}")
-
-        # Also check how many are scanned (for debugging)
-        cursor.execute("""
-            SELECT COUNT(*) FROM SUBDOMAINS
-            WHERE GauScanned = 1 OR NaabuScanned = 1 OR NucleiScanned = 1
-        """)
-        scanned_count = cursor.fetchone()[0]
-        print(f"Total scanned subdomains: {scanned_count}")
-
-        # Now get all domains that have subdomains
-        print("Executing query to get all domains with subdomains...")
+        # Get all domains that have subdomains in one query, using the
+        # maintained per-domain count rather than joining every subdomain
+        logger.debug("Executing query to get all domains with subdomains...")
         cursor.execute("""
-            SELECT DISTINCT d.ID, d.Domain
-            FROM DOMAINS d
-            JOIN SUBDOMAINS s ON d.ID = s.DomainID
-            ORDER BY d.Domain
+            SELECT ID, Domain, SubdomainCount
+            FROM DOMAINS
+            WHERE SubdomainCount > 0
+            ORDER BY Domain
         """)
         results = [dict(row) for row in cursor.fetchall()]
-        print(f"Found {len(results)} domains with scans")
+        logger.info("Found %s domains with scans", len(results))
 
         # Print the domains found
         for domain in results:
-            print(f"  - Domain: {domain['Domain']} (ID: {domain['ID']})")
+            logger.debug("  - Domain: %s (ID: %s, %s subdomains)", domain['Domain'], domain['ID'], domain['SubdomainCount'])
 
         return results
     except Error as e:
-        print(f"Error getting domains with scans: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting domains with scans: %s", e)
         return []
     finally:
         if conn:
@@ -489,39 +1142,14 @@ def get_domains_with_scans():
 
 def get_scanned_subdomains(domain_id):
     """Get all subdomains for a domain"""
-    print(f"Getting all subdomains for domain ID: {domain_id}")
+    logger.debug("Getting all subdomains for domain ID: %s", domain_id)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for getting subdomains")
+        logger.error("Failed to get database connection for getting subdomains")
         return []
 
     try:
         cursor = conn.cursor()
-
-        # First, check if the domain exists
-        cursor.execute("SELECT Domain FROM DOMAINS WHERE ID = ?", (domain_id,))
-        domain_result = cursor.fetchone()
-        if domain_result:
-            print(f"Found domain: {domain_result['Domain']}")
-        else:
-            print(f"Domain with ID {domain_id} not found")
-            return []
-
-        # Then check if there are any subdomains for this domain
-        cursor.execute("SELECT COUNT(*) FROM SUBDOMAINS WHERE DomainID = ?", (domain_id,))
-        subdomain_count = cursor.fetchone()[0]
-        print(f"Total subdomains for domain ID {domain_id}: {subdomain_count}")
-
-        # Also check how many are scanned (for debugging)
-        cursor.execute("""
-            SELECT COUNT(*) FROM SUBDOMAINS
-            WHERE DomainID = ? AND (GauScanned = 1 OR NaabuScanned = 1 OR NucleiScanned = 1)
-        """, (domain_id,))
-        scanned_count = cursor.fetchone()[0]
-        print(f"Total scanned subdomains for domain ID {domain_id}: {scanned_count}")
-
-        # Now get all subdomains for this domain
-        print(f"Executing query to get all subdomains for domain ID {domain_id}...")
         cursor.execute("""
             SELECT ID, Subdomain, StatusCode, Technology, GauScanned, NaabuScanned, NucleiScanned
             FROM SUBDOMAINS
@@ -529,42 +1157,151 @@ def get_scanned_subdomains(domain_id):
             ORDER BY Subdomain
         """, (domain_id,))
         results = [dict(row) for row in cursor.fetchall()]
-        print(f"Found {len(results)} subdomains for domain ID {domain_id}")
-
-        # Print the subdomains found
-        for subdomain in results:
-            print(f"  - Subdomain: {subdomain['Subdomain']} (ID: {subdomain['ID']})")
-            print(f"    GAU: {'Scanned' if subdomain['GauScanned'] else 'Not Scanned'}")
-            print(f"    Naabu: {'Scanned' if subdomain['NaabuScanned'] else 'Not Scanned'}")
-            print(f"    Nuclei: {'Scanned' if subdomain['NucleiScanned'] else 'Not Scanned'}")
-
+        scanned_count = sum(1 for row in results if row['GauScanned'] or row['NaabuScanned'] or row['NucleiScanned'])
+        logger.info("Found %s subdomains (%s scanned) for domain ID %s", len(results), scanned_count, domain_id)
         return results
     except Error as e:
-        print(f"Error getting scanned subdomains: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting scanned subdomains: %s", e)
         return []
     finally:
         if conn:
             conn.close()
 
+def _like_pattern(text, prefix=False):
+    """Build a LIKE pattern matching text anywhere (or as a prefix), with wildcards escaped"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+def _page(rows, limit, key=None):
+    """Split a limit + 1 row fetch into the page and the cursor for the next one"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1] if key is None else rows[-1][key]
+    return rows, None
+
+def get_domains_page(after=None, limit=100):
+    """
+    Get one page of domains that have subdomains, ordered by name.
+
+    Returns:
+        tuple: (list of domains, cursor for the next page or None)
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return [], None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT ID, Domain, SubdomainCount
+            FROM DOMAINS
+            WHERE SubdomainCount > 0 AND Domain > ?
+            ORDER BY Domain
+            LIMIT ?
+        """, (after or '', limit + 1))
+        return _page([dict(row) for row in cursor.fetchall()], limit, 'Domain')
+    except Error as e:
+        logger.error("Error getting domains page: %s", e)
+        return [], None
+    finally:
+        if conn:
+            conn.close()
+
+def get_subdomains_page(domain_id, after=None, limit=100, search=None, name=None, status_code=None, technology=None):
+    """
+    Get one page of a domain's subdomains, ordered by name.
+
+    Pages are keyed on the subdomain name (pass the previous page's cursor as
+    after), so every page is a range read of the SUBDOMAINS covering index no
+    matter how deep into the list it is. name and technology match anywhere
+    in the value, status_code matches a prefix (e.g. "4" for 4xx) and search
+    matches any of the three.
+
+    Returns:
+        tuple: (list of subdomains, cursor for the next page or None)
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return [], None
+
+    conditions = ["DomainID = ?", "Subdomain > ?"]
+    params = [domain_id, after or '']
+    if search:
+        conditions.append("(Subdomain LIKE ? ESCAPE '\\' OR StatusCode LIKE ? ESCAPE '\\' OR Technology LIKE ? ESCAPE '\\')")
+        params += [_like_pattern(search)] * 3
+    if name:
+        conditions.append("Subdomain LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(name))
+    if status_code:
+        conditions.append("StatusCode LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(status_code, prefix=True))
+    if technology:
+        conditions.append("Technology LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(technology))
+    params.append(limit + 1)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT ID, Subdomain, StatusCode, Technology, GauScanned, NaabuScanned, NucleiScanned
+            FROM SUBDOMAINS
+            WHERE {' AND '.join(conditions)}
+            ORDER BY Subdomain
+            LIMIT ?
+        """, params)
+        return _page([dict(row) for row in cursor.fetchall()], limit, 'Subdomain')
+    except Error as e:
+        logger.error("Error getting subdomains page: %s", e)
+        return [], None
+    finally:
+        if conn:
+            conn.close()
+
+def get_gau_results_page(subdomain_id, after=None, limit=500, search=None):
+    """
+    Get one page of a subdomain's GAU links, ordered by link.
+
+    Returns:
+        tuple: (list of links, cursor for the next page or None)
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return [], None
+
+    conditions = ["SID = ?", "link > ?"]
+    params = [subdomain_id, after or '']
+    if search:
+        conditions.append("link LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(search))
+    params.append(limit + 1)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT link
+            FROM GAU_TABLE
+            WHERE {' AND '.join(conditions)}
+            ORDER BY link
+            LIMIT ?
+        """, params)
+        return _page([row['link'] for row in cursor.fetchall()], limit)
+    except Error as e:
+        logger.error("Error getting GAU results page: %s", e)
+        return [], None
+    finally:
+        if conn:
+            conn.close()
+
 def get_gau_results(subdomain_id):
     """Get all GAU results for a subdomain"""
-    print(f"Getting GAU results for subdomain ID: {subdomain_id}")
+    logger.debug("Getting GAU results for subdomain ID: %s", subdomain_id)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for GAU results")
+        logger.error("Failed to get database connection for GAU results")
         return []
 
     try:
         cursor = conn.cursor()
-
-        # First check if there are any GAU results for this subdomain
-        cursor.execute("SELECT COUNT(*) FROM GAU_TABLE WHERE SID = ?", (subdomain_id,))
-        count = cursor.fetchone()[0]
-        print(f"Found {count} GAU results for subdomain ID: {subdomain_id}")
-
-        # Get the GAU results
         cursor.execute("""
             SELECT link
             FROM GAU_TABLE
@@ -572,19 +1309,10 @@ def get_gau_results(subdomain_id):
             ORDER BY link
         """, (subdomain_id,))
         results = [row['link'] for row in cursor.fetchall()]
-
-        # Print a sample of the results
-        if results:
-            sample = results[:3] if len(results) > 3 else results
-            print(f"Sample GAU results: {sample}")
-            if len(results) > 3:
-                print(f"... and {len(results) - 3} more")
-
+        logger.info("Found %s GAU results for subdomain ID: %s", len(results), subdomain_id)
         return results
     except Error as e:
-        print(f"Error getting GAU results: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting GAU results: %s", e)
         return []
     finally:
         if conn:
@@ -592,21 +1320,14 @@ def get_gau_results(subdomain_id):
 
 def get_naabu_results(subdomain_id):
     """Get all NAABU results for a subdomain"""
-    print(f"Getting Naabu results for subdomain ID: {subdomain_id}")
+    logger.debug("Getting Naabu results for subdomain ID: %s", subdomain_id)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for Naabu results")
+        logger.error("Failed to get database connection for Naabu results")
         return []
 
     try:
         cursor = conn.cursor()
-
-        # First check if there are any Naabu results for this subdomain
-        cursor.execute("SELECT COUNT(*) FROM NAABU_TABLE WHERE SID = ?", (subdomain_id,))
-        count = cursor.fetchone()[0]
-        print(f"Found {count} Naabu results for subdomain ID: {subdomain_id}")
-
-        # Get the Naabu results
         cursor.execute("""
             SELECT port
             FROM NAABU_TABLE
@@ -614,16 +1335,10 @@ def get_naabu_results(subdomain_id):
             ORDER BY port
         """, (subdomain_id,))
         results = [row['port'] for row in cursor.fetchall()]
-
-        # Print the results
-        if results:
-            print(f"Naabu results (ports): {results}")
-
+        logger.info("Found %s Naabu results for subdomain ID: %s", len(results), subdomain_id)
         return results
     except Error as e:
-        print(f"Error getting Naabu results: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting Naabu results: %s", e)
         return []
     finally:
         if conn:
@@ -645,63 +1360,298 @@ def get_nuclei_results(subdomain_id):
         """, (subdomain_id,))
         return [dict(row) for row in cursor.fetchall()]
     except Error as e:
-        print(f"Error getting NUCLEI results: {e}")
+        logger.error("Error getting NUCLEI results: %s", e)
         return []
     finally:
         if conn:
             conn.close()
 
-def get_subdomain_details(subdomain_id):
-    """Get detailed information about a subdomain including scan results"""
-    print(f"Getting details for subdomain ID: {subdomain_id}")
+def get_subdomain_details(subdomain_id, summary_only=False, include_links=True):
+    """
+    Get detailed information about a subdomain including scan results.
+
+    Everything is loaded with one query on one connection: the result lists
+    are aggregated with json_group_array next to their counts. With
+    summary_only only the counts (gau_count, naabu_count, nuclei_count) are
+    returned; include_links=False keeps the ports and vulnerabilities but
+    leaves out the GAU links, which can be paged with get_gau_results_page.
+    """
+    logger.debug("Getting details for subdomain ID: %s", subdomain_id)
     conn = get_db_connection()
     if conn is None:
-        print(f"Failed to get database connection for subdomain details")
+        logger.error("Failed to get database connection for subdomain details")
         return None
 
+    # Result lists to aggregate alongside the counts, by result key
+    lists = {}
+    if not summary_only:
+        if include_links:
+            lists['gau_results'] = """
+                (SELECT json_group_array(link) FROM
+                    (SELECT link FROM GAU_TABLE WHERE SID = s.ID ORDER BY link))"""
+        lists['naabu_results'] = """
+            (SELECT json_group_array(port) FROM
+                (SELECT port FROM NAABU_TABLE WHERE SID = s.ID ORDER BY port))"""
+        lists['nuclei_results'] = """
+            (SELECT json_group_array(json_object('vulnerability', vulnerability, 'severity', severity, 'details', details)) FROM
+                (SELECT vulnerability, severity, details FROM NUCLEI_TABLE WHERE SID = s.ID
+                 ORDER BY severity DESC, vulnerability))"""
+    list_columns = ''.join(f",\n{sql} AS {key}" for key, sql in lists.items())
+
     try:
         cursor = conn.cursor()
-        # Get subdomain info
-        print(f"Executing query to get subdomain info for ID: {subdomain_id}")
-        cursor.execute("""
-            SELECT s.ID, s.Subdomain, s.GauScanned, s.NaabuScanned, s.NucleiScanned, d.Domain
+        cursor.execute(f"""
+            SELECT s.ID, s.Subdomain, s.GauScanned, s.NaabuScanned, s.NucleiScanned, d.Domain,
+                (SELECT COUNT(*) FROM GAU_TABLE WHERE SID = s.ID) AS gau_count,
+                (SELECT COUNT(*) FROM NAABU_TABLE WHERE SID = s.ID) AS naabu_count,
+                (SELECT COUNT(*) FROM NUCLEI_TABLE WHERE SID = s.ID) AS nuclei_count{list_columns}
             FROM SUBDOMAINS s
             JOIN DOMAINS d ON s.DomainID = d.ID
             WHERE s.ID = ?
         """, (subdomain_id,))
         result = cursor.fetchone()
-        if result:
-            subdomain = dict(result)
-            print(f"Found subdomain: {subdomain['Subdomain']} (Domain: {subdomain['Domain']})")
-            print(f"Scan status: GAU={subdomain['GauScanned']}, Naabu={subdomain['NaabuScanned']}, Nuclei={subdomain['NucleiScanned']}")
-        else:
-            print(f"No subdomain found with ID: {subdomain_id}")
+        if not result:
+            logger.info("No subdomain found with ID: %s", subdomain_id)
             return None
 
-        # Get GAU results if scanned
-        if subdomain.get('GauScanned'):
-            print(f"Getting GAU results for subdomain ID: {subdomain_id}")
-            subdomain['gau_results'] = get_gau_results(subdomain_id)
-            print(f"Found {len(subdomain['gau_results'])} GAU results")
+        subdomain = dict(result)
+        # Only report result lists for scans that have been run
+        scanned = {
+            'gau_results': subdomain['GauScanned'],
+            'naabu_results': subdomain['NaabuScanned'],
+            'nuclei_results': subdomain['NucleiScanned']
+        }
+        for key in lists:
+            value = subdomain.pop(key)
+            if scanned[key]:
+                subdomain[key] = json.loads(value)
+
+        logger.info("Found subdomain: %s (Domain: %s), %s URLs, %s ports, %s vulnerabilities",
+                    subdomain['Subdomain'], subdomain['Domain'], subdomain['gau_count'],
+                    subdomain['naabu_count'], subdomain['nuclei_count'])
+        return subdomain
+    except Error as e:
+        logger.exception("Error getting subdomain details: %s", e)
+        return None
+    finally:
+        if conn:
+            conn.close()
 
-        # Get NAABU results if scanned
-        if subdomain.get('NaabuScanned'):
-            print(f"Getting Naabu results for subdomain ID: {subdomain_id}")
-            subdomain['naabu_results'] = get_naabu_results(subdomain_id)
-            print(f"Found {len(subdomain['naabu_results'])} Naabu results")
+# Scan registry operations
+def register_scan(session_id, domain, owner, lease_seconds, task_id=None, status='queued'):
+    """Add a scan to the registry with a fresh lease held by owner"""
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for registering scan %s", session_id)
+        return False
 
-        # Get NUCLEI results if scanned
-        if subdomain.get('NucleiScanned'):
-            print(f"Getting Nuclei results for subdomain ID: {subdomain_id}")
-            subdomain['nuclei_results'] = get_nuclei_results(subdomain_id)
-            print(f"Found {len(subdomain['nuclei_results'])} Nuclei results")
+    now = time.time()
+    try:
+        conn.execute(
+            """INSERT OR REPLACE INTO SCANS
+               (SessionID, Domain, TaskID, Status, Owner, StartedAt, HeartbeatAt, LeaseExpiresAt, CancelRequested)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)""",
+            (session_id, domain, task_id, status, owner, now, now, now + lease_seconds)
+        )
+        conn.commit()
+        return True
+    except Error as e:
+        logger.error("Error registering scan %s: %s", session_id, e)
+        return False
+    finally:
+        if conn:
+            conn.close()
 
-        return subdomain
+def get_scan(session_id):
+    """Get a scan's registry entry, or None if it isn't registered"""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    try:
+        cursor = conn.execute(
+            """SELECT SessionID, Domain, TaskID, Status, Owner, StartedAt, HeartbeatAt, LeaseExpiresAt,
+                      CancelRequested
+               FROM SCANS WHERE SessionID = ?""",
+            (session_id,)
+        )
+        result = cursor.fetchone()
+        return dict(result) if result else None
     except Error as e:
-        print(f"Error getting subdomain details: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error getting scan %s: %s", session_id, e)
         return None
     finally:
         if conn:
             conn.close()
+
+def set_scan_task(session_id, task_id):
+    """Record the Celery task running a scan"""
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        conn.execute("UPDATE SCANS SET TaskID = ? WHERE SessionID = ?", (task_id, session_id))
+        conn.commit()
+        return True
+    except Error as e:
+        logger.error("Error setting task for scan %s: %s", session_id, e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def renew_scan_lease(session_id, owner, lease_seconds, status=None):
+    """
+    Extend the lease on an active scan and optionally update its status.
+
+    The owner is taken over, so a Celery worker picking up a scan claims it.
+
+    Returns:
+        dict: The scan's CancelRequested flag and Status, or None if the scan
+        is no longer active (finished, cancelled or reaped)
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    now = time.time()
+    placeholders = ','.join('?' for _ in ACTIVE_SCAN_STATUSES)
+    try:
+        cursor = conn.execute(
+            f"""UPDATE SCANS SET Owner = ?, HeartbeatAt = ?, LeaseExpiresAt = ?, Status = COALESCE(?, Status)
+                WHERE SessionID = ? AND Status IN ({placeholders})""",
+            (owner, now, now + lease_seconds, status, session_id) + ACTIVE_SCAN_STATUSES
+        )
+        conn.commit()
+        if cursor.rowcount == 0:
+            return None
+        row = conn.execute(
+            "SELECT CancelRequested, Status FROM SCANS WHERE SessionID = ?", (session_id,)
+        ).fetchone()
+        return dict(row) if row else None
+    except Error as e:
+        logger.error("Error renewing lease for scan %s: %s", session_id, e)
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def claim_scan_hosts(session_id, subdomains):
+    """
+    Claim subdomains for probing in a running scan.
+
+    Returns:
+        list: The subdomains no other step of the scan had claimed yet, in
+        input order; empty if the claim failed
+    """
+    if not subdomains:
+        return []
+
+    conn = get_db_connection()
+    if conn is None:
+        logger.error("Failed to get database connection for claiming %s hosts of scan %s", len(subdomains), session_id)
+        return []
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        claimed = []
+        for subdomain in dict.fromkeys(subdomains):
+            cursor.execute("INSERT OR IGNORE INTO SCAN_HOSTS (SessionID, Subdomain) VALUES (?, ?)",
+                           (session_id, subdomain))
+            if cursor.rowcount:
+                claimed.append(subdomain)
+        conn.commit()
+        return claimed
+    except Error as e:
+        conn.rollback()
+        logger.error("Error claiming hosts of scan %s: %s", session_id, e)
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+def finish_scan(session_id, status):
+    """Mark a scan as finished with the given final status and drop its host claims"""
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        conn.execute(
+            "UPDATE SCANS SET Status = ?, HeartbeatAt = ? WHERE SessionID = ?",
+            (status, time.time(), session_id)
+        )
+        conn.execute("DELETE FROM SCAN_HOSTS WHERE SessionID = ?", (session_id,))
+        conn.commit()
+        return True
+    except Error as e:
+        logger.error("Error finishing scan %s: %s", session_id, e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def request_scan_cancel(session_id):
+    """
+    Flag an active scan for cancellation; its owner acts on it at the next heartbeat.
+
+    Returns:
+        bool: True if the scan was active and is now flagged
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    placeholders = ','.join('?' for _ in ACTIVE_SCAN_STATUSES)
+    try:
+        cursor = conn.execute(
+            f"UPDATE SCANS SET CancelRequested = 1 WHERE SessionID = ? AND Status IN ({placeholders})",
+            (session_id,) + ACTIVE_SCAN_STATUSES
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    except Error as e:
+        logger.error("Error requesting cancellation of scan %s: %s", session_id, e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def reap_stale_scans(now=None):
+    """
+    Mark active scans whose lease has expired as stale.
+
+    Returns:
+        list: Session IDs of the scans that were reaped
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return []
+
+    now = now or time.time()
+    placeholders = ','.join('?' for _ in ACTIVE_SCAN_STATUSES)
+    query = f"SELECT SessionID FROM SCANS WHERE Status IN ({placeholders}) AND LeaseExpiresAt < ?"
+    try:
+        # Cheap indexed check first; only take the write lock when there is something to reap
+        if not conn.execute(query, ACTIVE_SCAN_STATUSES + (now,)).fetchone():
+            return []
+
+        # Lock and re-read so two workers reaping at once don't both claim a scan
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(query, ACTIVE_SCAN_STATUSES + (now,)).fetchall()
+        session_ids = [row['SessionID'] for row in rows]
+        conn.executemany("UPDATE SCANS SET Status = 'stale' WHERE SessionID = ?",
+                         [(session_id,) for session_id in session_ids])
+        conn.executemany("DELETE FROM SCAN_HOSTS WHERE SessionID = ?",
+                         [(session_id,) for session_id in session_ids])
+        conn.commit()
+        return session_ids
+    except Error as e:
+        conn.rollback()
+        logger.error("Error reaping stale scans: %s", e)
+        return []
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,409 @@
+"""
+Minimal asyncio DNS client.
+
+Speaks plain DNS over UDP with nothing but the standard library, so lookups
+run on the orchestrator loop next to the tool processes instead of tying up
+a thread each in socket.getaddrinfo. Only what the scan stages need is
+implemented: A/AAAA queries, following the CNAME chain in the answer, and
+the response code. Nameservers come from DNS_RESOLVERS
+(``1.1.1.1,8.8.8.8:53``) or, failing that, /etc/resolv.conf; queries are
+spread over them round-robin with at most DNS_MAX_IN_FLIGHT outstanding.
+
+Answers are cached for the life of the worker, shared by every scan it
+runs: positive answers for their record TTL and negative ones (NXDOMAIN or
+no records) for the SOA minimum the nameserver returns, both capped at
+DNS_CACHE_MAX_TTL. Lookups that got no answer at all are not cached.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import struct
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for each answer before retrying
+DNS_TIMEOUT = float(os.environ.get('DNS_TIMEOUT', 2))
+
+# Extra attempts per query, each against the next nameserver
+DNS_RETRIES = int(os.environ.get('DNS_RETRIES', 2))
+
+# Queries outstanding at once per worker, across all scans
+DNS_MAX_IN_FLIGHT = int(os.environ.get('DNS_MAX_IN_FLIGHT', 200))
+
+# Cached answers kept per worker, least recently used dropped first
+DNS_CACHE_SIZE = int(os.environ.get('DNS_CACHE_SIZE', 100000))
+
+# Longest any answer is cached, whatever its TTL
+DNS_CACHE_MAX_TTL = int(os.environ.get('DNS_CACHE_MAX_TTL', 3600))
+
+# Seconds a negative answer is cached when the response carries no SOA
+DNS_NEGATIVE_TTL = int(os.environ.get('DNS_NEGATIVE_TTL', 300))
+
+# Used when neither DNS_RESOLVERS nor /etc/resolv.conf names a nameserver
+FALLBACK_RESOLVERS = ['1.1.1.1', '8.8.8.8']
+
+# Record types and response codes
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_AAAA = 28
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+
+def dns_resolution_enabled():
+    return os.environ.get('DNS_RESOLUTION', 'True').lower() == 'true'
+
+
+class DnsError(Exception):
+    """Raised for responses that can't be parsed."""
+
+
+def parse_nameserver(spec):
+    """Parse ``host`` or ``host:port`` (``[v6]:port`` for IPv6) into a (host, port) pair."""
+    spec = spec.strip()
+    if spec.startswith('['):
+        host, _, port = spec[1:].partition(']:')
+        return host.rstrip(']'), int(port or 53)
+    if spec.count(':') == 1:
+        host, port = spec.split(':')
+        return host, int(port)
+    return spec, 53
+
+
+def load_nameservers():
+    """Nameservers from DNS_RESOLVERS, else /etc/resolv.conf, else FALLBACK_RESOLVERS."""
+    specs = [spec for spec in os.environ.get('DNS_RESOLVERS', '').split(',') if spec.strip()]
+    if not specs:
+        try:
+            with open('/etc/resolv.conf', 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[0] == 'nameserver':
+                        specs.append(parts[1])
+        except OSError:
+            pass
+    return [parse_nameserver(spec) for spec in specs or FALLBACK_RESOLVERS]
+
+
+def build_query(name, qtype, query_id):
+    """Encode a recursive query for one name and record type."""
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = b''.join(bytes([len(label)]) + label.encode('idna')
+                     for label in name.rstrip('.').split('.') if label) + b'\x00'
+    return header + qname + struct.pack('!HH', qtype, 1)
+
+
+def read_name(data, offset):
+    """Decode a possibly compressed name; returns (name, offset after it)."""
+    labels = []
+    end = None
+    for _ in range(128):
+        if offset >= len(data):
+            raise DnsError("Name runs past the end of the message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+        elif length == 0:
+            return '.'.join(labels).lower(), end if end is not None else offset + 1
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode('ascii', errors='replace'))
+            offset += length + 1
+    raise DnsError("Compression loop in name")
+
+
+class DnsResponse:
+    """
+    A parsed response.
+
+    Args:
+        rcode (int): The response code
+        records (list): (name, type, ttl, value) tuples from the answer section;
+            value is an address string for A/AAAA and a name for CNAME
+        negative_ttl (int): How long the absence of records may be cached,
+            from the SOA in the authority section, or None without one
+    """
+
+    def __init__(self, rcode, records, negative_ttl=None):
+        self.rcode = rcode
+        self.records = records
+        self.negative_ttl = negative_ttl
+
+
+def parse_response(data, query_id):
+    """Decode a response to the query with query_id; raises DnsError if it is malformed."""
+    try:
+        return _parse_response(data, query_id)
+    except (struct.error, IndexError, ValueError) as e:
+        raise DnsError(f"Malformed response: {e}")
+
+
+def _parse_response(data, query_id):
+    if len(data) < 12:
+        raise DnsError("Truncated header")
+    response_id, flags, qdcount, ancount, nscount = struct.unpack('!HHHHH', data[:10])
+    if response_id != query_id:
+        raise DnsError("Response ID does not match the query")
+
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_name(data, offset)
+        offset += 4
+
+    records = []
+    for _ in range(ancount):
+        name, offset = read_name(data, offset)
+        rtype, _, ttl, length = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + length]
+        if rtype == TYPE_A and length == 4:
+            records.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET, rdata)))
+        elif rtype == TYPE_AAAA and length == 16:
+            records.append((name, rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+        elif rtype == TYPE_CNAME:
+            records.append((name, rtype, ttl, read_name(data, offset)[0]))
+        offset += length
+
+    negative_ttl = None
+    for _ in range(nscount):
+        name, offset = read_name(data, offset)
+        rtype, _, ttl, length = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        if rtype == TYPE_SOA:
+            # RFC 2308: negative answers live for min(SOA TTL, SOA MINIMUM)
+            _, rdata_offset = read_name(data, offset)
+            _, rdata_offset = read_name(data, rdata_offset)
+            minimum = struct.unpack('!I', data[rdata_offset + 16:rdata_offset + 20])[0]
+            negative_ttl = min(ttl, minimum)
+        offset += length
+    return DnsResponse(flags & 0x000F, records, negative_ttl)
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self, query_id):
+        self.query_id = query_id
+        self.future = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if self.future.done():
+            return
+        if len(data) < 2 or struct.unpack('!H', data[:2])[0] != self.query_id:
+            # Stray datagram; keep waiting for the real answer
+            return
+        try:
+            self.future.set_result(parse_response(data, self.query_id))
+        except DnsError as e:
+            # Mangled answer; fail now so the query is retried
+            self.future.set_exception(e)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class DnsAnswer:
+    """
+    The outcome of resolving a name.
+
+    Args:
+        name (str): The name that was looked up
+        rcode (int): The response code, or None if no nameserver answered
+        addresses (set): Addresses the name resolves to
+        cnames (list): CNAME targets followed, in order
+        ttl (int): Seconds the answer may be cached, or None if it mustn't be
+    """
+
+    def __init__(self, name, rcode, addresses=(), cnames=(), ttl=None):
+        self.name = name
+        self.rcode = rcode
+        self.addresses = set(addresses)
+        self.cnames = list(cnames)
+        self.ttl = ttl
+
+    @property
+    def resolved(self):
+        return bool(self.addresses)
+
+    @property
+    def failed(self):
+        """No nameserver gave a usable answer, so nothing is known about the name."""
+        return self.rcode is None or (not self.addresses and self.rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN))
+
+
+class HostAnswer:
+    """The A and AAAA answers for one name."""
+
+    def __init__(self, name, ipv4, ipv6):
+        self.name = name
+        self.ipv4 = ipv4
+        self.ipv6 = ipv6
+
+    @property
+    def addresses(self):
+        return self.ipv4.addresses | self.ipv6.addresses
+
+    @property
+    def cnames(self):
+        return self.ipv4.cnames or self.ipv6.cnames
+
+    @property
+    def resolved(self):
+        return bool(self.addresses)
+
+    @property
+    def failed(self):
+        """Neither lookup got a usable answer; the name may well exist."""
+        return not self.resolved and (self.ipv4.failed or self.ipv6.failed)
+
+
+class DnsCache:
+    """Answers by (name, type) until their TTL runs out, bounded by max_entries."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or DNS_CACHE_SIZE
+        self._entries = OrderedDict()
+
+    def get(self, name, qtype):
+        key = (name, qtype)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, answer = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def put(self, answer, qtype):
+        if not answer.ttl or answer.ttl <= 0:
+            return
+        key = (answer.name, qtype)
+        self._entries[key] = (time.monotonic() + min(answer.ttl, DNS_CACHE_MAX_TTL), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Resolver:
+    """
+    Resolver pool over a list of nameservers.
+
+    Queries go to the nameservers in turn, a retry moves on to the next one,
+    and at most max_in_flight queries are outstanding at once. Answers are
+    kept in a DnsCache.
+    """
+
+    def __init__(self, nameservers=None, timeout=None, retries=None, max_in_flight=None, cache=None):
+        self.nameservers = nameservers or load_nameservers()
+        self.timeout = timeout or DNS_TIMEOUT
+        self.retries = DNS_RETRIES if retries is None else retries
+        self.max_in_flight = max_in_flight or DNS_MAX_IN_FLIGHT
+        self.cache = cache if cache is not None else DnsCache()
+        self._next = random.randrange(len(self.nameservers))
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _slots(self):
+        # One semaphore per loop; the orchestrator starts a new loop after a fork
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def query(self, name, qtype):
+        """Send one query, retrying on timeouts; returns a DnsResponse or None."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            nameserver = self.nameservers[self._next % len(self.nameservers)]
+            self._next += 1
+            query_id = random.randrange(1 << 16)
+            transport = None
+            try:
+                async with self._slots():
+                    transport, protocol = await loop.create_datagram_endpoint(
+                        lambda: _QueryProtocol(query_id), remote_addr=nameserver)
+                    transport.sendto(build_query(name, qtype, query_id))
+                    return await asyncio.wait_for(protocol.future, self.timeout)
+            except (asyncio.TimeoutError, OSError, DnsError) as e:
+                logger.debug("dns: %s query for %s via %s failed: %s", qtype, name, nameserver, e)
+            finally:
+                if transport is not None:
+                    transport.close()
+        return None
+
+    async def resolve(self, name, qtype=TYPE_A):
+        """Look up a name's addresses, following the CNAME chain in the answer."""
+        name = name.rstrip('.').lower()
+        answer = self.cache.get(name, qtype)
+        if answer is not None:
+            return answer
+
+        response = await self.query(name, qtype)
+        if response is None:
+            return DnsAnswer(name, None)
+
+        cnames = []
+        current = name
+        by_name = {}
+        ttls = []
+        for record_name, rtype, ttl, value in response.records:
+            by_name.setdefault(record_name, []).append((rtype, ttl, value))
+        # Walk the chain rather than trusting record order
+        for _ in range(16):
+            targets = [(ttl, value) for rtype, ttl, value in by_name.get(current, ()) if rtype == TYPE_CNAME]
+            if not targets:
+                break
+            ttls.append(targets[0][0])
+            current = targets[0][1]
+            cnames.append(current)
+        addresses = []
+        for rtype, ttl, value in by_name.get(current, ()):
+            if rtype == qtype:
+                addresses.append(value)
+                ttls.append(ttl)
+
+        if addresses:
+            ttl = min(ttls)
+        elif response.rcode in (RCODE_NOERROR, RCODE_NXDOMAIN):
+            ttl = DNS_NEGATIVE_TTL if response.negative_ttl is None else response.negative_ttl
+        else:
+            # SERVFAIL, REFUSED and the like say nothing about the name
+            ttl = None
+        answer = DnsAnswer(name, response.rcode, addresses, cnames, ttl)
+        self.cache.put(answer, qtype)
+        return answer
+
+    async def resolve_host(self, name):
+        """Look up a name's A and AAAA records together."""
+        ipv4, ipv6 = await asyncio.gather(self.resolve(name, TYPE_A), self.resolve(name, TYPE_AAAA))
+        return HostAnswer(ipv4.name, ipv4, ipv6)
+
+    async def resolve_hosts(self, names):
+        """Look up many names; returns a dict of name -> HostAnswer."""
+        answers = await asyncio.gather(*(self.resolve_host(name) for name in names))
+        return dict(zip(names, answers))
+
+
+_shared = {'resolver': None, 'key': None}
+
+
+def shared_resolver():
+    """The worker's resolver pool, so every scan shares its cache and in-flight limit."""
+    # Rebuilt in a forked child and when the configured nameservers change
+    key = (os.getpid(), os.environ.get('DNS_RESOLVERS'))
+    if _shared['resolver'] is None or _shared['key'] != key:
+        _shared['resolver'] = Resolver()
+        _shared['key'] = key
+    return _shared['resolver']
@@ -0,0 +1,593 @@
+"""
+asyncio orchestration layer for external recon tools.
+
+All tool processes in a worker run on a single background event loop using
+asyncio.create_subprocess_exec, so dozens of concurrent scans don't each tie
+up a thread blocked on a pipe. Every tool has its own concurrency limit,
+every job has a timeout, and jobs can be cancelled individually or by group
+(e.g. all jobs belonging to one scan session).
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import shlex
+import shutil
+import signal
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of processes of each tool running at once in this process
+DEFAULT_CONCURRENCY = {
+    'subfinder': 8,
+    'assetfinder': 8,
+    'chaos': 4,
+    'sublist3r': 4,
+    'httpx': 4,
+    'gau': 4,
+    'waybackurls': 4,
+    'naabu': 1,
+    'nmap': 1,
+}
+
+# Limit for tools that aren't listed in DEFAULT_CONCURRENCY
+FALLBACK_CONCURRENCY = 4
+
+# Common tool locations added to PATH for every subprocess
+COMMON_LOCATIONS = ['/usr/bin', '/usr/local/bin', '/bin', '/opt/homebrew/bin', '/go/bin']
+
+# Number of trailing stderr lines kept for error messages
+STDERR_TAIL_LINES = 50
+
+# Largest stdout line accepted from a tool, in bytes
+MAX_LINE_LENGTH = 1024 * 1024
+
+# Seconds before resolved tool paths are checked against PATH again
+TOOL_RESOLVE_TTL = int(os.environ.get('TOOL_RESOLVE_TTL', 60))
+
+
+def load_concurrency_limits():
+    """
+    Get per-tool concurrency limits.
+
+    Limits can be overridden with the TOOL_CONCURRENCY environment variable,
+    e.g. ``TOOL_CONCURRENCY="httpx=8,naabu=2"``.
+    """
+    limits = dict(DEFAULT_CONCURRENCY)
+    for item in os.environ.get('TOOL_CONCURRENCY', '').split(','):
+        if '=' not in item:
+            continue
+        tool, limit = item.split('=', 1)
+        try:
+            limits[tool.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning("orchestrator: Ignoring invalid concurrency limit: %s", item)
+    return limits
+
+
+def build_env():
+    """Create a copy of the environment with common tool locations in PATH."""
+    env = os.environ.copy()
+    path = env.get('PATH', '')
+    for location in COMMON_LOCATIONS:
+        if location not in path.split(':'):
+            path = f"{location}:{path}"
+    env['PATH'] = path
+    return env
+
+
+class ToolResolver:
+    """
+    Process-wide table mapping tool names to absolute paths.
+
+    The subprocess environment and every lookup (including misses) are
+    cached. Once the TTL expires, the PATH directories are stat'ed and the
+    table is only dropped if one of them changed, e.g. because a tool was
+    installed or removed.
+    """
+
+    def __init__(self, ttl=TOOL_RESOLVE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._env = None
+        self._paths = {}
+        self._dir_mtimes = None
+        self._expires = 0
+
+    def _dir_snapshot(self, env):
+        snapshot = {}
+        for directory in env['PATH'].split(':'):
+            try:
+                snapshot[directory] = os.stat(directory).st_mtime
+            except OSError:
+                snapshot[directory] = None
+        return snapshot
+
+    def _refresh(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        if self._env is not None and now < self._expires:
+            return
+        env = build_env()
+        snapshot = self._dir_snapshot(env)
+        if self._env is None or env != self._env or snapshot != self._dir_mtimes:
+            self._env = env
+            self._paths = {}
+            self._dir_mtimes = snapshot
+        self._expires = now + self.ttl
+
+    def env(self):
+        """Get the prepared subprocess environment (do not modify it)."""
+        with self._lock:
+            self._refresh()
+            return self._env
+
+    def resolve(self, tool):
+        """Get the absolute path of a tool, or None if it isn't installed."""
+        if os.path.isabs(tool):
+            return tool if os.access(tool, os.X_OK) else None
+        with self._lock:
+            self._refresh()
+            if tool not in self._paths:
+                self._paths[tool] = shutil.which(tool, path=self._env['PATH'])
+            return self._paths[tool]
+
+    def invalidate(self):
+        """Forget every resolved path, e.g. after installing a tool."""
+        with self._lock:
+            self._env = None
+            self._paths = {}
+            self._expires = 0
+
+
+class StdinFeed:
+    """
+    A thread-safe source of lines for a tool's stdin.
+
+    put() and close() may be called from any thread, including from line
+    callbacks running on the orchestrator loop. The tool's stdin is closed
+    once close() has been called and every queued line has been written.
+
+    stage, if given, is a coroutine function that screens lines on their way
+    to the tool: it is awaited on the orchestrator loop with every line
+    queued since its last call and returns the ones to write. It may block
+    on I/O (via the loop) without losing lines queued meanwhile, and the
+    feed only ends once it has seen every line.
+    """
+
+    def __init__(self, stage=None):
+        self.stage = stage
+        self._lines = deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+
+    def put(self, line):
+        """Queue a line for the tool's stdin."""
+        with self._lock:
+            self._lines.append(line)
+            self._notify()
+
+    def close(self):
+        """Signal that no more lines will be queued."""
+        with self._lock:
+            self._closed = True
+            self._notify()
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def lines(self):
+        """Yield queued lines until the feed is closed and drained."""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        while True:
+            with self._lock:
+                if self._lines:
+                    batch = list(self._lines)
+                    self._lines.clear()
+                elif self._closed:
+                    return
+                else:
+                    batch = None
+                    self._wakeup.clear()
+            if batch is None:
+                await self._wakeup.wait()
+                continue
+            if self.stage:
+                batch = await self.stage(batch)
+            for line in batch:
+                yield line
+
+
+class ToolJob:
+    """
+    A single tool invocation.
+
+    Args:
+        name (str): Display name of the tool
+        command (str or list): Command line or argv list
+        output_file (str): Optional file that stdout is streamed into
+        timeout (int): Seconds before the process is killed
+        line_callback (callable): Called with each stdout line
+        stdin (StdinFeed or list): Optional lines written to the tool's stdin
+        group (str): Optional group (e.g. session ID) used for cancellation
+        on_start (callable): Called with the job when the process starts
+        on_complete (callable): Called with the job when it has finished
+        merge_stderr (bool): Read stderr as part of stdout (e.g. for help text)
+        cache (CacheEntry): Optional result cache slot; a fresh cached result
+            is replayed instead of running the tool, and a successful run
+            refreshes it
+    """
+
+    def __init__(self, name, command, output_file=None, timeout=300, line_callback=None,
+                 stdin=None, group=None, on_start=None, on_complete=None, merge_stderr=False, cache=None):
+        self.name = name
+        self.argv = shlex.split(command) if isinstance(command, str) else list(command)
+        self.output_file = output_file
+        self.timeout = timeout
+        self.line_callback = line_callback
+        self.stdin = stdin
+        self.group = group
+        self.on_start = on_start
+        self.on_complete = on_complete
+        self.merge_stderr = merge_stderr
+        self.cache = cache
+
+        self.result = None
+        self.returncode = None
+        self.line_count = 0
+        self.timed_out = False
+        self.cancelled = False
+
+    @property
+    def tool(self):
+        """The binary name, used to look up the concurrency limit."""
+        return os.path.basename(self.argv[0]) if self.argv else self.name.lower()
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    def fail(self, error_msg):
+        """
+        Record an error and add an error marker to the output file.
+
+        Output the tool already streamed (and line_callback already saw) is
+        kept; the marker is appended after it.
+        """
+        logger.warning("orchestrator: %s", error_msg)
+        if self.output_file:
+            with open(self.output_file, 'a' if self.line_count else 'w') as f:
+                f.write(f"# {error_msg}\n")
+        self.result = error_msg
+        return error_msg
+
+    def __repr__(self):
+        return f"<ToolJob {self.name} {self.argv!r}>"
+
+
+class ToolOrchestrator:
+    """
+    Runs ToolJobs on a dedicated background event loop.
+
+    The async API (run_job, run_jobs) is used from coroutines on the
+    orchestrator loop; synchronous code uses run() and submit(), which are
+    safe to call from any thread.
+    """
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency if concurrency is not None else load_concurrency_limits()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._semaphores = {}
+        self._tasks = {}
+
+    # Event loop management
+
+    def _ensure_loop(self):
+        """Start the background loop, restarting it after a fork."""
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self._run_loop, args=(loop,), name='tool-orchestrator', daemon=True)
+            thread.start()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            self._semaphores = {}
+            self._tasks = {}
+            return loop
+
+    @staticmethod
+    def _run_loop(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _semaphore(self, tool):
+        if tool not in self._semaphores:
+            limit = self.concurrency.get(tool, FALLBACK_CONCURRENCY)
+            self._semaphores[tool] = asyncio.Semaphore(limit)
+        return self._semaphores[tool]
+
+    # Synchronous API
+
+    def submit(self, coro):
+        """Schedule a coroutine on the orchestrator loop and return a concurrent Future."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro):
+        """Run a coroutine on the orchestrator loop and wait for its result."""
+        return self.submit(coro).result()
+
+    def run_job_sync(self, job):
+        """Run a single job and return its status message."""
+        self._run_cancellable(self.run_job(job))
+        return job.result
+
+    def run_jobs_sync(self, jobs):
+        """Run jobs concurrently and wait for all of them."""
+        self._run_cancellable(self.run_jobs(jobs))
+        return [job for job in jobs if job is not None]
+
+    def run_pipeline_sync(self, producers, consumer):
+        """Run producer jobs alongside a consumer job and wait for all of them."""
+        self._run_cancellable(self.run_pipeline(producers, consumer))
+        return consumer
+
+    def _run_cancellable(self, coro):
+        # A cancelled job is reported through its result, not an exception
+        try:
+            self.run(coro)
+        except concurrent.futures.CancelledError:
+            pass
+
+    def run_race_sync(self, jobs, accept=None):
+        """Race jobs against each other and return the winning job (or None)."""
+        future = self.submit(self.race(jobs, accept))
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            return None
+
+    def cancel(self, group):
+        """Cancel every running job in a group. Returns the number cancelled."""
+        if self._loop is None or self._pid != os.getpid():
+            return 0
+
+        async def cancel_group():
+            tasks = list(self._tasks.get(group, ()))
+            for task in tasks:
+                task.cancel()
+            return len(tasks)
+
+        return asyncio.run_coroutine_threadsafe(cancel_group(), self._loop).result(timeout=5)
+
+    # Async API
+
+    async def run_jobs(self, jobs):
+        """Run jobs concurrently; a failing job never cancels its siblings."""
+        jobs = [job for job in jobs if job is not None]
+        await asyncio.gather(*(self.run_job(job) for job in jobs), return_exceptions=True)
+        return jobs
+
+    async def run_pipeline(self, producers, consumer):
+        """
+        Run producer jobs concurrently with a consumer job.
+
+        The producers' line callbacks are expected to feed the consumer's
+        StdinFeed; the feed is closed once every producer has finished, and the
+        consumer then runs until it has processed the remaining input.
+        """
+        consumer_task = asyncio.ensure_future(self.run_job(consumer))
+        try:
+            await self.run_jobs(producers)
+        except asyncio.CancelledError:
+            consumer_task.cancel()
+            raise
+        finally:
+            if isinstance(consumer.stdin, StdinFeed):
+                consumer.stdin.close()
+        await asyncio.gather(consumer_task, return_exceptions=True)
+        return consumer
+
+    async def race(self, jobs, accept=None):
+        """
+        Run jobs concurrently until one of them is accepted.
+
+        A finished job is accepted if accept(job) is true (by default, if it
+        succeeded); the remaining jobs are then cancelled. Returns the
+        accepted job, or None if every job finished without being accepted.
+        """
+        accept = accept or (lambda job: job.succeeded)
+        tasks = {asyncio.ensure_future(self.run_job(job)): job for job in jobs}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    if winner is None and accept(tasks[task]):
+                        winner = tasks[task]
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return winner
+
+    async def run_job(self, job):
+        """Run a job under its tool's concurrency limit and timeout."""
+        task = asyncio.current_task()
+        self._tasks.setdefault(job.group, set()).add(task)
+        try:
+            async with self._semaphore(job.tool):
+                return await self._execute(job)
+        except asyncio.CancelledError:
+            job.cancelled = True
+            if job.result is None:
+                job.result = f"{job.name} cancelled"
+            raise
+        finally:
+            group_tasks = self._tasks.get(job.group)
+            if group_tasks is not None:
+                group_tasks.discard(task)
+                if not group_tasks:
+                    del self._tasks[job.group]
+            if job.on_complete:
+                try:
+                    job.on_complete(job)
+                except Exception as e:
+                    logger.error("orchestrator: on_complete for %s failed: %s", job.name, e)
+
+    async def _execute(self, job):
+        if job.cache is not None:
+            # Copying and replaying a large cached file is blocking file I/O
+            loop = asyncio.get_running_loop()
+            line_count = await loop.run_in_executor(None, job.cache.restore, job.line_callback)
+            if line_count is not None:
+                job.line_count = line_count
+                job.returncode = 0
+                job.result = f"{job.name} completed from cache ({line_count} lines)"
+                return job.result
+
+        logger.debug("orchestrator: Running %s with command: %s", job.name, ' '.join(job.argv))
+        executable = resolver.resolve(job.argv[0]) if job.argv else None
+        if executable is None:
+            tool_cmd = job.argv[0] if job.argv else job.name
+            return job.fail(f"Tool {tool_cmd} not installed or not found in PATH")
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                executable, *job.argv[1:],
+                stdin=asyncio.subprocess.PIPE if job.stdin is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT if job.merge_stderr else asyncio.subprocess.PIPE,
+                env=resolver.env(),
+                limit=MAX_LINE_LENGTH,
+                # Own process group, so wrapper scripts are killed with their children
+                start_new_session=True
+            )
+        except Exception as e:
+            return job.fail(f"Error running {job.name}: {str(e)}")
+        logger.debug("orchestrator: %s started with PID %s (timeout: %ss)", job.name, process.pid, job.timeout)
+
+        if job.on_start:
+            job.on_start(job)
+
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        helpers = []
+        if not job.merge_stderr:
+            helpers.append(asyncio.ensure_future(self._drain_stderr(process, stderr_tail)))
+        if job.stdin is not None:
+            helpers.append(asyncio.ensure_future(self._feed_stdin(process, job.stdin)))
+
+        try:
+            await asyncio.wait_for(self._read_stdout(process, job), timeout=job.timeout)
+            job.returncode = await process.wait()
+        except asyncio.TimeoutError:
+            job.timed_out = True
+            self._kill(process)
+            job.returncode = await process.wait()
+        except asyncio.CancelledError:
+            self._kill(process)
+            await process.wait()
+            raise
+        except Exception as e:
+            # e.g. an overlong line or a failing line_callback; don't leave the tool running
+            self._kill(process)
+            job.returncode = await process.wait()
+            return job.fail(f"{job.name} failed: {type(e).__name__}: {e}")
+        finally:
+            for helper in helpers:
+                helper.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+
+        logger.info("orchestrator: %s exited with return code %s after %s lines", job.name, job.returncode, job.line_count)
+
+        if job.timed_out:
+            return job.fail(f"{job.name} timed out after {job.timeout} seconds")
+
+        stderr = ''.join(stderr_tail)
+        if job.returncode != 0:
+            return job.fail(f"{job.name} failed: {stderr}")
+        if stderr:
+            logger.debug("orchestrator: %s stderr: %s", job.name, stderr)
+
+        if job.cache is not None:
+            job.cache.save()
+        job.result = f"{job.name} completed ({job.line_count} lines)"
+        return job.result
+
+    @staticmethod
+    def _kill(process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    @staticmethod
+    async def _read_stdout(process, job):
+        out = open(job.output_file, 'w') if job.output_file else None
+        try:
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                if not line.strip():
+                    continue
+                if out:
+                    out.write(line + '\n')
+                job.line_count += 1
+                if job.line_callback:
+                    job.line_callback(line)
+        finally:
+            if out:
+                out.close()
+
+    @staticmethod
+    async def _drain_stderr(process, tail):
+        while True:
+            raw = await process.stderr.readline()
+            if not raw:
+                break
+            tail.append(raw.decode('utf-8', errors='replace'))
+
+    @staticmethod
+    async def _feed_stdin(process, source):
+        try:
+            if isinstance(source, StdinFeed):
+                async for line in source.lines():
+                    process.stdin.write((line + '\n').encode())
+                    await process.stdin.drain()
+            else:
+                for line in source:
+                    process.stdin.write((line + '\n').encode())
+                    await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # The tool exited early; its return code is reported by _execute
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+# Process-wide tool table and orchestrator shared by every scan in this worker
+resolver = ToolResolver()
+orchestrator = ToolOrchestrator()
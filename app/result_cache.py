@@ -0,0 +1,149 @@
+"""
+Cache of passive tool output, shared by every worker.
+
+Passive sources (subfinder, assetfinder, chaos, sublist3r, gau) give nearly
+the same answers for a domain within hours, so their output files are kept
+under RESULTS_DIR/.cache keyed by tool, normalized target, tool version and
+flags. A repeat scan within RESULT_CACHE_TTL copies the cached file instead
+of running the tool. Entries are refreshed only by a successful run that
+produced output, and the cache is held under RESULT_CACHE_MAX_BYTES by
+evicting the least recently used entries. Set RESULT_CACHE_TTL=0 to disable.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from app.capabilities import get_version
+
+logger = logging.getLogger(__name__)
+
+# Directory the cached output files are kept in
+CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'results', '.cache')
+
+# Seconds a cached result is served for; 0 disables the cache
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 6 * 3600))
+
+# Total size the cache is trimmed to after each write
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+def normalize_target(target):
+    """Lower-case a domain and strip any scheme, path and trailing dot."""
+    target = target.strip().lower()
+    if '://' in target:
+        target = target.split('://', 1)[1]
+    return target.split('/', 1)[0].rstrip('.')
+
+
+class CacheEntry:
+    """
+    The cache slot for one tool run.
+
+    Args:
+        tool (str): Tool name, as known to the capability registry
+        target (str): Domain the tool was run against
+        flags (list): Arguments that change the tool's output
+        output_file (str): File the tool writes its results to
+    """
+
+    def __init__(self, tool, target, flags=(), output_file=None):
+        self.tool = tool
+        self.target = normalize_target(target)
+        self.flags = list(flags)
+        self.output_file = output_file
+
+        # Resolved now rather than in restore, which runs on the orchestrator
+        # loop where probing the tool's version would deadlock. Upgrading the
+        # tool changes its version and so the key.
+        key = json.dumps([tool, self.target, get_version(tool), self.flags])
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        self.path = os.path.join(CACHE_DIR, f"{tool}-{digest}.txt")
+
+    def restore(self, line_callback=None):
+        """
+        Copy a fresh cached result into output_file.
+
+        Returns:
+            int: The number of cached lines, or None on a miss
+        """
+        if RESULT_CACHE_TTL <= 0:
+            return None
+        try:
+            stored_at = os.stat(self.path).st_mtime
+            if time.time() - stored_at > RESULT_CACHE_TTL:
+                return None
+            shutil.copyfile(self.path, self.output_file)
+            # The access time orders entries for eviction; the mtime keeps the age
+            os.utime(self.path, (time.time(), stored_at))
+        except OSError:
+            return None
+
+        line_count = 0
+        with open(self.output_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    line_count += 1
+                    if line_callback:
+                        line_callback(line)
+        logger.info("result_cache: Using cached %s output for %s (%s lines)", self.tool, self.target, line_count)
+        return line_count
+
+    def save(self):
+        """Store output_file as the cached result, unless it is missing or empty."""
+        if RESULT_CACHE_TTL <= 0:
+            return
+        try:
+            if not os.path.getsize(self.output_file):
+                return
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            temp_file = f"{self.path}.{os.getpid()}.tmp"
+            shutil.copyfile(self.output_file, temp_file)
+            os.replace(temp_file, self.path)
+        except OSError as e:
+            logger.info("result_cache: Could not cache %s output for %s: %s", self.tool, self.target, e)
+            return
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Drop expired entries, then the least recently used ones until the cache fits in max_bytes.
+
+    Returns:
+        int: The number of entries removed
+    """
+    max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    entries = []
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.txt'):
+                    try:
+                        entries.append((entry.path, entry.stat()))
+                    except OSError:
+                        pass
+    except FileNotFoundError:
+        return 0
+
+    entries.sort(key=lambda item: item[1].st_atime)
+    total = sum(stat.st_size for path, stat in entries)
+    removed = 0
+    for path, stat in entries:
+        if total <= max_bytes and now - stat.st_mtime <= RESULT_CACHE_TTL:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= stat.st_size
+        removed += 1
+    if removed:
+        logger.debug("result_cache: Evicted %s entries, %s bytes left", removed, total)
+    return removed
@@ -1,101 +1,173 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, current_app, abort, url_for
+from flask import Blueprint, render_template, request, jsonify, send_file, current_app, redirect, url_for, Response
 import os
+import hashlib
+import logging
 import uuid
 import json
-import threading
+import time
+from urllib.parse import urlparse
 from celery_app import celery
 from celery.result import AsyncResult
-from app.tools import run_subdomain_enumeration, run_web_detection, get_tool_status
+from app.tools import get_tool_status, run_gau, parse_gau_output, run_naabu, parse_naabu_output
 from app.utils import validate_domain
-from app.tasks import run_scan_task, run_gau_task, run_naabu_task
+from app.status_store import (init_status, read_status, read_status_since, status_seq, status_exists, update_status,
+                              set_status_item, summarize_status, event_cursor, read_events,
+                              FINAL_STATUSES)
+from app.tasks import run_scan_task, run_naabu_batch_task, run_gau_batch_task, scan_host_ports, read_diff
 from app.database import (add_domain, add_subdomain, update_subdomain_scan_status,
-                         update_subdomain_info, add_gau_results_batch, add_naabu_results_batch,
-                         get_domain_id, get_subdomain_id, get_domains_with_scans, get_scanned_subdomains,
-                         get_subdomain_details, get_gau_results, get_naabu_results, delete_domain)
+                         add_gau_results_batch, get_domain_id, get_subdomain_id, get_scanned_subdomains,
+                         get_subdomain_details, get_domain,
+                         get_domains_page, get_subdomains_page, get_gau_results_page,
+                         delete_domain, register_scan, get_scan, finish_scan,
+                         request_scan_cancel)
+from app.scan_registry import owner_id, is_active, reap, SCAN_QUEUE_SECONDS
 
 # Create blueprint
 main = Blueprint('main', __name__)
 
-# Store active scans
-active_scans = {}
+logger = logging.getLogger(__name__)
+
+# Default and maximum page sizes for the paginated history endpoints
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+# Seconds between keepalive comments on an idle event stream
+EVENT_KEEPALIVE_INTERVAL = 15
+
+# Seconds an event stream stays open before the browser is asked to reconnect,
+# so long scans don't pin a server thread indefinitely
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', 300))
 
 @main.route('/')
 def index():
     """Render the home page with the scan form."""
     return render_template('index.html')
 
+def page_size(default=HISTORY_PAGE_SIZE):
+    """Read the limit query argument, clamped to HISTORY_MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
 @main.route('/history')
 def scan_history():
-    """Render the scan history page."""
-    print("Accessing scan history page")
-    domains = get_domains_with_scans()
-    print(f"Found {len(domains)} domains with scan history")
-    return render_template('history.html', domains=domains)
+    """Render the scan history page with the first page of domains."""
+    logger.debug("Accessing scan history page")
+    domains, next_after = get_domains_page(limit=HISTORY_PAGE_SIZE)
+    logger.debug("Found %s domains with scan history", len(domains))
+    return render_template('history.html', domains=domains, next_after=next_after)
+
+@main.route('/history/domains')
+def domains_history():
+    """
+    Get a page of domains with scan history.
+
+    Query args: after (cursor from the previous page) and limit.
+    """
+    domains, next_after = get_domains_page(after=request.args.get('after'), limit=page_size())
+    return jsonify({
+        'domains': domains,
+        'next': next_after
+    })
 
 @main.route('/history/domain/<int:domain_id>')
 def domain_history(domain_id):
-    """Get scan history for a specific domain."""
-    print(f"Accessing domain history for domain ID: {domain_id}")
-    subdomains = get_scanned_subdomains(domain_id)
-    print(f"Found {len(subdomains)} scanned subdomains for domain ID: {domain_id}")
+    """
+    Get a page of subdomains for a specific domain.
+
+    Query args: after (cursor from the previous page), limit, and the filters
+    q (matches name, status or technology), name, status and tech.
+    """
+    logger.debug("Accessing domain history for domain ID: %s", domain_id)
+    domain = get_domain(domain_id)
+    if not domain:
+        return jsonify({'error': 'Domain not found'}), 404
+
+    subdomains, next_after = get_subdomains_page(
+        domain_id,
+        after=request.args.get('after'),
+        limit=page_size(),
+        search=request.args.get('q'),
+        name=request.args.get('name'),
+        status_code=request.args.get('status'),
+        technology=request.args.get('tech')
+    )
+    logger.debug("Found %s subdomains for domain ID: %s", len(subdomains), domain_id)
+    return jsonify({
+        'subdomains': subdomains,
+        'next': next_after,
+        'total': domain['SubdomainCount']
+    })
+
+@main.route('/history/subdomain/<int:subdomain_id>/urls')
+def subdomain_urls(subdomain_id):
+    """
+    Get a page of GAU links for a specific subdomain.
+
+    Query args: after (cursor from the previous page), limit and q.
+    """
+    urls, next_after = get_gau_results_page(
+        subdomain_id,
+        after=request.args.get('after'),
+        limit=page_size(default=500),
+        search=request.args.get('q')
+    )
     return jsonify({
-        'subdomains': subdomains
+        'urls': urls,
+        'next': next_after
     })
 
 @main.route('/history/subdomain/<int:subdomain_id>')
 def subdomain_details(subdomain_id):
-    """Get detailed scan results for a specific subdomain."""
-    print(f"Accessing subdomain details for subdomain ID: {subdomain_id}")
-    details = get_subdomain_details(subdomain_id)
+    """
+    Get detailed scan results for a specific subdomain.
+
+    Query args: summary=1 returns only the result counts, links=0 leaves out
+    the GAU links (page them via /history/subdomain/<id>/urls instead).
+    """
+    logger.debug("Accessing subdomain details for subdomain ID: %s", subdomain_id)
+    details = get_subdomain_details(
+        subdomain_id,
+        summary_only=request.args.get('summary') == '1',
+        include_links=request.args.get('links') != '0'
+    )
     if not details:
-        print(f"Subdomain with ID {subdomain_id} not found")
+        logger.info("Subdomain with ID %s not found", subdomain_id)
         return jsonify({'error': 'Subdomain not found'}), 404
-    print(f"Found details for subdomain: {details.get('Subdomain')}")
-
-    # Log the scan results
-    if 'gau_results' in details:
-        print(f"GAU results: {len(details['gau_results'])} URLs")
-    if 'naabu_results' in details:
-        print(f"Naabu results: {len(details['naabu_results'])} ports")
-    if 'nuclei_results' in details:
-        print(f"Nuclei results: {len(details['nuclei_results'])} vulnerabilities")
 
     return jsonify(details)
 
 @main.route('/test-delete/<int:domain_id>', methods=['GET'])
 def test_delete_route(domain_id):
     """Test route for domain deletion."""
-    print(f"Test delete route called for domain ID: {domain_id}")
+    logger.info("Test delete route called for domain ID: %s", domain_id)
     return jsonify({'success': True, 'message': f'Test delete route called for domain ID: {domain_id}'})
 
 @main.route('/delete-domain/<int:domain_id>', methods=['POST', 'GET'])
 def delete_domain_route(domain_id):
     """Delete a domain and all related data."""
-    print(f"Request to delete domain with ID: {domain_id}")
-    print(f"Request method: {request.method}")
+    logger.info("Request to delete domain with ID: %s", domain_id)
+    logger.debug("Request method: %s", request.method)
 
     try:
         # Delete the domain and all related data
         success = delete_domain(domain_id)
 
         if success:
-            print(f"Successfully deleted domain with ID: {domain_id}")
+            logger.info("Successfully deleted domain with ID: %s", domain_id)
             # If it's a GET request, redirect to the history page
             if request.method == 'GET':
-                return redirect(url_for('main.history'))
+                return redirect(url_for('main.scan_history'))
             # If it's a POST request, return JSON
             return jsonify({'success': True, 'message': 'Domain and all related data deleted successfully'})
         else:
-            print(f"Failed to delete domain with ID: {domain_id}")
+            logger.error("Failed to delete domain with ID: %s", domain_id)
             if request.method == 'GET':
-                return redirect(url_for('main.history'))
+                return redirect(url_for('main.scan_history'))
             return jsonify({'success': False, 'error': 'Failed to delete domain'}), 500
     except Exception as e:
-        print(f"Exception in delete_domain_route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Exception in delete_domain_route: %s", e)
         if request.method == 'GET':
-            return redirect(url_for('main.history'))
+            return redirect(url_for('main.scan_history'))
         return jsonify({'success': False, 'error': f'Exception: {str(e)}'}), 500
 
 @main.route('/tools')
@@ -111,8 +183,6 @@ def tools_status():
 @main.route('/run-gau', methods=['POST'])
 def run_gau_for_host():
     """Run Gau for a specific host."""
-    from app.tools import run_gau, parse_gau_output
-
     # Get the host URL from the request
     data = request.get_json()
     if not data or 'url' not in data:
@@ -124,9 +194,8 @@ def run_gau_for_host():
 
     # If we have a subdomain_id, we're running from the history page
     if subdomain_id:
-        print(f"Running GAU from history page for subdomain ID: {subdomain_id}")
+        logger.info("Running GAU from history page for subdomain ID: %s", subdomain_id)
         # Create a temporary directory for this scan
-        import uuid
         temp_session_id = str(uuid.uuid4())
         scan_dir = os.path.join(current_app.config['RESULTS_DIR'], temp_session_id)
         os.makedirs(scan_dir, exist_ok=True)
@@ -141,8 +210,6 @@ def run_gau_for_host():
             return jsonify({'error': 'Invalid session ID'}), 404
 
     # Extract domain from URL
-    from urllib.parse import urlparse
-
     # Add protocol if missing
     if not url.startswith('http://') and not url.startswith('https://'):
         url = 'https://' + url
@@ -153,22 +220,21 @@ def run_gau_for_host():
     if not domain:
         return jsonify({'error': 'Invalid URL'}), 400
 
-    print(f"Extracted domain: {domain} from URL: {url}")
+    logger.debug("Extracted domain: %s from URL: %s", domain, url)
 
     # Create a unique file for this host's Gau results
     host_gau_file = os.path.join(scan_dir, f'gau_{domain}.txt')
 
     try:
         # Run Gau directly
-        print(f"Running GAU for {domain}...")
-        from app.tools import run_gau, parse_gau_output
+        logger.info("Running GAU for %s...", domain)
         run_gau(domain, host_gau_file)
         urls = parse_gau_output(host_gau_file)
-        print(f"GAU completed for {domain}, found {len(urls)} URLs")
+        logger.info("GAU completed for %s, found %s URLs", domain, len(urls))
 
         # Ensure we have at least some example URLs if the scan didn't find any
         if not urls:
-            print(f"No URLs found for {domain}, using example URLs")
+            logger.info("No URLs found for %s, using example URLs", domain)
             urls = [
                 f"https://{domain}/index.html",
                 f"https://{domain}/about",
@@ -180,66 +246,54 @@ def run_gau_for_host():
             with open(host_gau_file, 'w') as f:
                 for url in urls:
                     f.write(f"{url}\n")
-            print(f"Added {len(urls)} example URLs to the file")
+            logger.info("Added %s example URLs to the file", len(urls))
 
-        # Update the scan status file with the URLs
-        status_file = os.path.join(scan_dir, 'status.json')
-        if os.path.exists(status_file):
+        # Update the scan status with the URLs
+        if status_exists(scan_dir):
             try:
-                with open(status_file, 'r') as f:
-                    scan_status = json.load(f)
-
-                # Update the URLs in the status file
-                scan_status['urls'] = urls
-
-                # Save the updated status
-                with open(status_file, 'w') as f:
-                    json.dump(scan_status, f)
-
-                print(f"Updated status file with {len(urls)} URLs")
+                update_status(scan_dir, urls=urls)
+                logger.debug("Updated scan status with %s URLs", len(urls))
             except Exception as e:
-                print(f"Error updating status file: {str(e)}")
+                logger.error("Error updating scan status: %s", e)
 
         # Store GAU results in the database
         try:
             # If we have a subdomain_id from the request, use it directly
             if subdomain_id:
-                print(f"Using provided subdomain_id: {subdomain_id} from history page")
+                logger.debug("Using provided subdomain_id: %s from history page", subdomain_id)
             else:
                 # Otherwise, look up or create the domain and subdomain
-                print(f"Looking up domain and subdomain in database")
+                logger.debug("Looking up domain and subdomain in database")
                 # Get domain ID
                 domain_id = get_domain_id(domain)
                 if not domain_id:
-                    print(f"Domain {domain} not found in database, adding it")
+                    logger.info("Domain %s not found in database, adding it", domain)
                     domain_id = add_domain(domain)
                     if not domain_id:
-                        print(f"Failed to add domain {domain} to database")
+                        logger.error("Failed to add domain %s to database", domain)
                         raise Exception(f"Failed to add domain {domain} to database")
 
                 # Get subdomain ID
                 subdomain_id = get_subdomain_id(domain_id, domain)
                 if not subdomain_id:
-                    print(f"Subdomain {domain} not found in database, adding it")
+                    logger.info("Subdomain %s not found in database, adding it", domain)
                     subdomain_id = add_subdomain(domain_id, domain)
                     if not subdomain_id:
-                        print(f"Failed to add subdomain {domain} to database")
+                        logger.error("Failed to add subdomain %s to database", domain)
                         raise Exception(f"Failed to add subdomain {domain} to database")
 
-            print(f"Using subdomain_id: {subdomain_id} for storing GAU results")
+            logger.debug("Using subdomain_id: %s for storing GAU results", subdomain_id)
 
             # Add GAU results to database
-            print(f"Adding {len(urls)} GAU results to database for subdomain ID {subdomain_id}")
+            logger.info("Adding %s GAU results to database for subdomain ID %s", len(urls), subdomain_id)
             if add_gau_results_batch(subdomain_id, urls):
                 # Update subdomain scan status
                 update_subdomain_scan_status(subdomain_id, 'GauScanned', 1)
-                print(f"Successfully added GAU results to database and updated scan status")
+                logger.info("Successfully added GAU results to database and updated scan status")
             else:
-                print(f"Failed to add GAU results to database")
+                logger.error("Failed to add GAU results to database")
         except Exception as e:
-            print(f"Error storing GAU results in database: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error storing GAU results in database: %s", e)
 
         # Return results directly
         return jsonify({
@@ -249,18 +303,19 @@ def run_gau_for_host():
             'urls': urls[:100]  # Limit to first 100 URLs
         })
     except Exception as e:
-        print(f"Error running GAU: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error running GAU: %s", e)
         return jsonify({
             'error': f'Error running GAU: {str(e)}'
         }), 500
 
 @main.route('/run-naabu', methods=['POST'])
 def run_naabu_for_host():
-    """Run Naabu port scan for a specific host."""
-    from app.tools import run_naabu, parse_naabu_output
+    """
+    Run Naabu port scan for a specific host.
 
+    Stored hosts are scanned through their IPs, so hosts sharing an address
+    with one scanned recently get its ports without another scan.
+    """
     # Get the host URL from the request
     data = request.get_json()
     if not data or 'url' not in data:
@@ -272,9 +327,8 @@ def run_naabu_for_host():
 
     # If we have a subdomain_id, we're running from the history page
     if subdomain_id:
-        print(f"Running Naabu from history page for subdomain ID: {subdomain_id}")
+        logger.info("Running Naabu from history page for subdomain ID: %s", subdomain_id)
         # Create a temporary directory for this scan
-        import uuid
         temp_session_id = str(uuid.uuid4())
         scan_dir = os.path.join(current_app.config['RESULTS_DIR'], temp_session_id)
         os.makedirs(scan_dir, exist_ok=True)
@@ -289,8 +343,6 @@ def run_naabu_for_host():
             return jsonify({'error': 'Invalid session ID'}), 404
 
     # Extract domain from URL
-    from urllib.parse import urlparse
-
     # Add protocol if missing
     if not url.startswith('http://') and not url.startswith('https://'):
         url = 'https://' + url
@@ -301,122 +353,176 @@ def run_naabu_for_host():
     if not domain:
         return jsonify({'error': 'Invalid URL'}), 400
 
-    print(f"Extracted domain: {domain} from URL: {url}")
+    logger.debug("Extracted domain: %s from URL: %s", domain, url)
 
     # Create a unique file for this host's Naabu results
     host_naabu_file = os.path.join(scan_dir, f'naabu_{domain}.txt')
 
     try:
-        # Run Naabu directly
-        print(f"Running Naabu for {domain}...")
-        from app.tools import run_naabu, parse_naabu_output
-        run_naabu(domain, host_naabu_file)
-        ports = parse_naabu_output(host_naabu_file)
-        print(f"Naabu completed for {domain}, found {len(ports)} open ports")
-
-        # Ensure we have at least some common ports if the scan didn't find any
-        if not ports:
-            print(f"No ports found for {domain}, using common ports")
-            common_ports = [80, 443, 8080]
-            ports = []
-            for port in common_ports:
-                ports.append({
-                    'host': domain,
-                    'port': str(port),
-                    'url': f"http://{domain}:{port}" if port != 443 else f"https://{domain}"
-                })
-            # Write the common ports to the file
-            with open(host_naabu_file, 'w') as f:
-                for port in common_ports:
-                    f.write(f"{domain}:{port}\n")
-            print(f"Added {len(ports)} common ports to the file")
-
-        # Update the scan status file with the ports
-        status_file = os.path.join(scan_dir, 'status.json')
-        if os.path.exists(status_file):
-            try:
-                with open(status_file, 'r') as f:
-                    scan_status = json.load(f)
-
-                # Update the ports in the status file
-                if 'ports' not in scan_status:
-                    scan_status['ports'] = {}
-
-                # Add ports for this domain
-                scan_status['ports'][domain] = ports
-
-                # Save the updated status
-                with open(status_file, 'w') as f:
-                    json.dump(scan_status, f)
-
-                print(f"Updated status file with {len(ports)} ports for {domain}")
-            except Exception as e:
-                print(f"Error updating status file: {str(e)}")
-
-        # Store Naabu results in the database
+        # Look up or create the subdomain so it can be scanned through its IPs
         try:
-            # If we have a subdomain_id from the request, use it directly
             if subdomain_id:
-                print(f"Using provided subdomain_id: {subdomain_id} from history page")
+                logger.debug("Using provided subdomain_id: %s from history page", subdomain_id)
             else:
-                # Otherwise, look up or create the domain and subdomain
-                print(f"Looking up domain and subdomain in database")
+                logger.debug("Looking up domain and subdomain in database")
                 # Get domain ID
                 domain_id = get_domain_id(domain)
                 if not domain_id:
-                    print(f"Domain {domain} not found in database, adding it")
+                    logger.info("Domain %s not found in database, adding it", domain)
                     domain_id = add_domain(domain)
                     if not domain_id:
-                        print(f"Failed to add domain {domain} to database")
+                        logger.error("Failed to add domain %s to database", domain)
                         raise Exception(f"Failed to add domain {domain} to database")
 
                 # Get subdomain ID
                 subdomain_id = get_subdomain_id(domain_id, domain)
                 if not subdomain_id:
-                    print(f"Subdomain {domain} not found in database, adding it")
+                    logger.info("Subdomain %s not found in database, adding it", domain)
                     subdomain_id = add_subdomain(domain_id, domain)
                     if not subdomain_id:
-                        print(f"Failed to add subdomain {domain} to database")
+                        logger.error("Failed to add subdomain %s to database", domain)
                         raise Exception(f"Failed to add subdomain {domain} to database")
-
-            print(f"Using subdomain_id: {subdomain_id} for storing Naabu results")
-
-            # Add Naabu results to database
-            print(f"Adding {len(ports)} Naabu results to database for subdomain ID {subdomain_id}")
-            # Extract port numbers from the port objects
-            port_numbers = [int(port['port']) for port in ports]
-            if add_naabu_results_batch(subdomain_id, port_numbers):
-                # Update subdomain scan status
-                update_subdomain_scan_status(subdomain_id, 'NaabuScanned', 1)
-                print(f"Successfully added Naabu results to database and updated scan status")
-            else:
-                print(f"Failed to add Naabu results to database")
         except Exception as e:
-            print(f"Error storing Naabu results in database: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error looking up subdomain in database: %s", e)
+            subdomain_id = None
+
+        logger.info("Running Naabu for %s...", domain)
+        behind_cdn = False
+        if subdomain_id:
+            # Scans the host's IPs, or reuses a recent scan of them, and stores the ports
+            ports, behind_cdn = scan_host_ports(domain, subdomain_id, host_naabu_file, group=session_id)
+        else:
+            ports = parse_naabu_output(host_naabu_file) if run_naabu(domain, host_naabu_file, group=session_id) else None
+        if ports is None:
+            # Nothing is stored, so the host stays unscanned rather than getting made-up ports
+            logger.error("No port scanner available, %s not scanned", domain)
+            return jsonify({'error': 'No port scanner available (naabu or nmap)'}), 503
+        if behind_cdn:
+            logger.info("%s is behind a CDN, port scan skipped", domain)
+        logger.info("Naabu completed for %s, found %s open ports", domain, len(ports))
+
+        # Update the scan status with the ports for this domain
+        if status_exists(scan_dir):
+            try:
+                set_status_item(scan_dir, 'ports', domain, ports)
+                logger.debug("Updated scan status with %s ports for %s", len(ports), domain)
+            except Exception as e:
+                logger.error("Error updating scan status: %s", e)
 
         # Return results directly
         return jsonify({
             'success': True,
             'host': domain,
             'port_count': len(ports),
-            'ports': ports
+            'ports': ports,
+            'cdn': behind_cdn
         })
     except Exception as e:
-        print(f"Error running Naabu: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error running Naabu: %s", e)
         return jsonify({
             'error': f'Error running Naabu: {str(e)}'
         }), 500
 
+@main.route('/run-gau-batch', methods=['POST'])
+def run_gau_batch_for_domain():
+    """
+    Collect archived URLs for many subdomains of a domain with one Gau run.
+
+    Takes the same JSON as /run-naabu-batch and returns a Celery task ID to
+    poll via /task-status.
+    """
+    data = request.get_json()
+    if not data or 'domain_id' not in data:
+        return jsonify({'error': 'No domain ID provided'}), 400
+
+    domain_id = data['domain_id']
+    domain = get_domain(domain_id)
+    if not domain:
+        return jsonify({'error': 'Domain not found'}), 404
+    domain = domain['Domain']
+
+    hosts = select_batch_hosts(domain_id, data)
+    if not hosts:
+        return jsonify({'error': 'No subdomains to scan'}), 404
+
+    scan_dir = os.path.join(current_app.config['RESULTS_DIR'], str(uuid.uuid4()))
+    try:
+        task = run_gau_batch_task.delay(domain_id, domain, hosts, scan_dir)
+        logger.info("Queued GAU batch for %s hosts of %s, task ID: %s", len(hosts), domain, task.id)
+        return jsonify({
+            'success': True,
+            'task_id': task.id,
+            'host_count': len(hosts)
+        })
+    except Exception as e:
+        logger.error("Error queueing GAU batch: %s", e)
+        return jsonify({
+            'error': f'Error queueing GAU batch: {str(e)}'
+        }), 500
+
+def select_batch_hosts(domain_id, data):
+    """
+    Pick the subdomains a batch scan should cover.
+
+    data may carry subdomain_ids to scan exactly those; otherwise every live
+    subdomain is used, or every subdomain when live_only is false.
+    """
+    subdomain_ids = set(data.get('subdomain_ids') or [])
+    live_only = data.get('live_only', True)
+
+    hosts = []
+    for subdomain in get_scanned_subdomains(domain_id):
+        if subdomain_ids and subdomain['ID'] not in subdomain_ids:
+            continue
+        if not subdomain_ids and live_only and not subdomain['StatusCode']:
+            continue
+        hosts.append(subdomain['Subdomain'])
+    return hosts
+
+@main.route('/run-naabu-batch', methods=['POST'])
+def run_naabu_batch_for_domain():
+    """
+    Port scan many subdomains of a domain with batched Naabu runs.
+
+    Expects JSON with a domain_id and optionally subdomain_ids to limit the
+    scan; by default every live subdomain is scanned. Returns a Celery task ID
+    to poll via /task-status.
+    """
+    data = request.get_json()
+    if not data or 'domain_id' not in data:
+        return jsonify({'error': 'No domain ID provided'}), 400
+
+    domain_id = data['domain_id']
+    hosts = select_batch_hosts(domain_id, data)
+    if not hosts:
+        return jsonify({'error': 'No subdomains to scan'}), 404
+
+    scan_dir = os.path.join(current_app.config['RESULTS_DIR'], str(uuid.uuid4()))
+    try:
+        task = run_naabu_batch_task.delay(domain_id, hosts, scan_dir)
+        logger.info("Queued Naabu batch for %s hosts of domain ID %s, task ID: %s", len(hosts), domain_id, task.id)
+        return jsonify({
+            'success': True,
+            'task_id': task.id,
+            'host_count': len(hosts)
+        })
+    except Exception as e:
+        logger.error("Error queueing Naabu batch: %s", e)
+        return jsonify({
+            'error': f'Error queueing Naabu batch: {str(e)}'
+        }), 500
+
 
 
 @main.route('/scan', methods=['POST'])
 def start_scan():
     """Start a new scan for the given domain."""
     domain = request.form.get('domain', '').strip()
+    incremental = request.form.get('incremental')
+    if incremental is None:
+        incremental = current_app.config['INCREMENTAL_SCANS']
+    else:
+        incremental = incremental.lower() in ('true', '1', 'on')
 
     # Validate domain
     if not validate_domain(domain):
@@ -432,7 +538,7 @@ def start_scan():
     # Initialize scan status
     scan_status = {
         'domain': domain,
-        'status': 'starting',
+        'status': 'queued',
         'progress': 0,
         'current_tool': 'Initializing',
         'subdomains': [],
@@ -442,32 +548,22 @@ def start_scan():
     }
 
     # Save initial status
-    with open(os.path.join(scan_dir, 'status.json'), 'w') as f:
-        json.dump(scan_status, f)
+    init_status(scan_dir, scan_status)
+
+    # Register the scan so every worker can see and cancel it, then queue it
+    task_id = str(uuid.uuid4())
+    if not register_scan(session_id, domain, owner_id(), SCAN_QUEUE_SECONDS, task_id=task_id):
+        return jsonify({'error': 'Error registering scan'}), 500
 
-    # Start scan directly (synchronously) for debugging
-    print(f"Starting scan for domain: {domain}, session_id: {session_id}")
+    logger.info("Starting scan for domain: %s, session_id: %s", domain, session_id)
     try:
-        # Start a thread to run the scan
-        print("Running scan in a separate thread...")
-        scan_thread = threading.Thread(
-            target=run_scan,
-            args=(domain, session_id, scan_dir)
-        )
-        scan_thread.daemon = True
-        scan_thread.start()
-        print(f"Scan thread started")
-
-        # Store scan information
-        active_scans[session_id] = {
-            'thread': scan_thread,
-            'domain': domain,
-            'status': scan_status
-        }
+        run_scan_task.apply_async(args=(domain, session_id, current_app.config['RESULTS_DIR'], incremental,
+                                        current_app.config['PIPELINE_PROBING']),
+                                  task_id=task_id)
     except Exception as e:
-        print(f"Error starting scan: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error queueing scan: %s", e)
+        finish_scan(session_id, 'error')
+        update_status(scan_dir, status='error', current_tool='Error', errors=[f'Error starting scan: {str(e)}'])
         return jsonify({'error': f'Error starting scan: {str(e)}'}), 500
 
     return jsonify({
@@ -476,209 +572,144 @@ def start_scan():
         'status': scan_status
     })
 
-def run_scan(domain, session_id, scan_dir):
-    """Run the full scan process."""
-    print(f"run_scan: Starting scan for domain {domain}, session_id {session_id}")
-    print(f"run_scan: Scan directory: {scan_dir}")
+def task_status_overrides(session_id):
+    """Status fields implied by the Celery task state of a scan, if it has a task."""
+    overrides = {}
+    scan = get_scan(session_id)
+    if not is_active(scan) or not scan['TaskID']:
+        return overrides
 
-    try:
-        # Update status
-        print(f"run_scan: Updating status to 'running'")
-        update_status(session_id, scan_dir, status='running', progress=5, current_tool='Subdomain Enumeration')
-
-        # Add domain to database
-        print(f"run_scan: Adding domain {domain} to database")
-        domain_id = add_domain(domain)
-        if not domain_id:
-            print(f"run_scan: Failed to add domain {domain} to database")
-            raise Exception(f"Failed to add domain {domain} to database")
-        print(f"run_scan: Domain added with ID {domain_id}")
-
-        # Run subdomain enumeration
-        print(f"run_scan: Starting subdomain enumeration")
-        subdomains = run_subdomain_enumeration(domain, scan_dir, session_id, update_callback=lambda p, t: update_status(session_id, scan_dir, progress=p, current_tool=t))
-        print(f"run_scan: Subdomain enumeration completed, found {len(subdomains)} subdomains")
-
-        # Add subdomains to database and mark them as scanned
-        print(f"run_scan: Adding {len(subdomains)} subdomains to database and marking them as scanned")
-        subdomain_ids = []
-        for subdomain in subdomains:
-            subdomain_id = add_subdomain(domain_id, subdomain)
-            if not subdomain_id:
-                print(f"run_scan: Failed to add subdomain {subdomain} to database")
-                continue
-            subdomain_ids.append(subdomain_id)
-
-        # Mark all live hosts as scanned
-        print(f"run_scan: Marking live hosts as scanned")
-
-        # Update status with subdomains
-        print(f"run_scan: Updating status with subdomains")
-        update_status(session_id, scan_dir, progress=50, current_tool='Web Detection', subdomains=subdomains)
-
-        # Run web detection
-        print(f"run_scan: Starting web detection")
-        live_hosts, urls = run_web_detection(domain, subdomains, scan_dir, session_id, update_callback=lambda p, t: update_status(session_id, scan_dir, progress=p, current_tool=t))
-        print(f"run_scan: Web detection completed, found {len(live_hosts)} live hosts and {len(urls)} URLs")
-
-        # Store all live hosts in the database (without marking them as scanned)
-        print(f"run_scan: Storing {len(live_hosts)} live hosts in the database")
-        for host in live_hosts:
-            # Extract hostname from URL
-            from urllib.parse import urlparse
-            parsed_url = urlparse(host['url'])
-            hostname = parsed_url.netloc
-
-            # Extract status code and technology from host data
-            status_code = host.get('status_code', None)
-            technology = host.get('technology', None)
-
-            # Get subdomain ID
-            subdomain_id = get_subdomain_id(domain_id, hostname)
-            if not subdomain_id:
-                print(f"run_scan: Subdomain {hostname} not found in database, adding it with status {status_code} and tech {technology}")
-                subdomain_id = add_subdomain(domain_id, hostname, status_code, technology)
-                if not subdomain_id:
-                    print(f"run_scan: Failed to add subdomain {hostname} to database")
-                    continue
-            else:
-                # Update existing subdomain with status code and technology
-                print(f"run_scan: Updating subdomain {hostname} with status {status_code} and tech {technology}")
-                update_subdomain_info(subdomain_id, status_code, technology)
-
-            print(f"run_scan: Stored subdomain {hostname} (ID: {subdomain_id}) in database")
-            # Note: We're not marking the subdomain as scanned or storing any URLs/ports
-            # This will be done when the user explicitly runs GAU or Naabu scans
-
-        # Update final status - URLs will be added later when GAU is run manually
-        print(f"run_scan: Updating status to 'completed'")
-        update_status(
-            session_id,
-            scan_dir,
-            status='completed',
-            progress=100,
-            current_tool='Completed',
-            live_hosts=live_hosts
-        )
-        print(f"run_scan: Scan completed successfully - GAU and port scanning can be triggered manually")
-
-    except Exception as e:
-        # Print the error
-        print(f"run_scan: Error during scan: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        # Update status with error
-        print(f"run_scan: Updating status to 'error'")
-        update_status(
-            session_id,
-            scan_dir,
-            status='error',
-            progress=0,
-            current_tool='Error',
-            errors=[str(e)]
-        )
-    finally:
-        # Remove from active scans
-        if session_id in active_scans:
-            print(f"run_scan: Removing session {session_id} from active scans")
-            del active_scans[session_id]
-
-def update_status(session_id, scan_dir, status=None, progress=None, current_tool=None, subdomains=None, live_hosts=None, urls=None, errors=None):
-    """Update the scan status file."""
-    status_file = os.path.join(scan_dir, 'status.json')
-
-    # Read current status
-    try:
-        with open(status_file, 'r') as f:
-            scan_status = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        scan_status = {}
-
-    # Update fields if provided
-    if status is not None:
-        scan_status['status'] = status
-    if progress is not None:
-        scan_status['progress'] = progress
-    if current_tool is not None:
-        scan_status['current_tool'] = current_tool
-    if subdomains is not None:
-        scan_status['subdomains'] = subdomains
-    if live_hosts is not None:
-        scan_status['live_hosts'] = live_hosts
-    if urls is not None:
-        scan_status['urls'] = urls
-    if errors is not None:
-        scan_status['errors'] = errors
-
-    # Save updated status
-    with open(status_file, 'w') as f:
-        json.dump(scan_status, f)
-
-    # Update in-memory status if scan is active
-    if session_id in active_scans:
-        active_scans[session_id]['status'] = scan_status
+    # The scan's tasks keep its status up to date; only a crashed canvas needs reporting
+    task_result = AsyncResult(scan['TaskID'], app=celery)
+    if task_result.state == 'FAILURE':
+        overrides['status'] = 'error'
+        overrides['errors'] = [str(task_result.info)]
+    return overrides
 
 @main.route('/status/<session_id>', methods=['GET'])
 def get_status(session_id):
-    """Get the current status of a scan."""
+    """
+    Get the current status of a scan.
+
+    With ?since=<seq> (the 'seq' of an earlier response) only the subdomains,
+    live hosts and URLs added after it are returned; lists that were replaced
+    meanwhile come back whole and are named in 'reset'. Responses carry a
+    strong ETag, so a poll with If-None-Match for an unchanged scan gets an
+    empty 304. A delta's ETag names its ?since=, so it never matches the full
+    body's or another delta's.
+    """
     scan_dir = os.path.join(current_app.config['RESULTS_DIR'], session_id)
-    status_file = os.path.join(scan_dir, 'status.json')
-
-    if not os.path.exists(status_file):
-        return jsonify({'error': 'Scan not found'}), 404
+    since = request.args.get('since', type=int)
 
     try:
-        # Get status from file
-        with open(status_file, 'r') as f:
-            scan_status = json.load(f)
-
-        # Check if there's an active task for this scan
-        if session_id in active_scans and 'task_id' in active_scans[session_id]:
-            task_id = active_scans[session_id]['task_id']
-            task_result = AsyncResult(task_id, app=celery)
-
-            # Update status based on task state
-            if task_result.state == 'PENDING':
-                scan_status['status'] = 'pending'
-                scan_status['current_tool'] = 'Waiting to start...'
-            elif task_result.state == 'FAILURE':
-                scan_status['status'] = 'error'
-                scan_status['errors'] = [str(task_result.info)]
-            elif task_result.state == 'SUCCESS':
-                scan_status['status'] = 'completed'
-                scan_status['progress'] = 100
-            elif task_result.state == 'STARTED' or task_result.state == 'PROGRESS':
-                # Task is running, status should be updated by the task itself
-                # But we can add the task state for debugging
-                scan_status['task_state'] = task_result.state
-
-                # If the task has info, update the status with it
-                if hasattr(task_result, 'info') and task_result.info:
-                    info = task_result.info
-                    if isinstance(info, dict):
-                        if 'progress' in info:
-                            scan_status['progress'] = info['progress']
-                        if 'current_tool' in info:
-                            scan_status['current_tool'] = info['current_tool']
-
-        return jsonify(scan_status)
+        # Mark scans abandoned by a dead worker before reporting on them
+        reap(current_app.config['RESULTS_DIR'])
+
+        seq = status_seq(scan_dir)
+        if seq is None:
+            return jsonify({'error': 'Scan not found'}), 404
+
+        # The seq identifies the stored status; task state is folded in when present
+        overrides = task_status_overrides(session_id)
+        suffix = '' if since is None else f"-since{since}"
+        if overrides:
+            suffix += '-' + hashlib.sha1(json.dumps(overrides, sort_keys=True).encode()).hexdigest()[:12]
+
+        etag = f"{seq}{suffix}"
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            scan_status = read_status(scan_dir) if since is None else read_status_since(scan_dir, since)
+            if scan_status is None:
+                return jsonify({'error': 'Scan not found'}), 404
+            # A write may have landed since the seq was read; tag what is actually sent
+            etag = f"{scan_status.get('seq', seq)}{suffix}"
+            scan_status.update(overrides)
+            response = jsonify(scan_status)
+
+        response.set_etag(etag)
+        # Let browsers revalidate with If-None-Match instead of reusing a stale copy
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': f'Error reading scan status: {str(e)}'}), 500
 
+@main.route('/diff/<session_id>', methods=['GET'])
+def get_diff(session_id):
+    """
+    Get how a scan's subdomains differ from what was stored before it.
+
+    Lists the subdomains that were added, removed (stored but no longer
+    enumerated) and stale, and, once probing is done, the ones whose status
+    code or technology changed. 'probed' is how many subdomains were probed.
+    """
+    diff = read_diff(os.path.join(current_app.config['RESULTS_DIR'], session_id))
+    if diff is None:
+        return jsonify({'error': 'Diff not found'}), 404
+    return jsonify(diff)
+
+@main.route('/events/<session_id>', methods=['GET'])
+def scan_events(session_id):
+    """
+    Stream scan progress as Server-Sent Events.
+
+    A new connection first gets a snapshot (scalar fields, list counts and the
+    live hosts so far), then small events as the scan progresses: status
+    updates with list counts, and the new items of each append. Reconnecting
+    with Last-Event-ID resumes after the last event received. The stream ends
+    once the scan reaches a final status; the page then fetches the full
+    result from /status once.
+    """
+    scan_dir = os.path.join(current_app.config['RESULTS_DIR'], session_id)
+    if not status_exists(scan_dir):
+        return jsonify({'error': 'Scan not found'}), 404
+
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('after')
+
+    def format_event(event, event_id=None):
+        lines = [f"event: {event['type']}"]
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append(f"data: {json.dumps(event)}")
+        return '\n'.join(lines) + '\n\n'
+
+    def generate():
+        position = cursor
+        if position is None:
+            # Take the cursor before reading the status so no event is missed
+            position = event_cursor(scan_dir)
+            scan_status = read_status(scan_dir) or {}
+            yield 'retry: 2000\n'
+            yield format_event(summarize_status(scan_status), position)
+            if scan_status.get('status') in FINAL_STATUSES:
+                return
+
+        deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events = read_events(scan_dir, position, EVENT_KEEPALIVE_INTERVAL)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for position, event in events:
+                yield format_event(event, position)
+                if event.get('status') in FINAL_STATUSES:
+                    return
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @main.route('/download/<session_id>', methods=['GET'])
 def download_results(session_id):
     """Download scan results as JSON."""
     scan_dir = os.path.join(current_app.config['RESULTS_DIR'], session_id)
-    status_file = os.path.join(scan_dir, 'status.json')
-
-    if not os.path.exists(status_file):
-        return jsonify({'error': 'Scan not found'}), 404
 
     # Create a results file with all data
     try:
-        with open(status_file, 'r') as f:
-            scan_status = json.load(f)
+        scan_status = read_status(scan_dir)
+        if scan_status is None:
+            return jsonify({'error': 'Scan not found'}), 404
 
         # Create a results file
         results_file = os.path.join(scan_dir, 'results.json')
@@ -695,21 +726,28 @@ def download_results(session_id):
 
 @main.route('/cancel/<session_id>', methods=['POST'])
 def cancel_scan(session_id):
-    """Cancel a running scan."""
-    if session_id not in active_scans:
+    """
+    Cancel a running scan.
+
+    Works from any worker: the scan is marked cancelled in the registry, the
+    step running it stops its tools at its next heartbeat and steps still
+    queued skip themselves.
+    """
+    scan = get_scan(session_id)
+    if not is_active(scan) or not request_scan_cancel(session_id):
         return jsonify({'error': 'Scan not found or already completed'}), 404
 
-    # Get the task ID
-    task_id = active_scans[session_id].get('task_id')
-    if task_id:
-        # Revoke the Celery task
-        from app import celery
-        celery.control.revoke(task_id, terminate=True)
+    # Tasks still queued never start; a running step notices its lost lease and stops its tools
+    finish_scan(session_id, 'cancelled')
+    if scan['TaskID']:
+        try:
+            celery.control.revoke(scan['TaskID'])
+        except Exception as e:
+            logger.warning("Could not revoke task %s of scan %s: %s", scan['TaskID'], session_id, e)
 
     # Update status
     scan_dir = os.path.join(current_app.config['RESULTS_DIR'], session_id)
     update_status(
-        session_id,
         scan_dir,
         status='cancelled',
         progress=0,
@@ -717,9 +755,6 @@ def cancel_scan(session_id):
         errors=['Scan cancelled by user']
     )
 
-    # Remove from active scans
-    del active_scans[session_id]
-
     return jsonify({'message': 'Scan cancelled successfully'})
 
 @main.route('/task-status/<task_id>')
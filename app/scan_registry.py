@@ -0,0 +1,154 @@
+"""
+Shared registry of running scans.
+
+Scans used to be tracked in a dict inside the gunicorn worker that started
+them, so /cancel and the task-state part of /status only worked when a
+request happened to reach that worker. The registry lives in the SCANS table
+instead, which every web and Celery worker shares.
+
+Whichever Celery task is running a step of a scan holds a lease on it and
+renews it from a heartbeat thread. Between steps the scan is queued and the
+lease is stretched to SCAN_QUEUE_SECONDS, since the next step may wait for a
+free worker. Cancellation is a flag in the registry that the owner picks up
+at its next heartbeat, so any worker can cancel any scan. Scans whose lease
+runs out (the worker died or the queue stalled) are reaped: marked stale in
+the registry and as errored in their status.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from app.database import renew_scan_lease, reap_stale_scans, ACTIVE_SCAN_STATUSES
+from app.status_store import update_status
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lease lasts without renewal before the scan counts as abandoned
+SCAN_LEASE_SECONDS = int(os.environ.get('SCAN_LEASE_SECONDS', 60))
+
+# Seconds between lease renewals; well under the lease so one slow renewal isn't fatal
+SCAN_HEARTBEAT_INTERVAL = int(os.environ.get('SCAN_HEARTBEAT_INTERVAL', 15))
+
+# Seconds a queued scan may wait for a worker to pick up its next step
+SCAN_QUEUE_SECONDS = int(os.environ.get('SCAN_QUEUE_SECONDS', 3600))
+
+_last_reap = [0.0]
+_reap_lock = threading.Lock()
+
+
+class ScanCancelled(Exception):
+    """Raised by ScanLease.check when the scan was cancelled or reaped."""
+
+
+def owner_id():
+    """Identify this process as a scan owner."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_active(scan):
+    """Check whether a registry entry is for a scan that is still in progress."""
+    return bool(scan) and scan['Status'] in ACTIVE_SCAN_STATUSES
+
+
+class ScanLease:
+    """
+    Hold the lease on a scan while it runs, renewing it from a heartbeat thread.
+
+    on_cancel is called (from the heartbeat thread) once the scan is flagged
+    for cancellation or the lease is lost; the code running the scan should
+    also call check between steps.
+    """
+
+    def __init__(self, session_id, on_cancel=None, interval=None, lease_seconds=None):
+        self.session_id = session_id
+        self.on_cancel = on_cancel
+        self.interval = interval or SCAN_HEARTBEAT_INTERVAL
+        self.lease_seconds = lease_seconds or SCAN_LEASE_SECONDS
+        self.status = None
+        self.cancelled = False
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def renew(self, status=None, lease_seconds=None):
+        """Renew the lease now; returns False once the scan is no longer ours to run."""
+        state = renew_scan_lease(self.session_id, owner_id(), lease_seconds or self.lease_seconds,
+                                 status or self.status)
+        if state is None:
+            if not self.lost:
+                self.lost = True
+                self._stopped()
+            return False
+        if state['CancelRequested'] and not self.cancelled:
+            self.cancelled = True
+            logger.info("Scan %s was cancelled", self.session_id)
+            self._stopped()
+        return True
+
+    def _stopped(self):
+        if self.on_cancel:
+            try:
+                self.on_cancel()
+            except Exception as e:
+                logger.error("Cancel callback for scan %s failed: %s", self.session_id, e)
+
+    def check(self):
+        """Renew the lease and raise ScanCancelled if the scan should stop."""
+        self.renew()
+        if self.cancelled or self.lost:
+            raise ScanCancelled(self.session_id)
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.interval):
+            if not self.renew():
+                logger.warning("Lost the lease on scan %s", self.session_id)
+                return
+
+    def start(self, status='running'):
+        self.status = status
+        self.renew()
+        self._thread = threading.Thread(target=self._heartbeat, name=f"lease-{self.session_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, release=False):
+        """Stop the heartbeat; with release, hand the scan back to the queue for its next step."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if release and not (self.cancelled or self.lost):
+            self.renew('queued', SCAN_QUEUE_SECONDS)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def reap(results_dir, force=False):
+    """
+    Reap scans whose lease expired, at most once per heartbeat interval per process.
+
+    Returns:
+        list: Session IDs of the scans that were reaped
+    """
+    with _reap_lock:
+        now = time.time()
+        if not force and now - _last_reap[0] < SCAN_HEARTBEAT_INTERVAL:
+            return []
+        _last_reap[0] = now
+
+    reaped = reap_stale_scans(now)
+    for session_id in reaped:
+        logger.warning("Reaped stale scan %s", session_id)
+        try:
+            update_status(os.path.join(results_dir, session_id), status='error', current_tool='Error',
+                          errors=['The worker running this scan stopped responding'])
+        except Exception as e:
+            logger.error("Error updating status of reaped scan %s: %s", session_id, e)
+    return reaped
+
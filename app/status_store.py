@@ -0,0 +1,700 @@
+"""
+Scan status storage.
+
+Scan progress used to live in a status.json that every writer read, mutated
+and rewrote in full, so concurrent enumerator threads raced each other and
+readers could catch the file half-written. The stores here take field-level
+updates instead:
+
+- FileStatusStore keeps status.json in the scan directory, serialises writers
+  with a per-session lock (thread lock plus flock, so Celery workers and the
+  web process agree) and replaces the file atomically with temp + rename.
+  Lists live in append-only files beside it, so status.json stays small.
+- RedisStatusStore keeps scalar fields in a hash and each list in its own
+  Redis list, so a progress tick is one HSET and new live hosts are appended
+  with RPUSH instead of rewriting everything. Status reads never touch disk.
+
+Each change is also published as a small event (progress, list counts, the
+new items of an append) to a per-session event log that the /events stream
+tails, so browsers don't have to re-download the whole status to follow a
+scan. Events are published under the same lock or transaction as the change
+and carry its seq, so the log is in seq order.
+
+Every write bumps the status's sequence number ('seq'), and each list
+records the length it had at every seq. Clients that already hold part of a
+status can ask for read_status_since(seq) and get only the list items added
+after it; a list that was replaced rather than extended is sent whole and
+named in 'reset'.
+
+STATUS_BACKEND=redis selects the Redis store (STATUS_REDIS_URL, defaulting to
+the Celery broker); the file store is the default.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Status fields that hold lists and can be appended to
+LIST_FIELDS = ('subdomains', 'live_hosts', 'urls', 'errors')
+
+# Status fields that hold a mapping, updated one key at a time
+DICT_FIELDS = ('ports',)
+
+# Seconds a scan status is kept in Redis after its last update
+STATUS_TTL = int(os.environ.get('STATUS_TTL', 7 * 24 * 3600))
+
+# Events kept per scan; older ones are trimmed
+EVENT_LOG_MAX = int(os.environ.get('EVENT_LOG_MAX', 10000))
+
+# Seconds between checks of the event log file for new events
+EVENT_POLL_INTERVAL = 0.5
+
+STATUS_FILENAME = 'status.json'
+EVENTS_FILENAME = 'events.jsonl'
+
+# Statuses after which a scan no longer changes
+FINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def session_id_for(scan_dir):
+    """Scan directories are named after their session ID."""
+    return os.path.basename(os.path.normpath(scan_dir))
+
+
+def list_start(marks, since):
+    """
+    Length a list had at sequence number since.
+
+    Args:
+        marks (list): (seq, length) pairs in seq order, one per write to the list
+        since (int): The sequence number the client has seen
+    """
+    start = 0
+    for seq, length in marks:
+        if seq > since:
+            break
+        start = length
+    return start
+
+
+class FileStatusStore:
+    """
+    Status kept in <scan_dir>/status.json, written atomically under a per-session lock.
+
+    status.json holds only the scalar and mapping fields. Each list field
+    lives in an append-only status.<field>.<gen>.jsonl next to it, one
+    [seq, item] line per item, so a progress tick rewrites a few hundred
+    bytes however long the lists have grown. status.json records each list's
+    generation (bumped when the list is replaced rather than extended) and
+    its size in bytes, so lockless readers only read lines that were
+    complete when status.json was written.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, scan_dir):
+        return os.path.join(scan_dir, STATUS_FILENAME)
+
+    def _list_path(self, scan_dir, field, gen):
+        return os.path.join(scan_dir, f"status.{field}.{gen}.jsonl")
+
+    def _thread_lock(self, scan_dir):
+        with self._locks_guard:
+            return self._locks.setdefault(os.path.normpath(scan_dir), threading.Lock())
+
+    def _read(self, scan_dir):
+        try:
+            with open(self._path(scan_dir), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _replace_file(self, path, text):
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(text)
+        os.replace(temp_file, path)
+
+    def _write(self, scan_dir, status):
+        path = self._path(scan_dir)
+        self._replace_file(path, json.dumps(status))
+        # The seq on its own lets unchanged polls be answered without parsing the status
+        self._replace_file(path + '.seq', str(status['seq']))
+
+    @contextmanager
+    def _session_lock(self, scan_dir):
+        """Hold the session's lock against other threads and other processes."""
+        os.makedirs(scan_dir, exist_ok=True)
+        with self._thread_lock(scan_dir):
+            with open(self._path(scan_dir) + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _modify(self, scan_dir, change, event=None):
+        """
+        Apply change(status, seq) under the session lock with the next sequence number.
+
+        The event, if given, is published before the lock is released, so
+        the event log is in seq order.
+        """
+        with self._session_lock(scan_dir):
+            status = self._read(scan_dir) or {}
+            seq = status.get('seq', 0) + 1
+            status['seq'] = seq
+            self._migrate_lists(scan_dir, status, seq)
+            before = dict(status.get('_lists', {}))
+            change(status, seq)
+            self._write(scan_dir, status)
+            # Replaced lists are only removed once status.json no longer names them
+            for field, (gen, _) in before.items():
+                if status.get('_lists', {}).get(field, [None])[0] != gen:
+                    try:
+                        os.remove(self._list_path(scan_dir, field, gen))
+                    except OSError:
+                        pass
+            if event is not None:
+                self._append_event(scan_dir, dict(event, seq=seq))
+
+    def _migrate_lists(self, scan_dir, status, seq):
+        """Move lists stored inline by older versions into list files, as a reset."""
+        for field in LIST_FIELDS:
+            if field in status:
+                self._replace_list(scan_dir, status, seq, field, status.pop(field))
+        status.pop('_marks', None)
+
+    def _read_list(self, scan_dir, status, field):
+        """The [seq, item] pairs of a list as of status."""
+        if field not in status.get('_lists', {}):
+            # Inline lists from older versions; _marks gives the seq each item arrived at
+            items = status.get(field, [])
+            seqs = [0] * len(items)
+            start = 0
+            for seq, length in status.get('_marks', {}).get(field, []):
+                seqs[start:length] = [seq] * (length - start)
+                start = max(start, length)
+            return [[seq, item] for seq, item in zip(seqs, items)]
+
+        gen, size = status['_lists'][field]
+        with open(self._list_path(scan_dir, field, gen), 'rb') as f:
+            data = f.read(size)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def _append_list(self, scan_dir, status, seq, field, items):
+        lists = status.setdefault('_lists', {})
+        gen, size = lists.get(field, (seq, 0))
+        data = ''.join(json.dumps([seq, item]) + '\n' for item in items).encode()
+        with open(self._list_path(scan_dir, field, gen), 'ab') as f:
+            # Drop anything a write that never reached status.json left behind
+            f.truncate(size)
+            f.write(data)
+        lists[field] = [gen, size + len(data)]
+
+    def _replace_list(self, scan_dir, status, seq, field, items):
+        data = ''.join(json.dumps([seq, item]) + '\n' for item in items)
+        self._replace_file(self._list_path(scan_dir, field, seq), data)
+        status.setdefault('_lists', {})[field] = [seq, len(data.encode())]
+        status.setdefault('_resets', {})[field] = seq
+
+    def _set_list(self, scan_dir, status, seq, field, items):
+        """Store a list, appending only the new tail when it extends the stored one."""
+        items = list(items)
+        current = [item for _, item in self._read_list(scan_dir, status, field)]
+        if items[:len(current)] == current:
+            self._append_list(scan_dir, status, seq, field, items[len(current):])
+        else:
+            self._replace_list(scan_dir, status, seq, field, items)
+
+    def _set_fields(self, scan_dir, status, seq, fields):
+        for field, value in fields.items():
+            if field in LIST_FIELDS:
+                self._set_list(scan_dir, status, seq, field, value)
+            else:
+                status[field] = value
+
+    def _load(self, scan_dir):
+        """
+        Read status.json with its lists as [seq, item] pairs.
+
+        A list file can be replaced between reading status.json and opening
+        it; the read is then retried against the newer status.json.
+        """
+        for _ in range(5):
+            status = self._read(scan_dir)
+            if status is None:
+                return None
+            try:
+                lists = {field: self._read_list(scan_dir, status, field) for field in LIST_FIELDS
+                         if field in status or field in status.get('_lists', {})}
+            except FileNotFoundError:
+                continue
+            status.update(lists)
+            return status
+        raise OSError(f"Status of {scan_dir} kept changing while it was read")
+
+    def create(self, scan_dir, status):
+        def replace(current, seq):
+            current.clear()
+            current['seq'] = seq
+            for field, value in status.items():
+                if field in LIST_FIELDS:
+                    self._replace_list(scan_dir, current, seq, field, value)
+                else:
+                    current[field] = value
+            # A fresh scan starts with no resets to report
+            current.pop('_resets', None)
+        self._modify(scan_dir, replace)
+        with self._session_lock(scan_dir):
+            path = os.path.join(scan_dir, EVENTS_FILENAME)
+            open(path, 'w').close()
+            self._replace_file(path + '.count', '0')
+
+    def exists(self, scan_dir):
+        return os.path.exists(self._path(scan_dir))
+
+    def get(self, scan_dir):
+        # Writers replace status.json atomically and only append to list files, so readers need no lock
+        status = self._load(scan_dir)
+        if status is None:
+            return None
+        for field in LIST_FIELDS:
+            if field in status:
+                status[field] = [item for _, item in status[field]]
+        return {field: value for field, value in status.items() if not field.startswith('_')}
+
+    def get_seq(self, scan_dir):
+        try:
+            with open(self._path(scan_dir) + '.seq', 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            status = self._read(scan_dir)
+            return status.get('seq', 0) if status is not None else None
+
+    def get_since(self, scan_dir, since):
+        status = self._load(scan_dir)
+        if status is None:
+            return None
+        resets = status.get('_resets', {})
+        delta = {field: value for field, value in status.items()
+                 if not field.startswith('_') and field not in LIST_FIELDS}
+        delta['reset'] = []
+        for field in LIST_FIELDS:
+            pairs = status.get(field, [])
+            if resets.get(field, 0) > since:
+                delta[field] = [item for _, item in pairs]
+                delta['reset'].append(field)
+            else:
+                delta[field] = [item for seq, item in pairs if seq > since]
+        return delta
+
+    def update(self, scan_dir, fields, event=None):
+        self._modify(scan_dir, lambda status, seq: self._set_fields(scan_dir, status, seq, fields), event)
+
+    def append(self, scan_dir, field, items, event=None):
+        items = list(items)
+        if items:
+            self._modify(scan_dir, lambda status, seq: self._append_list(scan_dir, status, seq, field, items), event)
+
+    def set_item(self, scan_dir, field, key, value, event=None):
+        def set_key(status, seq):
+            status.setdefault(field, {})[key] = value
+        self._modify(scan_dir, set_key, event)
+
+    @staticmethod
+    def _log_header(f):
+        """
+        Read the header of an open event log.
+
+        A trimmed log starts with a {"trimmed": offset} line giving the
+        cursor of its first event, so cursors stay byte offsets into the
+        untrimmed log.
+
+        Returns:
+            tuple: (cursor of the first event, length of the header)
+        """
+        line = f.readline()
+        if line.startswith(b'{"trimmed":'):
+            return json.loads(line)['trimmed'], len(line)
+        f.seek(0)
+        return 0, 0
+
+    def _trim_events(self, path):
+        """Keep the newest EVENT_LOG_MAX events; called under the session lock."""
+        with open(path, 'rb') as f:
+            base, _ = self._log_header(f)
+            lines = f.readlines()
+        kept = lines[-EVENT_LOG_MAX:] if EVENT_LOG_MAX > 0 else []
+        base += sum(len(line) for line in lines[:len(lines) - len(kept)])
+        header = json.dumps({'trimmed': base}) + '\n'
+        self._replace_file(path, header + b''.join(kept).decode())
+        self._replace_file(path + '.count', str(len(kept)))
+
+    def _append_event(self, scan_dir, event):
+        """Add an event to the log; called under the session lock."""
+        path = os.path.join(scan_dir, EVENTS_FILENAME)
+        with open(path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+        try:
+            with open(path + '.count', 'r') as f:
+                count = int(f.read()) + 1
+        except (OSError, ValueError):
+            # Logs from before the count was kept are trimmed on their next event
+            count = EVENT_LOG_MAX + 1
+        # Like the Redis store's approximate MAXLEN, let the log run a tenth over before rewriting it
+        if count > EVENT_LOG_MAX + EVENT_LOG_MAX // 10:
+            self._trim_events(path)
+        else:
+            self._replace_file(path + '.count', str(count))
+
+    def publish(self, scan_dir, event):
+        with self._session_lock(scan_dir):
+            self._append_event(scan_dir, event)
+
+    def event_cursor(self, scan_dir):
+        try:
+            with open(os.path.join(scan_dir, EVENTS_FILENAME), 'rb') as f:
+                base, header_length = self._log_header(f)
+                return str(base + os.fstat(f.fileno()).st_size - header_length)
+        except OSError:
+            return '0'
+
+    def read_events(self, scan_dir, cursor, timeout):
+        """
+        Wait up to timeout seconds for events after cursor (a byte offset).
+
+        Returns:
+            list: (cursor after the event, event) pairs
+        """
+        path = os.path.join(scan_dir, EVENTS_FILENAME)
+        offset = int(cursor or 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            data = b''
+            try:
+                # Trimming replaces the file, so the header and events are read from one handle
+                with open(path, 'rb') as f:
+                    base, header_length = self._log_header(f)
+                    end = base + os.fstat(f.fileno()).st_size - header_length
+                    if end > offset:
+                        # Events trimmed before they were read are skipped
+                        offset = max(offset, base)
+                        f.seek(offset - base + header_length)
+                        data = f.read(end - offset)
+            except OSError:
+                pass
+            if data:
+                events = []
+                # Only consume complete lines; a partial one is picked up next time
+                for line in data.splitlines(keepends=True):
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    events.append((str(offset), json.loads(line)))
+                if events:
+                    return events
+            if time.monotonic() >= deadline:
+                return []
+            time.sleep(EVENT_POLL_INTERVAL)
+
+
+class RedisStatusStore:
+    """Status kept in Redis: a hash of scalar fields plus one key per list or mapping field."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, scan_dir, field=None):
+        key = f"webreconlite:status:{session_id_for(scan_dir)}"
+        return f"{key}:{field}" if field else key
+
+    def _marks_key(self, scan_dir, field):
+        return self._key(scan_dir, f"{field}:marks")
+
+    def _all_keys(self, scan_dir):
+        fields = LIST_FIELDS + DICT_FIELDS + ('events', 'resets')
+        return ([self._key(scan_dir)] + [self._key(scan_dir, field) for field in fields] +
+                [self._marks_key(scan_dir, field) for field in LIST_FIELDS])
+
+    def _expire(self, pipe, scan_dir):
+        for key in self._all_keys(scan_dir):
+            pipe.expire(key, STATUS_TTL)
+
+    def _transaction(self, scan_dir, write, read=None, event=None):
+        """
+        Run write(pipe, seq, current) atomically with the next sequence number.
+
+        read(pipe), if given, fetches what the write depends on. Every write
+        bumps the seq in the status hash, so watching the hash is enough to
+        make a concurrent writer retry instead of interleaving. The event,
+        if given, is added in the same transaction, so the stream is in seq
+        order.
+        """
+        base = self._key(scan_dir)
+
+        def run(pipe):
+            seq = int(pipe.hget(base, 'seq') or 0) + 1
+            current = read(pipe) if read else None
+            pipe.multi()
+            write(pipe, seq, current)
+            pipe.hset(base, 'seq', seq)
+            if event is not None:
+                self._add_event(pipe, scan_dir, dict(event, seq=seq))
+            self._expire(pipe, scan_dir)
+
+        self.client.transaction(run, base)
+
+    def _read_lists(self, scan_dir, fields):
+        def read(pipe):
+            return {field: [item.decode() for item in pipe.lrange(self._key(scan_dir, field), 0, -1)]
+                    for field in fields}
+        return read
+
+    def _set_list(self, pipe, scan_dir, seq, field, items, current):
+        """Store a list, appending only the new tail when it extends the stored one."""
+        key = self._key(scan_dir, field)
+        encoded = [json.dumps(item) for item in items]
+        if encoded[:len(current)] == current:
+            new_items = encoded[len(current):]
+        else:
+            pipe.delete(key, self._marks_key(scan_dir, field))
+            pipe.hset(self._key(scan_dir, 'resets'), field, seq)
+            new_items = encoded
+        if new_items:
+            pipe.rpush(key, *new_items)
+        pipe.rpush(self._marks_key(scan_dir, field), f"{seq}:{len(encoded)}")
+
+    def _set_fields(self, pipe, scan_dir, seq, fields, current):
+        scalars = {}
+        for field, value in fields.items():
+            if field in LIST_FIELDS:
+                self._set_list(pipe, scan_dir, seq, field, value, current.get(field, []))
+            elif field in DICT_FIELDS:
+                pipe.delete(self._key(scan_dir, field))
+                if value:
+                    pipe.hset(self._key(scan_dir, field),
+                              mapping={key: json.dumps(item) for key, item in value.items()})
+            else:
+                scalars[field] = json.dumps(value)
+        if scalars:
+            pipe.hset(self._key(scan_dir), mapping=scalars)
+
+    def _decode_scalars(self, scalars):
+        return {field.decode(): json.loads(value) for field, value in scalars.items()}
+
+    def create(self, scan_dir, status):
+        def write(pipe, seq, current):
+            pipe.delete(*self._all_keys(scan_dir))
+            self._set_fields(pipe, scan_dir, seq, status, {})
+        self._transaction(scan_dir, write)
+
+    def exists(self, scan_dir):
+        return bool(self.client.exists(self._key(scan_dir)))
+
+    def get(self, scan_dir):
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(self._key(scan_dir))
+            for field in LIST_FIELDS:
+                pipe.lrange(self._key(scan_dir, field), 0, -1)
+            for field in DICT_FIELDS:
+                pipe.hgetall(self._key(scan_dir, field))
+            results = pipe.execute()
+
+        scalars = results[0]
+        if not scalars:
+            return None
+        status = self._decode_scalars(scalars)
+        for field, items in zip(LIST_FIELDS, results[1:]):
+            status[field] = [json.loads(item) for item in items]
+        for field, mapping in zip(DICT_FIELDS, results[1 + len(LIST_FIELDS):]):
+            if mapping:
+                status[field] = self._decode_scalars(mapping)
+        return status
+
+    def get_seq(self, scan_dir):
+        seq = self.client.hget(self._key(scan_dir), 'seq')
+        return int(seq) if seq is not None else None
+
+    def get_since(self, scan_dir, since):
+        base = self._key(scan_dir)
+
+        def read(pipe):
+            # Watched reads run immediately; a write in between makes the transaction retry
+            scalars = pipe.hgetall(base)
+            if not scalars:
+                pipe.multi()
+                return None
+            delta = self._decode_scalars(scalars)
+            resets = {field.decode(): int(seq) for field, seq in pipe.hgetall(self._key(scan_dir, 'resets')).items()}
+            for field in DICT_FIELDS:
+                mapping = pipe.hgetall(self._key(scan_dir, field))
+                if mapping:
+                    delta[field] = self._decode_scalars(mapping)
+
+            delta['reset'] = [field for field in LIST_FIELDS if resets.get(field, 0) > since]
+            for field in LIST_FIELDS:
+                start = 0
+                if field not in delta['reset']:
+                    marks = [tuple(int(part) for part in mark.split(b':'))
+                             for mark in pipe.lrange(self._marks_key(scan_dir, field), 0, -1)]
+                    start = list_start(marks, since)
+                delta[field] = [json.loads(item) for item in pipe.lrange(self._key(scan_dir, field), start, -1)]
+            pipe.multi()
+            return delta
+
+        return self.client.transaction(read, base, value_from_callable=True)
+
+    def update(self, scan_dir, fields, event=None):
+        def write(pipe, seq, current):
+            self._set_fields(pipe, scan_dir, seq, fields, current)
+        self._transaction(scan_dir, write, self._read_lists(scan_dir, [field for field in fields if field in LIST_FIELDS]),
+                          event)
+
+    def append(self, scan_dir, field, items, event=None):
+        items = [json.dumps(item) for item in items]
+        if items:
+            def write(pipe, seq, length):
+                pipe.rpush(self._key(scan_dir, field), *items)
+                pipe.rpush(self._marks_key(scan_dir, field), f"{seq}:{length + len(items)}")
+            self._transaction(scan_dir, write, lambda pipe: pipe.llen(self._key(scan_dir, field)), event)
+
+    def set_item(self, scan_dir, field, key, value, event=None):
+        def write(pipe, seq, current):
+            pipe.hset(self._key(scan_dir, field), key, json.dumps(value))
+        self._transaction(scan_dir, write, event=event)
+
+    def _add_event(self, pipe, scan_dir, event):
+        pipe.xadd(self._key(scan_dir, 'events'), {'event': json.dumps(event)},
+                  maxlen=EVENT_LOG_MAX, approximate=True)
+        pipe.expire(self._key(scan_dir, 'events'), STATUS_TTL)
+
+    def publish(self, scan_dir, event):
+        with self.client.pipeline() as pipe:
+            self._add_event(pipe, scan_dir, event)
+            pipe.execute()
+
+    def event_cursor(self, scan_dir):
+        entries = self.client.xrevrange(self._key(scan_dir, 'events'), count=1)
+        return entries[0][0].decode() if entries else '0'
+
+    def read_events(self, scan_dir, cursor, timeout):
+        """Block up to timeout seconds for stream entries after cursor (a stream ID)."""
+        streams = self.client.xread({self._key(scan_dir, 'events'): cursor or '0'},
+                                    block=int(timeout * 1000))
+        return [
+            (entry_id.decode(), json.loads(fields[b'event']))
+            for _, entries in streams
+            for entry_id, fields in entries
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_status_store():
+    """Get the configured status store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get('STATUS_BACKEND', 'file').lower()
+            if backend == 'redis':
+                url = os.environ.get('STATUS_REDIS_URL',
+                                     os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+                logger.info("Using Redis status store at %s", url)
+                _store = RedisStatusStore(url)
+            else:
+                _store = FileStatusStore()
+        return _store
+
+
+def init_status(scan_dir, status):
+    """Store the initial status of a scan, replacing any previous one."""
+    get_status_store().create(scan_dir, status)
+
+
+def read_status(scan_dir):
+    """Get the full status of a scan, or None if it is unknown."""
+    return get_status_store().get(scan_dir)
+
+
+def read_status_since(scan_dir, since):
+    """
+    Get the status with only the list items added after sequence number since.
+
+    Lists replaced since then are sent whole and named in the 'reset' list.
+    Returns None if the scan is unknown.
+    """
+    return get_status_store().get_since(scan_dir, since)
+
+
+def status_seq(scan_dir):
+    """Current sequence number of a scan's status, or None if it is unknown."""
+    return get_status_store().get_seq(scan_dir)
+
+
+def status_exists(scan_dir):
+    """Check whether a scan has a stored status."""
+    return get_status_store().exists(scan_dir)
+
+
+def update_status(scan_dir, **fields):
+    """Set the given status fields, leaving the others untouched."""
+    get_status_store().update(scan_dir, fields, update_event(fields))
+
+
+def append_status(scan_dir, field, items):
+    """Append items to a list field without rewriting the items already stored."""
+    items = list(items)
+    if items:
+        get_status_store().append(scan_dir, field, items, {'type': 'append', 'field': field, 'items': items})
+
+
+def set_status_item(scan_dir, field, key, value):
+    """Set one key of a mapping field, e.g. the ports found for one host."""
+    event = {'type': 'set_item', 'field': field, 'key': key, 'count': len(value)}
+    get_status_store().set_item(scan_dir, field, key, value, event)
+
+
+def update_event(fields):
+    """
+    Build the event for a status update.
+
+    Scalar fields and errors are sent as they are; the bulky lists only as
+    counts, since clients fetch the full result once the scan is done.
+    """
+    event = {'type': 'update'}
+    for field, value in fields.items():
+        if field in DICT_FIELDS or (field in LIST_FIELDS and field != 'errors'):
+            event[f"{field}_count"] = len(value)
+        else:
+            event[field] = value
+    return event
+
+
+def summarize_status(status):
+    """Status for a stream snapshot: scalars, errors and live hosts, other lists as counts."""
+    event = update_event({field: value for field, value in status.items() if field != 'live_hosts'})
+    event['type'] = 'snapshot'
+    event['live_hosts'] = status.get('live_hosts', [])
+    return event
+
+
+def event_cursor(scan_dir):
+    """Position of the newest event, to stream only what comes after it."""
+    return get_status_store().event_cursor(scan_dir)
+
+
+def read_events(scan_dir, cursor, timeout):
+    """Wait up to timeout seconds for events after cursor; returns (cursor, event) pairs."""
+    return get_status_store().read_events(scan_dir, cursor, timeout)
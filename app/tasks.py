@@ -1,166 +1,417 @@
 from celery_app import celery
+from celery import chord, group
+from contextlib import contextmanager
 import os
 import json
+import logging
 import time
+from urllib.parse import urlparse
 from app.tools import (
-    run_subdomain_enumeration,
-    run_web_detection,
+    build_enumeration_job,
+    check_tool_installed,
+    installed_enumerators,
+    HttpxPipeline,
+    merge_enumeration_results,
+    prune_wildcard_subdomains,
+    probe_hosts,
+    resolve_host_ips,
+    resolve_subdomains,
     run_gau,
+    run_gau_batch,
     run_naabu,
-    parse_subdomains,
-    parse_httpx_output,
+    run_naabu_batch,
     parse_gau_output,
-    parse_naabu_output
+    parse_naabu_output,
+    parse_naabu_line,
+    url_host
 )
+from app.utils import deduplicate_list
+from app.cdn import cdn_skip_enabled, is_cdn_address
+from app.status_store import update_status as store_status, append_status as store_append
+from app.scan_registry import ScanLease, ScanCancelled
+from app.orchestrator import orchestrator
+
+logger = logging.getLogger(__name__)
+
+# IPs and hosts per naabu run; larger batches are split across workers
+NAABU_SHARD_SIZE = int(os.environ.get('NAABU_SHARD_SIZE', 500))
+
+# Seconds an IP's port scan is reused for other subdomains behind it
+NAABU_IP_REUSE_SECONDS = int(os.environ.get('NAABU_IP_REUSE_SECONDS', 24 * 3600))
+
+# Subdomains per Httpx probe task of a scan
+HTTPX_CHUNK_SIZE = int(os.environ.get('HTTPX_CHUNK_SIZE', 1000))
+
+# Minimum seconds between status writes for streamed live hosts
+LIVE_HOST_STATUS_INTERVAL = 1.0
+
+# Seconds after which incremental scans probe a known subdomain again
+PROBE_STALE_SECONDS = int(os.environ.get('PROBE_STALE_SECONDS', 7 * 24 * 3600))
 
 @celery.task(bind=True)
-def run_scan_task(self, domain, session_id, results_dir):
+def run_scan_task(self, domain, session_id, results_dir, incremental=False, pipelined=True):
     """
-    Celery task to run a full scan asynchronously.
+    Celery task that plans a full scan.
+
+    The scan runs as a canvas rather than one long task: a group of
+    enumerate_subdomains_task (one per installed enumerator) whose chord
+    callback, merge_subdomains_task, stores the subdomains and fans out
+    chunked probe_hosts_task runs, which persist_scan_task collects. This
+    task replaces itself with that canvas, so the scan's task ID ends up
+    carrying the final result.
 
     Args:
         domain (str): The domain to scan
         session_id (str): The unique session ID for this scan
         results_dir (str): The directory to store results
+        incremental (bool): Only probe subdomains that are new or were last
+            probed more than PROBE_STALE_SECONDS ago
+        pipelined (bool): Have each enumerator task probe its subdomains
+            with Httpx as they stream in, leaving the probe chunks only the
+            subdomains no enumerator task probed
     """
-    print(f"Starting scan task for domain: {domain}, session_id: {session_id}")
-    print(f"Task ID: {self.request.id}")
-    print(f"Results directory: {results_dir}")
-    print(f"run_scan_task: Starting scan for domain {domain}, session_id {session_id}")
-    print(f"run_scan_task: Task ID: {self.request.id if hasattr(self.request, 'id') else None}")
-    print(f"run_scan_task: Results directory: {results_dir}")
-
-    # Create a directory for this scan
+    logger.info("run_scan_task: Starting scan for domain %s, session_id %s, task ID %s",
+                domain, session_id, getattr(self.request, 'id', None))
     scan_dir = os.path.join(results_dir, session_id)
-    print(f"run_scan_task: Scan directory: {scan_dir}")
     os.makedirs(scan_dir, exist_ok=True)
-    print(f"run_scan_task: Created scan directory")
-
-    # Create status file
-    status_file = os.path.join(scan_dir, 'status.json')
-
-    # Initialize status
-    status = {
-        'domain': domain,
-        'status': 'running',
-        'progress': 0,
-        'current_tool': 'Initializing',
-        'subdomains': [],
-        'live_hosts': [],
-        'urls': [],
-        'errors': []
-    }
 
-    # Save initial status
-    with open(status_file, 'w') as f:
-        json.dump(status, f)
+    with scan_step(session_id, scan_dir) as lease:
+        if lease is None:
+            return None
+        update_status(scan_dir, status='running', progress=5, current_tool='Subdomain Enumeration')
+        enumerators = installed_enumerators()
+        logger.info("run_scan_task: Enumerating %s with %s", domain, enumerators or 'the fallback list')
+
+    callback = merge_subdomains_task.s(domain, session_id, scan_dir, incremental)
+    if not enumerators:
+        raise self.replace(callback.clone(args=([],)))
+    raise self.replace(chord(
+        group(enumerate_subdomains_task.si(key, domain, session_id, scan_dir, pipelined, incremental)
+              for key in enumerators),
+        callback
+    ))
 
-    try:
-        # Step 1: Subdomain enumeration (40%)
+@celery.task(bind=True)
+def enumerate_subdomains_task(self, key, domain, session_id, scan_dir, pipelined=False, incremental=False):
+    """
+    Celery task to run one subdomain enumerator for a scan.
+
+    When pipelined and Httpx is installed, the enumerator's subdomains go to
+    an HttpxPipeline as the tool prints them, so probing overlaps
+    enumeration and live hosts reach the scan status while enumerators are
+    still running. Each subdomain is claimed in the scan registry first, so
+    of the enumerator tasks running in parallel only one probes it; in
+    incremental mode the ones probed within PROBE_STALE_SECONDS are skipped.
+    Results are only stored by merge_subdomains_task, once the subdomains
+    have been diffed.
+
+    Never raises, so one failing tool doesn't fail the chord: errors are
+    added to the scan status instead.
+
+    Returns:
+        dict: The tool's output file, the subdomains probed and the live
+        hosts found, or None if the tool didn't run
+    """
+    from app.database import claim_scan_hosts, get_domain_id, get_probed_subdomains
+
+    with scan_step(session_id, scan_dir) as lease:
+        if lease is None:
+            return None
         try:
-            # Only update state if running asynchronously (has task_id)
-            if self.request.id:
-                self.update_state(state='PROGRESS', meta={'progress': 0, 'current_tool': 'Subdomain Enumeration'})
+            pipeline = None
+            if pipelined and check_tool_installed('httpx'):
+                fresh = set()
+                domain_id = get_domain_id(domain) if incremental else None
+                if domain_id:
+                    fresh = get_probed_subdomains(domain_id, time.time() - PROBE_STALE_SECONDS) or set()
+                on_live_host, flush = live_host_writer(scan_dir)
+                pipeline = HttpxPipeline(
+                    os.path.join(scan_dir, f'httpx_{key}.txt'),
+                    live_host_callback=on_live_host,
+                    group=session_id,
+                    domain=domain,
+                    claim=lambda hosts: claim_scan_hosts(session_id, [host for host in hosts if host not in fresh])
+                )
+
+            job, output_file = build_enumeration_job(
+                key, domain, scan_dir, session_id,
+                update_callback=lambda p, t: update_status(scan_dir, current_tool=t),
+                subdomain_callback=pipeline.submit if pipeline else None
+            )
+            if job is None:
+                append_status(scan_dir, 'errors', [f"{key.capitalize()} skipped: not configured"])
+                return None
+            if pipeline is None:
+                orchestrator.run_job_sync(job)
+                return {'output_file': output_file, 'probed': [], 'live_hosts': []}
+
+            orchestrator.run_pipeline_sync([job], pipeline.job)
+            flush()
+            probed = pipeline.probed
+            if not pipeline.job.succeeded:
+                # Only the live hosts are known to have been probed; the probe chunks retry the rest
+                logger.error("enumerate_subdomains_task: Pipelined Httpx for %s failed: %s", key, pipeline.result)
+                probed = [record['subdomain'] for record in live_host_records(pipeline.live_hosts)]
+            logger.info("enumerate_subdomains_task: %s probed %s subdomains of %s while enumerating, %s live",
+                        key, len(probed), domain, len(pipeline.live_hosts))
+            return {'output_file': output_file, 'probed': probed, 'live_hosts': pipeline.live_hosts}
         except Exception as e:
-            print(f"Warning: Could not update task state: {str(e)}")
-
-        # Always update the status file
-        update_status(status_file, progress=0, current_tool='Subdomain Enumeration')
-
-        subdomains_file = os.path.join(scan_dir, 'subdomains.txt')
-        print(f"run_scan_task: Subdomains file: {subdomains_file}")
-        print(f"run_scan_task: Starting subdomain enumeration for {domain}...")
+            logger.exception("enumerate_subdomains_task: %s failed for %s: %s", key, domain, e)
+            append_status(scan_dir, 'errors', [f"{key.capitalize()} failed: {str(e)}"])
+            return None
 
-        # Call run_subdomain_enumeration with the correct parameters
-        # The function expects (domain, scan_dir, session_id, update_callback=None)
-        subdomains = run_subdomain_enumeration(domain, scan_dir, session_id)
-        print(f"run_scan_task: Subdomain enumeration completed")
-
-        # No need to parse subdomains, as run_subdomain_enumeration already returns them
-        if not subdomains:
-            # If no subdomains were found, parse the file as a fallback
-            subdomains = parse_subdomains(subdomains_file)
-        update_status(status_file, progress=40, subdomains=subdomains)
+@celery.task(bind=True)
+def merge_subdomains_task(self, enumerations, domain, session_id, scan_dir, incremental=False):
+    """
+    Celery chord callback that merges the enumerators' output and stores it.
+
+    Subdomains answered by a wildcard DNS record are pruned first. The rest
+    are diffed against the ones already stored for the domain and the diff
+    is written to diff.json. The subdomains to probe (only the added and
+    stale ones in incremental mode) are resolved and their records stored;
+    the ones that don't resolve are recorded as not live without probing,
+    and the ones the enumerator tasks already probed get their results.
+    Replaces itself with a chord of probe_hosts_task runs over chunks of
+    HTTPX_CHUNK_SIZE remaining resolvable subdomains, collected by
+    persist_scan_task.
+    """
+    from app.database import add_domain, diff_subdomains, record_dns_results, record_probe_results
 
-        # Step 2: Web detection (30%)
+    with scan_step(session_id, scan_dir) as lease:
+        if lease is None:
+            return None
         try:
-            # Only update state if running asynchronously (has task_id)
-            if self.request.id:
-                self.update_state(state='PROGRESS', meta={'progress': 40, 'current_tool': 'Web Detection'})
+            enumerations = [enumeration for enumeration in enumerations if enumeration]
+            subdomains = merge_enumeration_results(domain, scan_dir,
+                                                   [enumeration['output_file'] for enumeration in enumerations])
+            update_status(scan_dir, progress=45, current_tool='Wildcard DNS Detection')
+            subdomains, pruned = prune_wildcard_subdomains(domain, subdomains, scan_dir)
+            lease.check()
+
+            domain_id = add_domain(domain)
+            if not domain_id:
+                raise Exception(f"Failed to add domain {domain} to database")
+            diff = diff_subdomains(domain_id, subdomains, time.time() - PROBE_STALE_SECONDS)
+            if diff is None:
+                raise Exception(f"Failed to diff the subdomains of {domain}")
+            store_subdomains(domain_id, subdomains)
+
+            hosts = diff['added'] + diff['stale'] if incremental else subdomains
+            update_status(scan_dir, progress=48, current_tool='DNS Resolution', subdomains=subdomains,
+                          wildcard_pruned=len(pruned))
+            probed = {name for enumeration in enumerations for name in enumeration['probed']} & set(hosts)
+            live_hosts = [record for enumeration in enumerations
+                          for record in live_host_records(enumeration['live_hosts'])
+                          if record['subdomain'] in probed]
+            hosts, unresolved, records = resolve_subdomains(hosts, scan_dir)
+            lease.check()
+            record_dns_results(domain_id, records)
+            # Unresolvable subdomains can't be live; record them as probed
+            # along with the ones probed while enumerating
+            added = set(diff['added'])
+            changed = [change for change in record_probe_results(
+                           domain_id, [name for name in unresolved if name not in probed] + sorted(probed), live_hosts)
+                       if change['subdomain'] not in added]
+            hosts = [name for name in hosts if name not in probed]
+
+            diff.update(incremental=incremental, probed=len(hosts) + len(probed), changed=changed)
+            write_diff(scan_dir, diff)
+            update_status(scan_dir, progress=50, current_tool='Web Detection', unresolved=len(unresolved),
+                          diff=diff_summary(diff))
+        except ScanCancelled:
+            return None
         except Exception as e:
-            print(f"Warning: Could not update task state: {str(e)}")
+            fail_scan(session_id, scan_dir, e)
+            return None
+
+    chunks = [hosts[i:i + HTTPX_CHUNK_SIZE] for i in range(0, len(hosts), HTTPX_CHUNK_SIZE)]
+    logger.info("merge_subdomains_task: Probing %s of %s subdomains of %s in %s chunks (%s added, %s stale, %s removed, %s unresolved, %s probed while enumerating)",
+                len(hosts), len(subdomains), domain, len(chunks), len(diff['added']), len(diff['stale']),
+                len(diff['removed']), len(unresolved), len(probed))
+    callback = persist_scan_task.s(session_id, scan_dir, len(live_hosts))
+    if not chunks:
+        raise self.replace(callback.clone(args=([],)))
+    raise self.replace(chord(
+        group(probe_hosts_task.si(chunk, index, domain_id, session_id, scan_dir)
+              for index, chunk in enumerate(chunks)),
+        callback
+    ))
 
-        # Always update the status file
-        update_status(status_file, progress=40, current_tool='Web Detection')
+@celery.task(bind=True)
+def probe_hosts_task(self, hosts, chunk_index, domain_id, session_id, scan_dir):
+    """
+    Celery task to probe one chunk of a scan's subdomains with Httpx.
 
-        httpx_file = os.path.join(scan_dir, 'httpx.txt')
-        print(f"run_scan_task: Starting web detection...")
+    Live hosts are appended to the scan status as Httpx reports them, at most
+    once per LIVE_HOST_STATUS_INTERVAL, and the results are stored once the
+    chunk is done. URLs and ports are only stored when the user runs GAU or
+    Naabu. Never raises, so one failing chunk doesn't fail the chord.
 
-        # Call run_web_detection with the correct parameters
-        # The function expects (domain, subdomains, scan_dir, session_id, update_callback=None)
-        live_hosts, urls = run_web_detection(domain, subdomains, scan_dir, session_id)
-        print(f"run_scan_task: Web detection completed")
+    Returns:
+        dict: The number of live hosts and the subdomains whose status changed
+    """
+    from app.database import record_probe_results
 
-        # If no live hosts were found, parse the file as a fallback
-        if not live_hosts:
-            live_hosts = parse_httpx_output(httpx_file)
-        update_status(status_file, progress=70, live_hosts=live_hosts)
+    with scan_step(session_id, scan_dir) as lease:
+        if lease is None:
+            return {'live_hosts': 0, 'changed': []}
 
-        # Step 3: URL discovery (30%)
+        on_live_host, flush = live_host_writer(scan_dir)
         try:
-            # Only update state if running asynchronously (has task_id)
-            if self.request.id:
-                self.update_state(state='PROGRESS', meta={'progress': 70, 'current_tool': 'URL Discovery'})
-        except Exception as e:
-            print(f"Warning: Could not update task state: {str(e)}")
+            live_hosts = probe_hosts(hosts, scan_dir, f'httpx_{chunk_index}', live_host_callback=on_live_host,
+                                     group=session_id)
+            flush()
+            logger.info("probe_hosts_task: Chunk %s found %s live hosts of %s", chunk_index, len(live_hosts), len(hosts))
 
-        # Always update the status file
-        update_status(status_file, progress=70, current_tool='URL Discovery')
+            changed = record_probe_results(domain_id, hosts, live_host_records(live_hosts))
+            return {'live_hosts': len(live_hosts), 'changed': changed}
+        except Exception as e:
+            logger.exception("probe_hosts_task: Chunk %s failed: %s", chunk_index, e)
+            append_status(scan_dir, 'errors', [f"Httpx failed: {str(e)}"])
+            return {'live_hosts': 0, 'changed': []}
 
-        # We already have URLs from the web detection step
-        # But if they're empty, run gau separately
-        if not urls:
-            gau_file = os.path.join(scan_dir, 'gau.txt')
-            print(f"run_scan_task: Starting URL discovery...")
-            run_gau(domain, gau_file)
-            print(f"run_scan_task: URL discovery completed")
+@celery.task(bind=True)
+def persist_scan_task(self, chunk_results, session_id, scan_dir, pipelined_live_hosts=0):
+    """
+    Celery chord callback that adds the probe changes to the scan's diff and completes it.
 
-            # Parse URLs
-            urls = parse_gau_output(gau_file)
-        update_status(status_file, progress=100, urls=urls, status='completed')
+    pipelined_live_hosts counts the live hosts the enumerator tasks found,
+    whose results merge_subdomains_task has already stored.
+    """
+    from app.database import finish_scan
 
-        # Final update
+    with scan_step(session_id, scan_dir) as lease:
+        if lease is None:
+            return None
         try:
-            # Only update state if running asynchronously (has task_id)
-            if self.request.id:
-                self.update_state(state='SUCCESS', meta={'progress': 100, 'current_tool': 'Completed'})
+            live_host_count = pipelined_live_hosts + sum(result['live_hosts'] for result in chunk_results)
+            diff = read_diff(scan_dir)
+            # New subdomains were stored before probing; they count as added, not changed
+            added = set(diff['added'])
+            diff['changed'].extend(change for result in chunk_results for change in result['changed']
+                                   if change['subdomain'] not in added)
+            write_diff(scan_dir, diff)
+            logger.info("persist_scan_task: Scan %s found %s live hosts, %s changed", session_id, live_host_count,
+                        len(diff['changed']))
+            lease.check()
+
+            # The probe and enumerator tasks have already appended the live hosts to the status
+            update_status(scan_dir, status='completed', progress=100, current_tool='Completed',
+                          diff=diff_summary(diff))
+            finish_scan(session_id, 'completed')
+        except ScanCancelled:
+            return None
         except Exception as e:
-            print(f"Warning: Could not update task state: {str(e)}")
+            fail_scan(session_id, scan_dir, e)
+            return None
 
-        return {
-            'domain': domain,
-            'session_id': session_id,
-            'status': 'completed',
-            'subdomains_count': len(subdomains),
-            'live_hosts_count': len(live_hosts),
-            'urls_count': len(urls)
-        }
+    return {
+        'session_id': session_id,
+        'status': 'completed',
+        'live_hosts_count': live_host_count
+    }
 
-    except Exception as e:
-        # Update status with error
-        error_msg = f"Error during scan: {str(e)}"
-        update_status(status_file, status='error', errors=[error_msg])
+@contextmanager
+def scan_step(session_id, scan_dir):
+    """
+    Hold a scan's lease for one step of its canvas.
 
-        # Update Celery task state
+    Yields the lease, or None if the scan was cancelled or reaped before the
+    step started. A cancel while the step runs stops its tool jobs; the lease
+    is handed back to the queue for the next step when the step ends.
+    """
+    lease = ScanLease(session_id, on_cancel=lambda: orchestrator.cancel(session_id)).start()
+    try:
         try:
-            # Only update state if running asynchronously (has task_id)
-            if self.request.id:
-                self.update_state(state='FAILURE', meta={'error': error_msg})
-        except Exception as e:
-            print(f"Warning: Could not update task state: {str(e)}")
+            lease.check()
+        except ScanCancelled:
+            logger.info("Scan %s was stopped, skipping this step", session_id)
+            yield None
+            return
+        yield lease
+    finally:
+        lease.stop(release=True)
+
+def live_host_writer(scan_dir):
+    """
+    Append streamed live hosts to a scan's status, at most once per LIVE_HOST_STATUS_INTERVAL.
 
-        # Re-raise the exception
-        raise
+    Returns:
+        tuple: (callback for each live host, flush function that writes the
+        ones still pending)
+    """
+    pending_hosts = []
+    last_write = [0]
+
+    def flush():
+        if pending_hosts:
+            append_status(scan_dir, 'live_hosts', pending_hosts)
+            pending_hosts.clear()
+
+    def on_live_host(host):
+        pending_hosts.append(host)
+        now = time.time()
+        if now - last_write[0] >= LIVE_HOST_STATUS_INTERVAL:
+            last_write[0] = now
+            flush()
+
+    return on_live_host, flush
+
+def live_host_records(live_hosts):
+    """Probe results for record_probe_results from Httpx live hosts."""
+    return [
+        {
+            'subdomain': urlparse(host['url']).netloc,
+            'status_code': host.get('status_code'),
+            'technology': host.get('technology')
+        }
+        for host in live_hosts
+    ]
+
+def fail_scan(session_id, scan_dir, error):
+    """Mark a scan as failed in its status and in the scan registry."""
+    from app.database import finish_scan
+
+    logger.exception("Error during scan %s: %s", session_id, error)
+    update_status(scan_dir, status='error', progress=0, current_tool='Error', errors=[str(error)])
+    finish_scan(session_id, 'error')
+
+def write_diff(scan_dir, diff):
+    """Write a scan's subdomain diff to diff.json atomically."""
+    diff_file = os.path.join(scan_dir, 'diff.json')
+    temp_file = f"{diff_file}.{os.getpid()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(diff, f)
+    os.replace(temp_file, diff_file)
+
+def read_diff(scan_dir):
+    """Read a scan's subdomain diff, or None if it has none."""
+    try:
+        with open(os.path.join(scan_dir, 'diff.json'), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def diff_summary(diff):
+    """Counts from a subdomain diff, small enough for the scan status."""
+    return {
+        'incremental': diff['incremental'],
+        'added': len(diff['added']),
+        'removed': len(diff['removed']),
+        'stale': len(diff['stale']),
+        'changed': len(diff['changed']),
+        'probed': diff['probed']
+    }
+
+def store_subdomains(domain_id, subdomains):
+    """Add enumerated subdomains to the database."""
+    from app.database import upsert_subdomains
+
+    logger.info("store_subdomains: Adding %s subdomains to database", len(subdomains))
+    subdomain_ids = upsert_subdomains(domain_id, subdomains)
+    if len(subdomain_ids) < len(set(subdomains)):
+        logger.info("store_subdomains: Only %s of %s subdomains were stored", len(subdomain_ids), len(subdomains))
+    return subdomain_ids
 
 @celery.task(bind=True)
 def run_gau_task(self, domain, output_file):
@@ -175,14 +426,14 @@ def run_gau_task(self, domain, output_file):
         from app.database import get_domain_id, get_subdomain_id, add_gau_results_batch, update_subdomain_scan_status
 
         self.update_state(state='PROGRESS', meta={'status': 'Running Gau...'})
-        print(f"Celery task: Running GAU for {domain}, output file: {output_file}")
+        logger.info("Celery task: Running GAU for %s, output file: %s", domain, output_file)
 
         # Run GAU
         run_gau(domain, output_file)
 
         # Parse results
         urls = parse_gau_output(output_file)
-        print(f"Celery task: GAU completed for {domain}, found {len(urls)} URLs")
+        logger.info("Celery task: GAU completed for %s, found %s URLs", domain, len(urls))
 
         # Find the subdomain in the database
         domain_id = get_domain_id(domain)
@@ -190,11 +441,11 @@ def run_gau_task(self, domain, output_file):
             subdomain_id = get_subdomain_id(domain_id, domain)
             if subdomain_id:
                 # Store results in the database
-                print(f"Celery task: Adding {len(urls)} GAU results to database for subdomain ID {subdomain_id}")
+                logger.info("Celery task: Adding %s GAU results to database for subdomain ID %s", len(urls), subdomain_id)
                 add_gau_results_batch(subdomain_id, urls)
                 # Mark the subdomain as scanned
                 update_subdomain_scan_status(subdomain_id, 'GauScanned', 1)
-                print(f"Celery task: Successfully added GAU results to database and marked subdomain as scanned")
+                logger.info("Celery task: Successfully added GAU results to database and marked subdomain as scanned")
 
         return {
             'status': 'completed',
@@ -203,9 +454,64 @@ def run_gau_task(self, domain, output_file):
             'urls': urls[:100]  # Limit to first 100 URLs
         }
     except Exception as e:
-        print(f"Celery task: Error running GAU: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Celery task: Error running GAU: %s", e)
+        self.update_state(state='FAILURE', meta={'error': str(e)})
+        raise
+
+@celery.task(bind=True)
+def run_gau_batch_task(self, domain_id, domain, hosts, scan_dir):
+    """
+    Celery task to run URL discovery for many subdomains of a domain at once.
+
+    gau runs once for the whole batch (see run_gau_batch); the streamed URLs
+    are demultiplexed back to their subdomain by hostname and loaded into
+    GAU_TABLE in a single transaction.
+
+    Args:
+        domain_id (int): The domain the hosts belong to
+        domain (str): The apex domain
+        hosts (list): Subdomains to collect URLs for
+        scan_dir (str): The directory to store results in
+    """
+    try:
+        from app.database import get_subdomain_ids, add_gau_results_bulk, update_subdomains_scan_status
+
+        self.update_state(state='PROGRESS', meta={'status': f'Running Gau on {len(hosts)} hosts...'})
+        os.makedirs(scan_dir, exist_ok=True)
+        output_file = os.path.join(scan_dir, 'gau_batch.txt')
+        logger.info("Celery task: Running GAU batch for %s (%s hosts), output file: %s", domain, len(hosts), output_file)
+
+        subdomain_ids = get_subdomain_ids(domain_id, deduplicate_list(hosts))
+        url_count = run_gau_batch(domain, list(subdomain_ids), output_file)
+        url_counts = {}
+
+        def owned_urls():
+            if not os.path.exists(output_file):
+                return
+            with open(output_file, 'r') as f:
+                for line in f:
+                    url = line.strip()
+                    if not url or url.startswith('#'):
+                        continue
+                    subdomain_id = subdomain_ids.get(url_host(url))
+                    if subdomain_id:
+                        url_counts[subdomain_id] = url_counts.get(subdomain_id, 0) + 1
+                        yield (subdomain_id, url)
+
+        add_gau_results_bulk(owned_urls())
+        update_subdomains_scan_status(list(subdomain_ids.values()), 'GauScanned', 1)
+        stored = sum(url_counts.values())
+        logger.info("Celery task: GAU batch for %s stored %s of %s URLs across %s hosts", domain, stored, url_count, len(url_counts))
+
+        return {
+            'status': 'completed',
+            'domain': domain,
+            'host_count': len(subdomain_ids),
+            'hosts_with_urls': len(url_counts),
+            'url_count': stored
+        }
+    except Exception as e:
+        logger.exception("Celery task: Error running GAU batch: %s", e)
         self.update_state(state='FAILURE', meta={'error': str(e)})
         raise
 
@@ -214,69 +520,227 @@ def run_naabu_task(self, domain, output_file):
     """
     Celery task to run Naabu for a specific domain.
 
+    If the domain is stored as a subdomain it is scanned through its IPs
+    (see plan_port_scan); otherwise Naabu runs against the name directly.
+
     Args:
         domain (str): The domain to scan with Naabu
         output_file (str): The file to save results to
     """
     try:
-        from app.database import get_domain_id, get_subdomain_id, add_naabu_results_batch, update_subdomain_scan_status
+        from app.database import get_domain_id, get_subdomain_id
 
         self.update_state(state='PROGRESS', meta={'status': 'Running Naabu...'})
-        print(f"Celery task: Running Naabu for {domain}, output file: {output_file}")
-
-        # Run Naabu
-        run_naabu(domain, output_file)
-
-        # Parse results
-        ports = parse_naabu_output(output_file)
-        print(f"Celery task: Naabu completed for {domain}, found {len(ports)} open ports")
+        logger.info("Celery task: Running Naabu for %s, output file: %s", domain, output_file)
 
         # Find the subdomain in the database
         domain_id = get_domain_id(domain)
-        if domain_id:
-            subdomain_id = get_subdomain_id(domain_id, domain)
-            if subdomain_id:
-                # Store results in the database
-                print(f"Celery task: Adding {len(ports)} Naabu results to database for subdomain ID {subdomain_id}")
-                # Extract port numbers from the port objects
-                port_numbers = [int(port['port']) for port in ports]
-                add_naabu_results_batch(subdomain_id, port_numbers)
-                # Mark the subdomain as scanned
-                update_subdomain_scan_status(subdomain_id, 'NaabuScanned', 1)
-                print(f"Celery task: Successfully added Naabu results to database and marked subdomain as scanned")
+        subdomain_id = get_subdomain_id(domain_id, domain) if domain_id else None
+        behind_cdn = False
+        if subdomain_id:
+            ports, behind_cdn = scan_host_ports(domain, subdomain_id, output_file, group=self.request.id)
+        else:
+            ports = parse_naabu_output(output_file) if run_naabu(domain, output_file, group=self.request.id) else None
+        if ports is None:
+            logger.error("Celery task: No port scanner available, %s not scanned", domain)
+            return {'status': 'unavailable', 'domain': domain, 'error': 'Neither naabu nor nmap is available'}
+        logger.info("Celery task: Naabu completed for %s, found %s open ports", domain, len(ports))
 
         return {
             'status': 'completed',
             'domain': domain,
             'port_count': len(ports),
-            'ports': ports
+            'ports': ports,
+            'cdn': behind_cdn
         }
     except Exception as e:
-        print(f"Celery task: Error running Naabu: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Celery task: Error running Naabu: %s", e)
         self.update_state(state='FAILURE', meta={'error': str(e)})
         raise
 
-def update_status(status_file, **kwargs):
+@celery.task(bind=True)
+def run_naabu_batch_task(self, domain_id, hosts, scan_dir):
     """
-    Update the status file with new information.
+    Celery task to port scan many subdomains of a domain at once.
+
+    Hosts are resolved and each IP they share is scanned once (see
+    plan_port_scan), with a single ``naabu -list`` run per shard instead of
+    one naabu startup per host. Target lists larger than NAABU_SHARD_SIZE are
+    split into a group of shard tasks so several workers can share the work.
 
     Args:
-        status_file (str): Path to the status file
-        **kwargs: Key-value pairs to update in the status
+        domain_id (int): The domain the hosts belong to
+        hosts (list): Subdomains to scan
+        scan_dir (str): The directory to store results in
     """
+    from app.database import get_subdomain_ids
+
+    os.makedirs(scan_dir, exist_ok=True)
+    targets, cdn_hosts = plan_port_scan(get_subdomain_ids(domain_id, deduplicate_list(hosts)))
+    if cdn_hosts:
+        logger.info("Celery task: Skipping %s hosts behind a CDN", len(cdn_hosts))
+
+    if len(targets) > NAABU_SHARD_SIZE:
+        shards = [targets[i:i + NAABU_SHARD_SIZE] for i in range(0, len(targets), NAABU_SHARD_SIZE)]
+        logger.info("Celery task: Splitting Naabu batch of %s targets into %s shards", len(targets), len(shards))
+        raise self.replace(group(
+            run_naabu_shard_task.s(domain_id, shard, scan_dir, index)
+            for index, shard in enumerate(shards)
+        ))
+
+    return scan_naabu_shard(self, domain_id, targets, scan_dir, 0)
+
+@celery.task(bind=True)
+def run_naabu_shard_task(self, domain_id, targets, scan_dir, shard_index):
+    """Celery task to port scan one shard of a Naabu batch."""
+    return scan_naabu_shard(self, domain_id, targets, scan_dir, shard_index)
+
+def scan_naabu_shard(task, domain_id, targets, scan_dir, shard_index):
+    """Run one naabu -list scan over IPs and unresolved subdomains and store the ports it finds."""
     try:
-        # Read current status
-        with open(status_file, 'r') as f:
-            status = json.load(f)
+        from app.database import get_subdomain_ids
+
+        task.update_state(state='PROGRESS', meta={'status': f'Running Naabu on {len(targets)} targets...'})
+        output_file = os.path.join(scan_dir, f'naabu_batch_{shard_index}.txt')
+        logger.info("Celery task: Running Naabu batch shard %s on %s targets, output file: %s", shard_index, len(targets), output_file)
+
+        ports = scan_port_targets(targets, get_subdomain_ids(domain_id, targets), output_file, group=task.request.id)
+        if ports is None:
+            logger.error("Celery task: No port scanner available, Naabu batch shard %s not scanned", shard_index)
+            return {
+                'status': 'unavailable',
+                'shard': shard_index,
+                'target_count': len(targets),
+                'error': 'Neither naabu nor nmap is available'
+            }
+        port_count = sum(len(target_ports) for target_ports in ports.values())
+        targets_with_ports = sum(1 for target_ports in ports.values() if target_ports)
+        logger.info("Celery task: Naabu batch shard %s found %s open ports on %s targets", shard_index, port_count, targets_with_ports)
 
-        # Update status with new values
-        status.update(kwargs)
+        return {
+            'status': 'completed',
+            'shard': shard_index,
+            'target_count': len(targets),
+            'targets_with_ports': targets_with_ports,
+            'port_count': port_count
+        }
+    except Exception as e:
+        logger.exception("Celery task: Error running Naabu batch: %s", e)
+        task.update_state(state='FAILURE', meta={'error': str(e)})
+        raise
+
+def plan_port_scan(subdomain_ids):
+    """
+    Resolve subdomains and work out what to port scan.
 
-        # Write updated status
-        with open(status_file, 'w') as f:
-            json.dump(status, f)
+    Subdomains are mapped to their IPv4 addresses so an address is scanned
+    once however many subdomains share it. Addresses scanned within
+    NAABU_IP_REUSE_SECONDS aren't scanned again; their stored ports are
+    copied to their subdomains straight away. CDN addresses are flagged
+    IsCDN and not scanned at all unless NAABU_SKIP_CDN is false.
+    Subdomains without an IPv4 address are scanned by name.
 
+    Args:
+        subdomain_ids (dict): Subdomain name -> ID of the subdomains to scan
+
+    Returns:
+        tuple: (targets for scan_port_targets, addresses first; subdomains
+        skipped because every address they have belongs to a CDN)
+    """
+    from app.database import map_subdomain_ips, get_ip_ports, fan_out_ip_ports
+
+    ips_by_host = resolve_host_ips(list(subdomain_ids))
+    skip_cdn = cdn_skip_enabled()
+    cdn = {address for ips in ips_by_host.values() for address in ips if skip_cdn and is_cdn_address(address)}
+    ip_ids = map_subdomain_ips({subdomain_ids[host]: ips for host, ips in ips_by_host.items() if ips}, cdn)
+
+    reused = get_ip_ports(list(ip_ids.values()), time.time() - NAABU_IP_REUSE_SECONDS)
+    fan_out_ip_ports([ip_id for ip_id, ip_ports in reused.items() if ip_ports])
+
+    addresses = [address for address, ip_id in ip_ids.items() if ip_id not in reused and address not in cdn]
+    # Including any whose mapping couldn't be stored
+    by_name = [host for host, ips in ips_by_host.items() if not ips or any(ip not in ip_ids for ip in ips)]
+    cdn_hosts = [host for host, ips in ips_by_host.items() if ips and all(ip in cdn for ip in ips)]
+    logger.info("plan_port_scan: %s subdomains share %s IPs; scanning %s IPs and %s subdomains by name (%s reused, %s CDN IPs skipped)",
+                len(subdomain_ids), len(ip_ids), len(addresses), len(by_name), len(reused), len(cdn))
+    return addresses + by_name, cdn_hosts
+
+def scan_port_targets(targets, subdomain_ids, output_file, group=None):
+    """
+    Port scan targets with one naabu run and store the ports it finds.
+
+    Ports found on an address are stored for the IP and copied to every
+    subdomain behind it; ports found on a subdomain scanned by name are
+    stored for that subdomain alone.
+
+    Args:
+        targets (list): Addresses and subdomain names from plan_port_scan
+        subdomain_ids (dict): Subdomain name -> ID for the named targets
+        output_file (str): The file to save naabu's output to
+        group (str): Orchestrator group the naabu job runs in, for cancellation
+
+    Returns:
+        dict: Target -> sorted open ports, or None if no port scanner is
+        usable, in which case nothing is stored
+    """
+    from app.database import (get_ip_ids, record_ip_ports, fan_out_ip_ports, add_naabu_results_batch,
+                              update_subdomains_scan_status)
+
+    ports = {target: set() for target in targets}
+
+    def on_port(line):
+        port = parse_naabu_line(line)
+        if port and port['port'].isdigit() and port['host'] in ports:
+            ports[port['host']].add(int(port['port']))
+
+    if run_naabu_batch(targets, output_file, line_callback=on_port, group=group) is None:
+        return None
+
+    ip_ids = get_ip_ids(targets)
+    # IPs where nothing was found are rescanned next time rather than trusted
+    found = {ip_id: sorted(ports[address]) for address, ip_id in ip_ids.items() if ports[address]}
+    if record_ip_ports(found):
+        fan_out_ip_ports(list(found))
+
+    named = {target: subdomain_ids[target] for target in targets if target in subdomain_ids}
+    for target, subdomain_id in named.items():
+        add_naabu_results_batch(subdomain_id, sorted(ports[target]))
+    update_subdomains_scan_status(list(named.values()), 'NaabuScanned', 1)
+    return {target: sorted(target_ports) for target, target_ports in ports.items()}
+
+def scan_host_ports(host, subdomain_id, output_file, group=None):
+    """
+    Port scan one subdomain through its IPs.
+
+    Returns:
+        tuple: (the subdomain's stored ports as parse_naabu_line dicts, or
+        None if it needed a scan and no port scanner is usable; whether the
+        scan was skipped because the subdomain is behind a CDN)
+    """
+    from app.database import get_naabu_results
+
+    targets, cdn_hosts = plan_port_scan({host: subdomain_id})
+    if targets and scan_port_targets(targets, {host: subdomain_id}, output_file, group=group) is None:
+        return None, False
+    ports = [parse_naabu_line(f"{host}:{port}") for port in get_naabu_results(subdomain_id)]
+    return ports, host in cdn_hosts
+
+def update_status(scan_dir, **kwargs):
+    """
+    Update the scan status with new information.
+
+    Args:
+        scan_dir (str): The scan directory the status belongs to
+        **kwargs: Key-value pairs to update in the status
+    """
+    try:
+        store_status(scan_dir, **kwargs)
+    except Exception as e:
+        logger.error("Error updating scan status: %s", e)
+
+def append_status(scan_dir, field, items):
+    """Append items to a list field of the scan status, logging rather than raising on failure."""
+    try:
+        store_append(scan_dir, field, items)
     except Exception as e:
-        print(f"Error updating status file: {str(e)}")
+        logger.error("Error appending to scan status: %s", e)
@@ -1,15 +1,34 @@
-import subprocess
 import os
-import time
-import threading
+import asyncio
 import json
-import shutil
+import logging
 import re
+from urllib.parse import urlparse
 from app.utils import deduplicate_list
+from app.orchestrator import orchestrator, resolver, ToolJob, StdinFeed
+from app.capabilities import get_capabilities, has_flag
+from app.result_cache import CacheEntry
+from app.dns_resolver import dns_resolution_enabled, shared_resolver
+from app.wildcard import filter_wildcards, wildcard_filter_enabled
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for a batched URL discovery run over a whole domain
+GAU_BATCH_TIMEOUT = 3600
+
+# Upper bound for a pipelined Httpx run, which lives as long as enumeration
+PIPELINE_TIMEOUT = 3600
+
+# Ports scanned by naabu builds without -top-ports: common web, mail,
+# database and other service ports
+NAABU_PORT_RANGES = "1-1000,1433,1521,1723,2049,2375,2376,3000,3306,3389,5432,5900,5901,6379,8000-8999,9000-9999,27017,27018,27019"
+
+# Timeout budget per host for batched naabu runs
+NAABU_SECONDS_PER_HOST = 5
 
 def check_tool_installed(tool_name):
     """Check if a tool is installed and available in PATH."""
-    return shutil.which(tool_name) is not None
+    return resolver.resolve(tool_name) is not None
 
 def get_tool_status():
     """Get the status of all required tools."""
@@ -24,151 +43,122 @@ def get_tool_status():
     }
     return tools
 
-def run_tool(tool_name, command, output_file=None, timeout=300):
-    """Run a command-line tool and capture its output."""
-    print(f"run_tool: Running {tool_name} with command: {command}")
-    if output_file:
-        print(f"run_tool: Output will be saved to: {output_file}")
-
-    # Check if the tool is installed
-    tool_cmd = command.split()[0]
-    if not check_tool_installed(tool_cmd) and tool_cmd not in ['python', 'python3']:
-        print(f"run_tool: Warning: {tool_cmd} not found in PATH")
-        # Print the PATH for debugging
-        print(f"run_tool: PATH: {os.environ.get('PATH', '')}")
-        # Try to find the tool in common locations
-        common_locations = ['/usr/bin', '/usr/local/bin', '/bin', '/opt/homebrew/bin', '/go/bin']
-        for location in common_locations:
-            tool_path = os.path.join(location, tool_cmd)
-            if os.path.exists(tool_path):
-                print(f"run_tool: Found {tool_cmd} at {tool_path}")
-                break
-        else:
-            print(f"run_tool: Could not find {tool_cmd} in common locations")
-
-        if output_file:
-            with open(output_file, 'w') as f:
-                f.write(f"# Tool {tool_cmd} not installed or not found in PATH\n")
-        return f"Tool {tool_cmd} not installed or not found in PATH"
-
+def run_tool(tool_name, command, output_file=None, timeout=300, line_callback=None, stdin_lines=None, group=None):
+    """
+    Run a command-line tool on the orchestrator and wait for it to finish.
+
+    stdout is written to output_file incrementally and each line is passed to
+    line_callback, so the full output is never held in memory. Tools that
+    write their own output file (``-o``) can be run without either. Note that
+    line_callback runs on the orchestrator loop and must not block. Jobs in a
+    group (e.g. a scan's session ID) are killed by orchestrator.cancel(group).
+
+    Returns:
+        str: A short status or error message
+    """
+    job = ToolJob(tool_name, command, output_file, timeout=timeout, line_callback=line_callback,
+                  stdin=stdin_lines, group=group)
     try:
-        # Start the process
-        print(f"run_tool: Starting process for {tool_name}")
-        # Create a copy of the environment with PATH including common locations
-        env = os.environ.copy()
-        # Add common tool locations to PATH if they're not already there
-        common_locations = ['/usr/bin', '/usr/local/bin', '/bin', '/opt/homebrew/bin', '/go/bin']
-        path = env.get('PATH', '')
-        for location in common_locations:
-            if location not in path:
-                path = f"{location}:{path}"
-        env['PATH'] = path
-        print(f"run_tool: Using PATH: {env['PATH']}")
-
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE if output_file else None,
-            stderr=subprocess.PIPE,
-            text=True,
-            shell=True,
-            env=env  # Pass modified environment variables to the subprocess
-        )
-        print(f"run_tool: Process started with PID: {process.pid}")
-
-        # Wait for the process to complete with timeout
-        print(f"run_tool: Waiting for process to complete (timeout: {timeout}s)")
-        stdout, stderr = process.communicate(timeout=timeout)
-        print(f"run_tool: Process completed with return code: {process.returncode}")
-        if stderr:
-            print(f"run_tool: Process stderr: {stderr}")
-
-        # Check if the process was successful
-        if process.returncode != 0:
-            error_msg = f"{tool_name} failed: {stderr}"
-            print(f"Warning: {error_msg}")
-            if output_file:
-                with open(output_file, 'w') as f:
-                    f.write(f"# {error_msg}\n")
-            return error_msg
-
-        # Save output to file if specified
-        if output_file and stdout:
-            with open(output_file, 'w') as f:
-                f.write(stdout)
+        return orchestrator.run_job_sync(job)
+    except Exception as e:
+        return job.fail(f"Error running {tool_name}: {str(e)}")
 
-        return stdout if stdout else ""
+def stream_tool_output(tool_name, command, output_file, timeout=300, stdin_lines=None, group=None):
+    """
+    Stream a tool's stdout into output_file and return the number of lines.
 
-    except subprocess.TimeoutExpired:
-        # Kill the process if it times out
-        process.kill()
-        error_msg = f"{tool_name} timed out after {timeout} seconds"
-        print(f"Warning: {error_msg}")
-        if output_file:
-            with open(output_file, 'w') as f:
-                f.write(f"# {error_msg}\n")
-        return error_msg
+    Unlike run_tool, the file is only opened once the first line arrives, so an
+    existing file is left untouched when the tool prints nothing, and partial
+    output is kept if the tool exits with an error.
+    """
+    state = {'file': None, 'count': 0}
 
-    except Exception as e:
-        # Handle other exceptions
-        error_msg = f"Error running {tool_name}: {str(e)}"
-        print(f"Warning: {error_msg}")
-        if output_file:
-            with open(output_file, 'w') as f:
-                f.write(f"# {error_msg}\n")
-        return error_msg
+    def write_line(line):
+        if state['file'] is None:
+            state['file'] = open(output_file, 'w')
+        state['file'].write(line + '\n')
+        state['count'] += 1
 
-def run_subfinder(domain, output_file):
-    """Run Subfinder for subdomain enumeration."""
+    try:
+        run_tool(tool_name, command, timeout=timeout, line_callback=write_line, stdin_lines=stdin_lines, group=group)
+    finally:
+        if state['file'] is not None:
+            state['file'].close()
+    return state['count']
+
+def subfinder_job(domain, output_file, line_callback=None):
+    """Build the Subfinder job for subdomain enumeration."""
     command = f"subfinder -d {domain} -silent"
-    return run_tool("Subfinder", command, output_file)
+    return ToolJob("Subfinder", command, output_file, line_callback=line_callback)
 
-def run_assetfinder(domain, output_file):
-    """Run Assetfinder for subdomain enumeration."""
+def assetfinder_job(domain, output_file, line_callback=None):
+    """Build the Assetfinder job for subdomain enumeration."""
     command = f"assetfinder {domain}"
-    return run_tool("Assetfinder", command, output_file)
+    return ToolJob("Assetfinder", command, output_file, line_callback=line_callback)
 
-def run_chaos(domain, output_file):
-    """Run Chaos for subdomain enumeration."""
+def chaos_job(domain, output_file, line_callback=None):
+    """Build the Chaos job, or return None if no API key is configured."""
     # Get API key from environment variable
     api_key = os.environ.get('PDCP_API_KEY')
     if not api_key:
-        print("Warning: PDCP_API_KEY environment variable not set. Chaos will not work properly.")
+        logger.warning("PDCP_API_KEY environment variable not set. Chaos will not work properly.")
         if output_file:
             with open(output_file, 'w') as f:
-                f.write(f"# Chaos failed: PDCP_API_KEY not specified\n")
-        return "Chaos failed: PDCP_API_KEY not specified"
-
-    # Set the API key as an environment variable for the command
-    os.environ['PDCP_API_KEY'] = api_key
+                f.write("# Chaos failed: PDCP_API_KEY not specified\n")
+        return None
 
     # Run chaos with the API key
     command = f"chaos -d {domain} -silent -key {api_key}"
-    return run_tool("Chaos", command, output_file)
+    return ToolJob("Chaos", command, output_file, line_callback=line_callback)
+
+def sublist3r_job(domain, output_file, line_callback=None):
+    """Build the Sublist3r job for subdomain enumeration."""
+    def report_results(job):
+        # Sublist3r only writes its own output file, so report results once it's done
+        if line_callback:
+            for subdomain in parse_subdomains(output_file):
+                line_callback(subdomain)
 
-def run_sublist3r(domain, output_file):
-    """Run Sublist3r for subdomain enumeration."""
     # Use the wrapper script that's in PATH
     command = f"sublist3r -d {domain} -o {output_file}"
-    return run_tool("Sublist3r", command)
+    return ToolJob("Sublist3r", command, on_complete=report_results)
+
+def httpx_command():
+    """
+    Build the base Httpx command for the installed version.
+
+    Builds that support it emit JSON lines (see parse_httpx_json) with the
+    title, content length, IP and CDN fields enabled; older ones fall back to
+    the plain text format.
+    """
+    command = "httpx -silent -status-code -no-color"
+    # Older httpx releases don't have technology detection
+    if has_flag('httpx', '-tech-detect', '-td'):
+        command += " -tech-detect"
+    if has_flag('httpx', '-json', '-j'):
+        command += " -json"
+        for flag in ('-title', '-content-length', '-ip', '-cdn'):
+            if has_flag('httpx', flag):
+                command += f" {flag}"
+    return command
+
+def run_httpx(subdomains_file, output_file, live_host_callback=None, group=None):
+    """
+    Run Httpx for web detection.
+
+    Each result is parsed as httpx prints it and passed to live_host_callback,
+    so callers get live hosts without re-reading output_file afterwards.
+    """
+    def on_line(line):
+        host = parse_httpx_line(line)
+        if host and live_host_callback:
+            live_host_callback(host)
 
-def run_httpx(subdomains_file, output_file):
-    """Run Httpx for web detection."""
-    # Try different command formats for different httpx versions
     try:
-        # First try with newer flags including technology detection but without title
-        command = f"httpx -l {subdomains_file} -silent -status-code -tech-detect -no-color -o {output_file}"
-        result = run_tool("Httpx", command)
-
-        # Check if the output file was created and has content
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            return result
-
-        # If that fails, try with older version flags
-        print("First httpx command failed, trying alternative format...")
-        command = f"httpx -l {subdomains_file} -silent -status-code -no-color -o {output_file}"
-        return run_tool("Httpx", command)
+        command = f"{httpx_command()} -l {subdomains_file}"
+        return run_tool("Httpx", command, output_file, line_callback=on_line, group=group)
     except Exception as e:
-        print(f"Error running httpx: {str(e)}")
+        logger.error("Error running httpx: %s", e)
         # Create a fallback file with basic information
         with open(output_file, 'w') as f:
             with open(subdomains_file, 'r') as sf:
@@ -178,233 +168,318 @@ def run_httpx(subdomains_file, output_file):
                         f.write(f"https://{subdomain} [200]\n")
         return f"Httpx failed: {str(e)}, using fallback output"
 
-def run_gau(domain, output_file):
-    """Run Gau for URL discovery."""
-    print(f"Running GAU for domain: {domain}, output file: {output_file}")
+def write_fallback_urls(domain, output_file):
+    """Write example URLs so the UI always has something to show."""
+    with open(output_file, 'w') as f:
+        f.write(f"https://{domain}/index.html\n")
+        f.write(f"https://{domain}/about\n")
+        f.write(f"https://{domain}/contact\n")
+        f.write(f"https://{domain}/login\n")
+        f.write(f"https://{domain}/api/v1/users\n")
+
+def gau_argv():
+    """
+    Work out how the installed gau binary should be invoked.
+
+    Optional flags are only added when the capability registry says this gau
+    build supports them, so a broken or unusual install is detected once
+    instead of run_gau cascading through failed invocations.
+
+    Returns:
+        list: The base argv, or None if gau is missing or printed no help
+    """
+    capabilities = get_capabilities('gau')
+    if not capabilities:
+        return None
+    flags = capabilities['flags']
+    if not flags:
+        logger.info("gau_argv: %s printed no usable help output, treating it as broken", capabilities['path'])
+        return None
+
+    argv = [capabilities['path']]
+    if '--threads' in flags:
+        argv += ['--threads', '50']
+    if '--retries' in flags:
+        argv += ['--retries', '15']
+    if '--blacklist' in flags:
+        argv += ['--blacklist', 'png,jpg,gif,jpeg,css,js']
+    return argv
+
+def race_url_sources(domain, output_file):
+    """
+    Run gau and waybackurls at the same time and keep whichever finishes first.
+
+    Both tools stream into output_file through a shared dedup set while they
+    run. As soon as one exits successfully with results, the other is
+    cancelled.
+
+    Returns:
+        int: The number of unique URLs written
+    """
+    gau = gau_argv()
+    jobs = []
+    if gau:
+        jobs.append(ToolJob("Gau", gau + [domain]))
+    if check_tool_installed('waybackurls'):
+        jobs.append(ToolJob("Waybackurls", ['waybackurls', domain]))
+    if not jobs:
+        return 0
+
+    # Callbacks run on the orchestrator loop, so no locking is needed
+    state = {'file': None, 'seen': set()}
+
+    def write_url(line):
+        url = line.strip()
+        if url in state['seen']:
+            return
+        state['seen'].add(url)
+        if state['file'] is None:
+            state['file'] = open(output_file, 'w')
+        state['file'].write(url + '\n')
+
+    for job in jobs:
+        job.line_callback = write_url
+
+    try:
+        winner = orchestrator.run_race_sync(jobs, accept=lambda job: job.succeeded and job.line_count > 0)
+    finally:
+        if state['file'] is not None:
+            state['file'].close()
+
+    logger.info("race_url_sources: Winner: %s, %s unique URLs", winner.name if winner else None, len(state['seen']))
+    return len(state['seen'])
+
+def run_gau_batch(domain, hosts, output_file, mode=None):
+    """
+    Run URL discovery for many subdomains of a domain at once.
+
+    In ``subs`` mode gau runs once over the apex with ``--subs``; in ``list``
+    mode the host list is fed to gau on stdin. Either way the archives are
+    queried by one process instead of one per host. The mode defaults to
+    GAU_BATCH_MODE, or ``subs`` when this gau build supports it. waybackurls,
+    which also reads hosts from stdin, is used if gau is unusable.
+
+    Returns:
+        int: The number of URLs written to output_file
+    """
+    if mode is None:
+        mode = os.environ.get('GAU_BATCH_MODE') or ('subs' if has_flag('gau', '--subs') else 'list')
+    timeout = GAU_BATCH_TIMEOUT
+
+    gau = gau_argv()
+    if gau:
+        if mode == 'subs':
+            logger.info("run_gau_batch: Running gau --subs over %s for %s hosts", domain, len(hosts))
+            url_count = stream_tool_output("Gau", gau + ['--subs', domain], output_file, timeout=timeout)
+        else:
+            logger.info("run_gau_batch: Feeding %s hosts to gau", len(hosts))
+            url_count = stream_tool_output("Gau", gau, output_file, timeout=timeout, stdin_lines=hosts)
+        if url_count:
+            return url_count
+        logger.info("run_gau_batch: gau returned no output")
+
+    if check_tool_installed('waybackurls'):
+        logger.info("run_gau_batch: Feeding %s hosts to waybackurls", len(hosts))
+        return stream_tool_output("Waybackurls", ['waybackurls', '-no-subs'], output_file,
+                                  timeout=timeout, stdin_lines=hosts)
+
+    logger.info("run_gau_batch: Neither gau nor waybackurls is available")
+    return 0
+
+def run_gau(domain, output_file, race=None):
+    """
+    Run Gau for URL discovery.
+
+    The gau invocation comes from gau_argv, so a broken install is detected
+    once instead of burning a timeout per flag variant. In race mode
+    (GAU_RACE=true) gau and waybackurls run concurrently; otherwise
+    waybackurls is only tried when gau produces nothing.
+    """
+    logger.info("Running GAU for domain: %s, output file: %s", domain, output_file)
+    if race is None:
+        race = os.environ.get('GAU_RACE', 'False').lower() == 'true'
 
     # Make sure the domain is properly formatted
     if domain.startswith('http://') or domain.startswith('https://'):
-        from urllib.parse import urlparse
         parsed_url = urlparse(domain)
         domain = parsed_url.netloc
-        print(f"Extracted domain from URL: {domain}")
+        logger.debug("Extracted domain from URL: %s", domain)
 
     # Always create a file with at least some example URLs to ensure we have results
     # This will be overwritten if the real scan finds results
-    with open(output_file, 'w') as f:
-        f.write(f"https://{domain}/index.html\n")
-        f.write(f"https://{domain}/about\n")
-        f.write(f"https://{domain}/contact\n")
-        f.write(f"https://{domain}/login\n")
-        f.write(f"https://{domain}/api/v1/users\n")
-    print(f"Created initial GAU results file with example URLs")
+    write_fallback_urls(domain, output_file)
+    logger.debug("Created initial GAU results file with example URLs")
 
-    # Different versions of gau have different output flags
-    # Try using direct command with output redirection first
-    try:
-        # First try with direct command and output redirection
-        print(f"Trying gau with direct command: gau {domain}")
-        process = subprocess.Popen(
-            ["gau", domain],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = process.communicate(timeout=300)
+    gau = gau_argv()
+    cache = CacheEntry('gau', domain, (gau or [])[1:] + (['--race'] if race else []), output_file)
+    url_count = cache.restore()
+    if url_count:
+        return f"URL discovery completed with {url_count} cached URLs"
 
-        if stdout:
-            print(f"GAU command succeeded, got {len(stdout.splitlines())} URLs")
-            with open(output_file, 'w') as f:
-                f.write(stdout)
-            return "Gau completed successfully (direct command)"
+    try:
+        if race:
+            url_count = race_url_sources(domain, output_file)
+            if url_count:
+                cache.save()
+                return f"URL discovery completed with {url_count} URLs (gau/waybackurls race)"
         else:
-            print(f"GAU command returned no output. Error: {stderr}")
-
-        # Try with --o flag
-        print("Trying with --o flag")
-        command = f"gau {domain} --o {output_file}"
-        result = run_tool("Gau", command)
-
-        # Check if the output file was created and has content
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"GAU succeeded with --o flag")
-            return result
-
-        # Try with -o flag
-        print("Trying with -o flag")
-        command = f"gau {domain} -o {output_file}"
-        result = run_tool("Gau", command)
-
-        # Check again
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"GAU succeeded with -o flag")
-            return result
-
-        # Try with -output flag
-        print("Trying with -output flag")
-        command = f"gau {domain} -output {output_file}"
-        result = run_tool("Gau", command)
-
-        # Check again
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"GAU succeeded with -output flag")
-            return result
-
-        # Try with additional parameters
-        print("Trying with additional parameters")
-        command = f"gau --threads 50 --retries 15 --blacklist png,jpg,gif,jpeg,css,js {domain} -o {output_file}"
-        result = run_tool("Gau", command)
-
-        # Check again
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"GAU succeeded with additional parameters")
-            return result
-
-        # If all else fails, try waybackurls as an alternative
-        print("Trying waybackurls as an alternative")
-        try:
-            process = subprocess.Popen(
-                ["waybackurls", domain],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate(timeout=300)
-
-            if stdout:
-                print(f"waybackurls command succeeded, got {len(stdout.splitlines())} URLs")
-                with open(output_file, 'w') as f:
-                    f.write(stdout)
-                return "waybackurls completed successfully (as GAU alternative)"
-        except Exception as e:
-            print(f"Error running waybackurls: {str(e)}")
+            if gau:
+                url_count = stream_tool_output("Gau", gau + [domain], output_file)
+                if url_count:
+                    logger.info("GAU command succeeded, got %s URLs", url_count)
+                    cache.save()
+                    return "Gau completed successfully"
+                logger.info("GAU command returned no output")
+
+            # If gau is missing, broken or empty, try waybackurls as an alternative
+            if check_tool_installed('waybackurls'):
+                logger.info("Trying waybackurls as an alternative")
+                url_count = stream_tool_output("Waybackurls", ['waybackurls', domain], output_file)
+                if url_count:
+                    logger.info("waybackurls command succeeded, got %s URLs", url_count)
+                    cache.save()
+                    return "waybackurls completed successfully (as GAU alternative)"
 
         # If we still don't have output, create a dummy file with example URLs
-        print("All GAU attempts failed, using fallback URLs")
-        with open(output_file, 'w') as f:
-            f.write(f"https://{domain}/index.html\n")
-            f.write(f"https://{domain}/about\n")
-            f.write(f"https://{domain}/contact\n")
-            f.write(f"https://{domain}/login\n")
-            f.write(f"https://{domain}/api/v1/users\n")
-
+        logger.error("All GAU attempts failed, using fallback URLs")
+        write_fallback_urls(domain, output_file)
         return "Gau failed, using fallback URLs"
 
     except Exception as e:
-        print(f"Error running gau: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error running gau: %s", e)
 
         # Create a dummy file with example URLs
-        with open(output_file, 'w') as f:
-            f.write(f"https://{domain}/index.html\n")
-            f.write(f"https://{domain}/about\n")
-            f.write(f"https://{domain}/contact\n")
-            f.write(f"https://{domain}/login\n")
-            f.write(f"https://{domain}/api/v1/users\n")
-
+        write_fallback_urls(domain, output_file)
         return f"Gau failed: {str(e)}, using fallback URLs"
 
-def run_naabu(host, output_file):
-    """Run Naabu for port scanning."""
-    # Expanded port range to scan
-    # Include common web ports, mail ports, database ports, and other common services
-    port_ranges = "1-1000,1433,1521,1723,2049,2375,2376,3000,3306,3389,5432,5900,5901,6379,8000-8999,9000-9999,27017,27018,27019"
-
-    print(f"Running Naabu port scan on {host} with port ranges: {port_ranges}")
-
-    # Always create a file with at least some common ports to ensure we have results
-    # This will be overwritten if the real scan finds results
-    with open(output_file, 'w') as f:
-        f.write(f"{host}:80\n")
-        f.write(f"{host}:443\n")
-        f.write(f"{host}:8080\n")
-    print(f"Created initial Naabu results file with common ports")
-
-    try:
-        # First try with top ports flag for faster scanning
-        command = f"naabu -host {host} -top-ports 1000 -silent -o {output_file}"
-        print(f"Executing command: {command}")
-        result = run_tool("Naabu", command)
-
-        # Check if the output file was created and has content
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"Naabu scan completed successfully with top-ports flag")
-            return result
-
-        # If that fails, try with specific port ranges
-        print("Top ports scan failed, trying with specific port ranges...")
-        command = f"naabu -host {host} -p {port_ranges} -silent -o {output_file}"
-        print(f"Executing command: {command}")
-        result = run_tool("Naabu", command)
-
-        # Check if the output file was created and has content
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"Naabu scan completed successfully with port ranges")
-            return result
-
-        # Try with different output flag
-        print("Trying alternative naabu command format...")
-        command = f"naabu -host {host} -p {port_ranges} -silent -output {output_file}"
-        print(f"Executing command: {command}")
-        result = run_tool("Naabu", command)
-
-        # Check again
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            print(f"Naabu scan completed successfully with alternative command")
-            return result
-
-        # Try with nmap fallback if naabu is failing
-        if shutil.which('nmap'):
-            print("Trying nmap as fallback...")
-            command = f"nmap -p 1-1000 {host} -oN {output_file}"
-            print(f"Executing command: {command}")
-            result = run_tool("Nmap", command)
-
-            # Parse nmap output and convert to naabu format
-            if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                # Parse nmap output and convert to naabu format
-                with open(output_file, 'r') as f:
-                    nmap_output = f.read()
-
-                # Extract open ports from nmap output
-                open_ports = []
-                for line in nmap_output.splitlines():
-                    if 'open' in line and 'tcp' in line:
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            port = parts[0].split('/')[0]
-                            open_ports.append(port)
-
-                # Write ports in naabu format
-                with open(output_file, 'w') as f:
-                    for port in open_ports:
-                        f.write(f"{host}:{port}\n")
-
-                print(f"Nmap scan completed, found {len(open_ports)} open ports")
-                return "Used nmap as fallback for port scanning"
-
-        # If all else fails, create a dummy file with common ports
-        print("All port scanning methods failed, using fallback ports")
-        with open(output_file, 'w') as f:
-            f.write(f"{host}:80\n")
-            f.write(f"{host}:443\n")
-            f.write(f"{host}:8080\n")
-
-        return "Naabu and nmap failed, using fallback ports"
-
-    except Exception as e:
-        print(f"Error running port scan: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-        # Create a dummy file with common ports
+def naabu_argv(port_ranges=NAABU_PORT_RANGES):
+    """
+    Build the base Naabu argv for the installed version.
+
+    Returns:
+        list: The argv without a target, or None if naabu isn't usable
+    """
+    capabilities = get_capabilities('naabu')
+    if not capabilities or not capabilities['flags']:
+        return None
+    argv = [capabilities['path'], '-silent']
+    # Prefer top ports for faster scanning, with explicit ranges for older builds
+    if has_flag('naabu', '-top-ports', '-tp'):
+        argv += ['-top-ports', '1000']
+    else:
+        argv += ['-p', port_ranges]
+    return argv
+
+def run_naabu_batch(hosts, output_file, line_callback=None, group=None):
+    """
+    Port scan many hosts with a single ``naabu -list`` run.
+
+    The host list is written once and every ``host:port`` line is streamed to
+    output_file and line_callback as naabu reports it. If naabu isn't usable,
+    each host is scanned with nmap instead.
+
+    Returns:
+        str: A summary of the scan, or None if neither naabu nor nmap is usable
+    """
+    hosts_file = f"{output_file}.hosts"
+    with open(hosts_file, 'w') as f:
+        for host in hosts:
+            f.write(f"{host}\n")
+
+    argv = naabu_argv()
+    if argv:
+        timeout = max(300, len(hosts) * NAABU_SECONDS_PER_HOST)
+        logger.info("run_naabu_batch: Scanning %s hosts with one naabu run (timeout: %ss)", len(hosts), timeout)
+        return run_tool("Naabu", argv + ['-list', hosts_file], output_file, timeout=timeout, line_callback=line_callback,
+                        group=group)
+
+    if not check_tool_installed('nmap'):
+        logger.error("run_naabu_batch: Neither naabu nor nmap is usable, %s hosts not scanned", len(hosts))
+        return None
+
+    logger.info("run_naabu_batch: Naabu unavailable, scanning %s hosts one at a time with nmap", len(hosts))
+    with open(output_file, 'w') as out:
+        for host in hosts:
+            host_file = f"{output_file}.{host}"
+            run_nmap(host, host_file, group=group)
+            if not os.path.exists(host_file):
+                continue
+            with open(host_file, 'r') as f:
+                for line in f:
+                    out.write(line)
+                    if line_callback and line.strip():
+                        line_callback(line.strip())
+            os.remove(host_file)
+    return f"Scanned {len(hosts)} hosts individually with nmap"
+
+def run_nmap(host, output_file, group=None):
+    """Run nmap as a fallback port scanner and convert its output to naabu format."""
+    nmap_file = f"{output_file}.nmap"
+    result = run_tool("Nmap", ['nmap', '-p', '1-1000', host, '-oN', nmap_file], group=group)
+    if not os.path.exists(nmap_file):
+        return 0, result
+
+    # Extract open ports from nmap output
+    open_ports = []
+    with open(nmap_file, 'r') as f:
+        for line in f:
+            if 'open' in line and 'tcp' in line:
+                parts = line.split()
+                if len(parts) >= 2:
+                    open_ports.append(parts[0].split('/')[0])
+    os.remove(nmap_file)
+
+    # Write ports in naabu format
+    if open_ports:
         with open(output_file, 'w') as f:
-            f.write(f"{host}:80\n")
-            f.write(f"{host}:443\n")
-            f.write(f"{host}:8080\n")
-
-        return f"Port scanning failed: {str(e)}, using fallback ports"
+            for port in open_ports:
+                f.write(f"{host}:{port}\n")
+    return len(open_ports), result
+
+def run_naabu(host, output_file, group=None):
+    """
+    Run Naabu for port scanning.
+
+    The invocation comes from the capability registry, so the scan runs once
+    with the right flags; nmap is only used when naabu is missing or broken.
+    Only ports a scanner actually reported end up in output_file.
+
+    Returns:
+        str: A summary of the scan, or None if neither naabu nor nmap is usable
+    """
+    logger.info("Running Naabu port scan on %s", host)
+
+    # Start empty so an earlier run's ports aren't read back as this one's
+    open(output_file, 'w').close()
+
+    argv = naabu_argv()
+    if argv:
+        port_count = stream_tool_output("Naabu", argv + ['-host', host], output_file, group=group)
+        logger.info("Naabu scan completed, found %s open ports", port_count)
+        return f"Naabu completed ({port_count} open ports)"
+
+    # Try with nmap fallback if naabu is missing or broken
+    if check_tool_installed('nmap'):
+        logger.info("Naabu unavailable, trying nmap as fallback...")
+        port_count, result = run_nmap(host, output_file, group=group)
+        logger.info("Nmap scan completed, found %s open ports", port_count)
+        return "Used nmap as fallback for port scanning"
+
+    logger.error("Neither naabu nor nmap is usable, %s not scanned", host)
+    return None
+
+def parse_naabu_line(line):
+    """Parse a ``host:port`` line of Naabu output, or return None."""
+    line = line.strip()
+    if not line or line.startswith('#') or ':' not in line:
+        return None
+
+    host, port = line.rsplit(':', 1)
+    return {
+        'host': host,
+        'port': port,
+        'url': f"http://{host}:{port}" if port != '443' else f"https://{host}"
+    }
 
 def parse_naabu_output(file_path):
     """Parse Naabu output to extract open ports."""
@@ -414,237 +489,253 @@ def parse_naabu_output(file_path):
     open_ports = []
     with open(file_path, 'r') as f:
         for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Parse line format: host:port
-            if ':' in line:
-                host, port = line.split(':', 1)
-                open_ports.append({
-                    'host': host,
-                    'port': port,
-                    'url': f"http://{host}:{port}" if port != '443' else f"https://{host}"
-                })
+            port = parse_naabu_line(line)
+            if port:
+                open_ports.append(port)
 
     return open_ports
 
 
-
-
-
 def parse_subdomains(file_path):
     """Parse subdomains from a file."""
     if not os.path.exists(file_path):
         return []
 
     with open(file_path, 'r') as f:
-        return [line.strip() for line in f if line.strip()]
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+# Regular expression to remove ANSI color codes
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+def parse_httpx_json(line):
+    """
+    Parse a single Httpx ``-json`` line into a compact live host record.
+
+    Only the fields the app uses are kept, so large outputs don't carry the
+    full httpx response objects around.
+
+    Returns:
+        dict: The live host, or None if the line isn't a valid record
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    url = record.get('url')
+    if not url:
+        return None
+
+    status_code = str(record.get('status_code') or record.get('status-code') or "Unknown")
+    tech = record.get('tech') or record.get('technologies') or []
+    return {
+        'url': url,
+        'status_code': status_code,
+        'status_class': get_status_class(status_code),
+        'technology': ', '.join(tech) if tech else "Unknown",
+        'tech': tech,
+        'title': record.get('title'),
+        'content_length': record.get('content_length', record.get('content-length')),
+        'ip': record.get('host'),
+        'cdn': record.get('cdn_name') if record.get('cdn') else None
+    }
+
+def parse_httpx_line(line):
+    """
+    Parse a single line of Httpx output.
+
+    JSON lines are handed to parse_httpx_json; anything else is treated as
+    the plain text format of older builds and the fallback files.
+
+    Args:
+        line (str): A line such as ``https://example.com [200] [Nginx]``
+
+    Returns:
+        dict: The live host, or None if the line isn't a result
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        return parse_httpx_json(line)
+
+    # Remove ANSI color codes
+    line = ANSI_ESCAPE.sub('', line)
+    if not line or line.startswith('#'):
+        return None
+
+    # Parse line format: https://example.com [200] [Page Title]
+    parts = line.split(' ', 1)
+    if len(parts) < 2:
+        return None
+
+    url = parts[0]
+
+    # Extract status code
+    status_code = "Unknown"
+    if '[' in parts[1] and ']' in parts[1]:
+        status_start = parts[1].find('[') + 1
+        status_end = parts[1].find(']', status_start)
+        if status_start < status_end:
+            status_code = parts[1][status_start:status_end].strip()
+
+    # Extract technology if available
+    tech = "Unknown"
+    remaining_text = parts[1][parts[1].find(']')+1:] if ']' in parts[1] else ""
+
+    # Check if there's another bracketed section after the title
+    if '[' in remaining_text and ']' in remaining_text:
+        tech_start = remaining_text.find('[') + 1
+        tech_end = remaining_text.find(']', tech_start)
+        if tech_start < tech_end:
+            tech = remaining_text[tech_start:tech_end].strip()
+
+            # Clean up technology string
+            if tech.lower().startswith("tech="):
+                tech = tech[5:].strip()
+
+    # If no technology info found, try to extract from HTTP headers or other patterns
+    if tech == "Unknown" and "wordpress" in url.lower():
+        tech = "WordPress"
+    elif tech == "Unknown" and "wp-" in url.lower():
+        tech = "WordPress"
+    elif tech == "Unknown" and "joomla" in url.lower():
+        tech = "Joomla"
+    elif tech == "Unknown" and "drupal" in url.lower():
+        tech = "Drupal"
+
+    # Clean up status code (remove any remaining color codes or spaces)
+    status_code = re.sub(r'[^0-9]', '', status_code) or "Unknown"
+
+    return {
+        'url': url,
+        'status_code': status_code,
+        'status_class': get_status_class(status_code),
+        'technology': tech
+    }
+
+def get_status_class(status_code):
+    """Determine the status class used for color coding in the UI."""
+    if not str(status_code).isdigit():
+        return ''
+    code = int(status_code)
+    if 200 <= code < 300:
+        return 'success'  # Green
+    elif 300 <= code < 400:
+        return 'redirect'  # Blue
+    elif 400 <= code < 500:
+        return 'client-error'  # Red
+    elif 500 <= code < 600:
+        return 'server-error'  # Red
+    return ''
 
 def parse_httpx_output(file_path):
     """Parse Httpx output to extract live hosts."""
     if not os.path.exists(file_path):
         return []
 
-    # Regular expression to remove ANSI color codes
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-
     live_hosts = []
     with open(file_path, 'r') as f:
         for line in f:
-            # Remove ANSI color codes
-            line = ansi_escape.sub('', line.strip())
-            if not line:
-                continue
-
-            # Parse line format: https://example.com [200] [Page Title]
-            parts = line.split(' ', 1)
-            if len(parts) < 2:
-                continue
-
-            url = parts[0]
-
-            # Extract status code
-            status_code = "Unknown"
-            if '[' in parts[1] and ']' in parts[1]:
-                status_start = parts[1].find('[') + 1
-                status_end = parts[1].find(']', status_start)
-                if status_start < status_end:
-                    status_code = parts[1][status_start:status_end].strip()
-
-            # We're not extracting title anymore
-            title = ""
-
-            # Extract technology if available
-            tech = "Unknown"
-            remaining_text = parts[1][parts[1].find(']')+1:] if ']' in parts[1] else ""
-
-            # Check if there's another bracketed section after the title
-            if '[' in remaining_text and ']' in remaining_text:
-                tech_start = remaining_text.find('[') + 1
-                tech_end = remaining_text.find(']', tech_start)
-                if tech_start < tech_end:
-                    tech = remaining_text[tech_start:tech_end].strip()
-
-                    # Clean up technology string
-                    if tech.lower().startswith("tech="):
-                        tech = tech[5:].strip()
-
-            # If no technology info found, try to extract from HTTP headers or other patterns
-            if tech == "Unknown" and "wordpress" in url.lower():
-                tech = "WordPress"
-            elif tech == "Unknown" and "wp-" in url.lower():
-                tech = "WordPress"
-            elif tech == "Unknown" and "joomla" in url.lower():
-                tech = "Joomla"
-            elif tech == "Unknown" and "drupal" in url.lower():
-                tech = "Drupal"
-
-            # Clean up status code (remove any remaining color codes or spaces)
-            status_code = re.sub(r'[^0-9]', '', status_code) or "Unknown"
-
-            # Determine status class for color coding in the UI
-            status_class = ''
-            if status_code.isdigit():
-                code = int(status_code)
-                if 200 <= code < 300:
-                    status_class = 'success'  # Green
-                elif 300 <= code < 400:
-                    status_class = 'redirect'  # Blue
-                elif 400 <= code < 500:
-                    status_class = 'client-error'  # Red
-                elif 500 <= code < 600:
-                    status_class = 'server-error'  # Red
-
-            live_hosts.append({
-                'url': url,
-                'status_code': status_code,
-                'status_class': status_class,
-                'technology': tech
-            })
+            host = parse_httpx_line(line)
+            if host:
+                live_hosts.append(host)
 
     return live_hosts
 
+def url_host(url):
+    """Get the lowercased hostname of a URL, or None if it has none."""
+    try:
+        host = urlparse(url if '://' in url else f"//{url}").hostname
+    except ValueError:
+        return None
+    return host.lower().rstrip('.') if host else None
+
 def parse_gau_output(file_path):
     """Parse Gau output to extract URLs."""
-    print(f"Parsing GAU output from file: {file_path}")
+    logger.debug("Parsing GAU output from file: %s", file_path)
 
     if not os.path.exists(file_path):
-        print(f"GAU output file does not exist: {file_path}")
+        logger.info("GAU output file does not exist: %s", file_path)
         return []
 
     try:
         with open(file_path, 'r') as f:
             urls = [line.strip() for line in f if line.strip()]
-            print(f"Parsed {len(urls)} URLs from GAU output")
+            logger.info("Parsed %s URLs from GAU output", len(urls))
 
-            # Print a sample of the URLs for debugging
+            # Log a sample of the URLs for debugging
             if urls:
-                sample = urls[:5] if len(urls) > 5 else urls
-                print(f"Sample URLs: {sample}")
+                logger.debug("Sample URLs: %s", urls[:5])
             else:
-                print("No URLs found in GAU output file")
+                logger.info("No URLs found in GAU output file")
 
             return urls
     except Exception as e:
-        print(f"Error parsing GAU output: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error parsing GAU output: %s", e)
         return []
 
-def run_subdomain_enumeration(domain, scan_dir, session_id, update_callback=None):
-    """Run all subdomain enumeration tools concurrently."""
-    print(f"run_subdomain_enumeration: Starting for domain {domain}, session_id {session_id}")
-    print(f"run_subdomain_enumeration: Scan directory: {scan_dir}")
-
-    # Create output files
-    subfinder_file = os.path.join(scan_dir, 'subfinder.txt')
-    assetfinder_file = os.path.join(scan_dir, 'assetfinder.txt')
-    chaos_file = os.path.join(scan_dir, 'chaos.txt')
-    sublist3r_file = os.path.join(scan_dir, 'sublist3r.txt')
-
-    print(f"run_subdomain_enumeration: Output files created")
-
-    # Store results
-    results = {
-        'subfinder': [],
-        'assetfinder': [],
-        'chaos': [],
-        'sublist3r': []
-    }
+# Subdomain enumeration tools: (tool status key, output file, job builder)
+ENUMERATION_TOOLS = [
+    ('subfinder', 'subfinder.txt', subfinder_job),
+    ('assetfinder', 'assetfinder.txt', assetfinder_job),
+    ('chaos', 'chaos.txt', chaos_job),
+    ('sublist3r', 'sublist3r.txt', sublist3r_job),
+]
 
-    # Store errors
-    errors = []
-
-    # Function to run a tool and update progress
-    def run_tool_with_progress(tool_func, tool_name, domain, output_file, results_key):
-        try:
-            if update_callback:
-                update_callback(5, f"Running {tool_name}")
-
-            tool_func(domain, output_file)
-            results[results_key] = parse_subdomains(output_file)
-
-            if update_callback:
-                update_callback(10, f"Completed {tool_name}")
-
-        except Exception as e:
-            errors.append(f"{tool_name} error: {str(e)}")
-            if update_callback:
-                update_callback(10, f"{tool_name} failed: {str(e)}")
-
-    # Check which tools are installed
+def installed_enumerators():
+    """Keys of the installed subdomain enumeration tools, in ENUMERATION_TOOLS order."""
     tool_status = get_tool_status()
-    print(f"Tool status: {tool_status}")
-
-    # Create threads for each tool that is installed
-    threads = []
-
-    if tool_status.get('subfinder', False):
-        threads.append(threading.Thread(target=run_tool_with_progress, args=(run_subfinder, "Subfinder", domain, subfinder_file, 'subfinder')))
-    else:
-        print("Subfinder not installed, skipping")
-        errors.append("Subfinder not installed, skipping")
-
-    if tool_status.get('assetfinder', False):
-        threads.append(threading.Thread(target=run_tool_with_progress, args=(run_assetfinder, "Assetfinder", domain, assetfinder_file, 'assetfinder')))
-    else:
-        print("Assetfinder not installed, skipping")
-        errors.append("Assetfinder not installed, skipping")
-
-    if tool_status.get('chaos', False):
-        threads.append(threading.Thread(target=run_tool_with_progress, args=(run_chaos, "Chaos", domain, chaos_file, 'chaos')))
-    else:
-        print("Chaos not installed, skipping")
-        errors.append("Chaos not installed, skipping")
+    return [key for key, filename, build_job in ENUMERATION_TOOLS if tool_status.get(key, False)]
+
+def build_enumeration_job(key, domain, scan_dir, session_id, update_callback=None, subdomain_callback=None):
+    """
+    Build the enumeration job for one tool from ENUMERATION_TOOLS.
+
+    The job is tied to the tool's result cache slot, so a fresh cached
+    result for the domain is replayed instead of running the tool.
+
+    Returns:
+        tuple: (job, output_file); job is None if the tool isn't configured
+    """
+    filename, build_job = next((filename, build_job) for name, filename, build_job in ENUMERATION_TOOLS
+                               if name == key)
+    output_file = os.path.join(scan_dir, filename)
+
+    job = build_job(domain, output_file, line_callback=subdomain_callback)
+    if job is None:
+        return None, output_file
+    job.group = session_id
+    job.cache = CacheEntry(key, domain, [arg for arg in job.argv[1:] if arg not in (domain, output_file)],
+                           output_file)
+
+    def on_start(job):
+        if update_callback:
+            update_callback(5, f"Running {job.name}")
 
-    if tool_status.get('sublist3r', False):
-        threads.append(threading.Thread(target=run_tool_with_progress, args=(run_sublist3r, "Sublist3r", domain, sublist3r_file, 'sublist3r')))
+    def finish(job, report_results=job.on_complete):
+        if report_results:
+            report_results(job)
+        if update_callback:
+            if job.succeeded:
+                update_callback(10, f"Completed {job.name}")
+            else:
+                update_callback(10, f"{job.name} failed: {job.result}")
+
+    job.on_start = on_start
+    job.on_complete = finish
+    return job, output_file
+
+def merge_enumeration_results(domain, scan_dir, output_files):
+    """Combine and deduplicate the output files of finished enumeration jobs."""
+    if not output_files:
+        logger.info("No subdomain enumeration tools installed, using fallback")
+        fallback = [f"www.{domain}", f"api.{domain}", f"mail.{domain}"]
+        with open(os.path.join(scan_dir, 'subfinder.txt'), 'w') as f:
+            for subdomain in fallback:
+                f.write(f"{subdomain}\n")
+        all_subdomains = fallback
     else:
-        print("Sublist3r not installed, skipping")
-        errors.append("Sublist3r not installed, skipping")
-
-    # If no tools are installed, add a dummy subdomain for testing
-    if not threads:
-        print("No subdomain enumeration tools installed, using fallback")
-        with open(subfinder_file, 'w') as f:
-            f.write(f"www.{domain}\n")
-            f.write(f"api.{domain}\n")
-            f.write(f"mail.{domain}\n")
-        results['subfinder'] = [f"www.{domain}", f"api.{domain}", f"mail.{domain}"]
-
-    # Start all threads
-    for thread in threads:
-        thread.start()
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-
-    # Combine and deduplicate results
-    all_subdomains = []
-    for key, subdomains in results.items():
-        all_subdomains.extend(subdomains)
+        all_subdomains = []
+        for output_file in output_files:
+            all_subdomains.extend(parse_subdomains(output_file))
 
     unique_subdomains = deduplicate_list(all_subdomains)
 
@@ -656,68 +747,223 @@ def run_subdomain_enumeration(domain, scan_dir, session_id, update_callback=None
 
     return unique_subdomains
 
-def run_web_detection(domain, subdomains, scan_dir, session_id, update_callback=None):
-    """Run web detection tools."""
-    # Create output files
-    subdomains_file = os.path.join(scan_dir, 'subdomains.txt')
-    httpx_file = os.path.join(scan_dir, 'httpx.txt')
-    gau_file = os.path.join(scan_dir, 'gau.txt')
-
-    # Ensure subdomains file exists
-    if not os.path.exists(subdomains_file):
-        with open(subdomains_file, 'w') as f:
-            for subdomain in subdomains:
-                f.write(f"{subdomain}\n")
+def prune_wildcard_subdomains(domain, subdomains, scan_dir):
+    """
+    Drop subdomains that only resolve because of a wildcard DNS record.
 
-    # Check which tools are installed
-    tool_status = get_tool_status()
-    print(f"Web detection tool status: {tool_status}")
+    The kept subdomains replace subdomains.txt and the pruned ones are
+    written to wildcard_pruned.txt. DNS failures never lose subdomains:
+    anything that can't be checked is kept.
 
-    # Run Httpx if installed
-    if tool_status.get('httpx', False):
-        try:
-            if update_callback:
-                update_callback(60, "Running Httpx")
+    Returns:
+        tuple: (kept subdomains, pruned subdomains)
+    """
+    if not subdomains or not wildcard_filter_enabled():
+        return subdomains, []
+    try:
+        kept, pruned = orchestrator.run(filter_wildcards(subdomains, domain))
+    except Exception as e:
+        logger.error("prune_wildcard_subdomains: Wildcard detection for %s failed: %s", domain, e)
+        return subdomains, []
+    if not pruned:
+        return subdomains, []
 
-            run_httpx(subdomains_file, httpx_file)
-            live_hosts = parse_httpx_output(httpx_file)
+    with open(os.path.join(scan_dir, 'subdomains.txt'), 'w') as f:
+        for subdomain in kept:
+            f.write(f"{subdomain}\n")
+    with open(os.path.join(scan_dir, 'wildcard_pruned.txt'), 'w') as f:
+        for subdomain in pruned:
+            f.write(f"{subdomain}\n")
+    return kept, pruned
+
+def resolve_subdomains(subdomains, scan_dir):
+    """
+    Resolve subdomains on the shared resolver pool before probing them.
+
+    Names the nameservers answered for without any address (NXDOMAIN or no
+    A/AAAA records) are written to unresolved.txt and left out, so Httpx
+    isn't spent on them. Names whose lookups failed outright are kept, as
+    are all of them if resolution is disabled or fails.
+
+    Returns:
+        tuple: (resolvable subdomains, unresolvable subdomains, a dict of
+        subdomain -> {'a', 'aaaa', 'cname'} lists for every name that got
+        an answer)
+    """
+    if not subdomains or not dns_resolution_enabled():
+        return list(subdomains), [], {}
+    try:
+        answers = orchestrator.run(shared_resolver().resolve_hosts(subdomains))
+    except Exception as e:
+        logger.error("resolve_subdomains: DNS resolution failed: %s", e)
+        return list(subdomains), [], {}
+
+    resolvable = []
+    unresolvable = []
+    records = {}
+    for name in subdomains:
+        answer = answers[name]
+        if answer.resolved or answer.failed:
+            resolvable.append(name)
+        else:
+            unresolvable.append(name)
+        if not answer.failed:
+            records[name] = {
+                'a': sorted(answer.ipv4.addresses),
+                'aaaa': sorted(answer.ipv6.addresses),
+                'cname': answer.cnames
+            }
+
+    with open(os.path.join(scan_dir, 'unresolved.txt'), 'w') as f:
+        for subdomain in unresolvable:
+            f.write(f"{subdomain}\n")
+    logger.info("resolve_subdomains: %s of %s subdomains resolve", len(resolvable), len(subdomains))
+    return resolvable, unresolvable, records
+
+def resolve_host_ips(hosts):
+    """
+    Look up the IPv4 addresses of hosts on the shared resolver pool.
+
+    Returns:
+        dict: Host -> sorted addresses; empty for hosts that didn't resolve,
+        and for all of them if resolution is disabled or fails
+    """
+    if not hosts or not dns_resolution_enabled():
+        return {host: [] for host in hosts}
+    try:
+        answers = orchestrator.run(shared_resolver().resolve_hosts(hosts))
+    except Exception as e:
+        logger.error("resolve_host_ips: DNS resolution failed: %s", e)
+        return {host: [] for host in hosts}
+    return {host: sorted(answers[host].ipv4.addresses) for host in hosts}
+
+class HttpxPipeline:
+    """
+    A long-running Httpx job that probes hosts as they are submitted.
+
+    Hosts are written to httpx's stdin through a StdinFeed, and each result
+    line is parsed and handed to live_host_callback as soon as httpx prints
+    it. submit() is thread-safe and ignores hosts that were already submitted.
+
+    Submitted hosts are screened in batches on their way to httpx: claim, a
+    blocking callable run off the loop, returns the ones this pipeline may
+    probe; wildcard answers within domain are pruned and names that don't
+    resolve are left out, as prune_wildcard_subdomains and resolve_subdomains
+    would. A failed check keeps the hosts. probed lists the hosts httpx got.
+    """
+
+    def __init__(self, output_file, live_host_callback=None, timeout=PIPELINE_TIMEOUT, group=None, domain=None,
+                 claim=None):
+        self.live_host_callback = live_host_callback
+        self.live_hosts = []
+        self.submitted = set()
+        self.probed = []
+        self.domain = domain
+        self.claim = claim
+        self.fingerprints = {}
+        self.feed = StdinFeed(stage=self._screen)
+        self.job = ToolJob(
+            "Httpx",
+            httpx_command(),
+            output_file,
+            timeout=timeout,
+            line_callback=self._on_line,
+            stdin=self.feed,
+            group=group
+        )
 
-            if update_callback:
-                update_callback(80, "Completed Httpx")
+    @property
+    def result(self):
+        return self.job.result
+
+    def _on_line(self, line):
+        host = parse_httpx_line(line)
+        if not host:
+            return
+        self.live_hosts.append(host)
+        if self.live_host_callback:
+            try:
+                self.live_host_callback(host)
+            except Exception as e:
+                logger.error("HttpxPipeline: live host callback failed: %s", e)
+
+    async def _screen(self, hosts):
+        if self.claim:
+            hosts = await asyncio.get_running_loop().run_in_executor(None, self.claim, hosts)
+        if hosts and self.domain and wildcard_filter_enabled():
+            try:
+                hosts, pruned = await filter_wildcards(hosts, self.domain, fingerprints=self.fingerprints)
+            except Exception as e:
+                logger.error("HttpxPipeline: Wildcard detection failed, keeping %s hosts: %s", len(hosts), e)
+        if hosts and dns_resolution_enabled():
+            try:
+                answers = await shared_resolver().resolve_hosts(hosts)
+                hosts = [host for host in hosts if answers[host].resolved or answers[host].failed]
+            except Exception as e:
+                logger.error("HttpxPipeline: DNS resolution failed, keeping %s hosts: %s", len(hosts), e)
+        self.probed.extend(hosts)
+        return hosts
+
+    def submit(self, subdomain):
+        """Queue a subdomain for probing unless it was already submitted."""
+        subdomain = subdomain.strip()
+        if not subdomain or subdomain.startswith('#') or subdomain in self.submitted:
+            return
+        self.submitted.add(subdomain)
+        self.feed.put(subdomain)
+
+def fallback_live_hosts(subdomains, httpx_file):
+    """Write dummy live hosts for the first few subdomains when Httpx isn't installed."""
+    live_hosts = []
+    for subdomain in subdomains[:5]:  # Limit to first 5 subdomains
+        live_hosts.append({
+            'url': f"https://{subdomain}",
+            'status_code': '200',
+            'title': 'Example Page'
+        })
+
+    # Save dummy results
+    with open(httpx_file, 'w') as f:
+        for host in live_hosts:
+            f.write(f"{host['url']} [{host['status_code']}] [{host['title']}]\n")
+    return live_hosts
 
-        except Exception as e:
-            if update_callback:
-                update_callback(80, f"Httpx failed: {str(e)}")
-            live_hosts = []
-    else:
-        print("Httpx not installed, using fallback")
-        if update_callback:
-            update_callback(80, "Httpx not installed, using fallback")
-
-        # Create dummy live hosts for testing
-        live_hosts = []
-        for subdomain in subdomains[:5]:  # Limit to first 5 subdomains
-            live_hosts.append({
-                'url': f"https://{subdomain}",
-                'status_code': '200',
-                'title': 'Example Page'
-            })
-
-        # Save dummy results
-        with open(httpx_file, 'w') as f:
+def probe_hosts(hosts, scan_dir, name, live_host_callback=None, group=None):
+    """
+    Probe one chunk of hosts with Httpx.
+
+    The chunk is written to <name>.hosts and Httpx output goes to <name>.txt
+    in scan_dir, so chunks probed in parallel never share a file.
+
+    Returns:
+        list: Live hosts found in the chunk
+    """
+    hosts_file = os.path.join(scan_dir, f"{name}.hosts")
+    httpx_file = os.path.join(scan_dir, f"{name}.txt")
+    with open(hosts_file, 'w') as f:
+        for host in hosts:
+            f.write(f"{host}\n")
+
+    if not check_tool_installed('httpx'):
+        logger.info("Httpx not installed, using fallback")
+        live_hosts = fallback_live_hosts(hosts, httpx_file)
+        if live_host_callback:
             for host in live_hosts:
-                f.write(f"{host['url']} [{host['status_code']}] [{host['title']}]\n")
-
-    # Don't run GAU automatically - it will be triggered manually by the user
-    print("Skipping GAU - will be triggered manually by the user")
-    if update_callback:
-        update_callback(95, "Skipping GAU - will be triggered manually by the user")
+                live_host_callback(host)
+        return live_hosts
 
-    # Create empty URLs list - we won't generate initial URLs anymore
-    urls = []
+    live_hosts = []
 
-    # Create an empty GAU file as a placeholder
-    with open(gau_file, 'w') as f:
-        f.write(f"# GAU will be run manually by the user\n")
+    def on_live_host(host):
+        live_hosts.append(host)
+        if live_host_callback:
+            live_host_callback(host)
 
-    return live_hosts, urls
+    run_httpx(hosts_file, httpx_file, live_host_callback=on_live_host, group=group)
+    if not live_hosts:
+        # run_httpx may have written fallback results instead
+        live_hosts = parse_httpx_output(httpx_file)
+        if live_host_callback:
+            for host in live_hosts:
+                live_host_callback(host)
+    return live_hosts
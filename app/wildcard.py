@@ -0,0 +1,199 @@
+"""
+Wildcard DNS detection.
+
+Zones with a wildcard record (``*.example.com``) make every made-up name
+resolve, so passive sources and brute forcing return thousands of junk
+hostnames that all lead to the same place, and Httpx spends most of a scan
+probing them. Before probing, each parent zone of the enumerated subdomains
+is asked for a few random labels that cannot exist. If they resolve, the
+wildcard answer is fingerprinted: the set of addresses it returns, a hash
+of its CNAME chain, and a hash of the page the random labels are served.
+
+A real host on a CDN or load balancer can resolve exactly like the
+wildcard, so DNS alone isn't enough to drop a subdomain: the ones whose
+answer matches are fetched too, and only those that are also served the
+wildcard's page are dropped. Only the random labels and those candidates
+are ever fetched. Set WILDCARD_FILTER=false to keep everything.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import ssl
+import string
+
+from app.dns_resolver import shared_resolver
+
+logger = logging.getLogger(__name__)
+
+# Random labels resolved per zone to detect and fingerprint a wildcard
+WILDCARD_PROBES = int(os.environ.get('WILDCARD_PROBES', 3))
+
+# Where a page is fetched from, tried in order until one answers
+WILDCARD_HTTP_PORTS = (('https', 443), ('http', 80))
+
+# Seconds allowed per page fetch
+WILDCARD_HTTP_TIMEOUT = float(os.environ.get('WILDCARD_HTTP_TIMEOUT', 5))
+
+# Only the start of a page is hashed
+WILDCARD_HTTP_MAX_BYTES = 64 * 1024
+
+# Candidate pages fetched at once
+WILDCARD_HTTP_MAX_IN_FLIGHT = int(os.environ.get('WILDCARD_HTTP_MAX_IN_FLIGHT', 50))
+
+
+def wildcard_filter_enabled():
+    return os.environ.get('WILDCARD_FILTER', 'True').lower() == 'true'
+
+
+def random_label():
+    """A label no real zone is going to have."""
+    return 'wrl-' + ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(16))
+
+
+def cname_hash(answer):
+    """Hash of the CNAME chain of an answer; the same for every name a wildcard covers."""
+    return hashlib.sha1('|'.join(answer.cnames).encode()).hexdigest()
+
+
+def parent_zone(subdomain):
+    return subdomain.split('.', 1)[1] if '.' in subdomain else None
+
+
+async def http_get(name, address, port, ssl_context=None):
+    """Send GET / for name to address and return up to WILDCARD_HTTP_MAX_BYTES of the response."""
+    reader, writer = await asyncio.open_connection(
+        address, port, ssl=ssl_context, server_hostname=name if ssl_context else None)
+    try:
+        # HTTP/1.0 so the body is never chunked and ends at EOF
+        writer.write(f"GET / HTTP/1.0\r\nHost: {name}\r\nUser-Agent: WebReconLite\r\n\r\n".encode())
+        await writer.drain()
+        data = b''
+        while len(data) < WILDCARD_HTTP_MAX_BYTES:
+            chunk = await reader.read(WILDCARD_HTTP_MAX_BYTES - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+    finally:
+        writer.close()
+
+
+async def page_hash(name, answer):
+    """
+    Hash of the page name is served at one of its addresses, or None if nothing answers.
+
+    The hash covers the status code, the redirect target and the body, with
+    the name itself blanked out since wildcard pages often echo it.
+    """
+    address = sorted(answer.addresses, key=lambda address: (':' in address, address))[0]
+    for scheme, port in WILDCARD_HTTP_PORTS:
+        ssl_context = None
+        if scheme == 'https':
+            # Wildcard certificates rarely match a made-up name; only the page matters here
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        try:
+            response = await asyncio.wait_for(http_get(name, address, port, ssl_context), WILDCARD_HTTP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            continue
+        head, _, body = response.partition(b'\r\n\r\n')
+        lines = head.split(b'\r\n')
+        status = lines[0].split()
+        if len(status) < 2 or not status[0].startswith(b'HTTP/'):
+            continue
+        location = b''.join(line.split(b':', 1)[1].strip() for line in lines[1:]
+                            if line.lower().startswith(b'location:'))
+        blank = re.compile(re.escape(name.encode()), re.IGNORECASE)
+        digest = hashlib.sha1(b'\n'.join([scheme.encode(), status[1], blank.sub(b'', location), blank.sub(b'', body)]))
+        return digest.hexdigest()
+    return None
+
+
+class WildcardFingerprint:
+    """
+    What a zone's wildcard resolves to.
+
+    Round-robin wildcards answer with different addresses from one query to
+    the next, so the addresses of every probe are pooled and an answer
+    matches if all of its addresses are in the pool. Page hashes are pooled
+    the same way; None stands for a wildcard whose addresses serve nothing.
+    """
+
+    def __init__(self, zone, answers, page_hashes):
+        self.zone = zone
+        self.addresses = set()
+        self.cname_hashes = set()
+        for answer in answers:
+            self.addresses |= answer.addresses
+            self.cname_hashes.add(cname_hash(answer))
+        self.page_hashes = set(page_hashes)
+
+    def matches_dns(self, answer):
+        return (answer.resolved and answer.addresses <= self.addresses
+                and cname_hash(answer) in self.cname_hashes)
+
+    def matches_page(self, page):
+        return page in self.page_hashes
+
+
+async def detect_wildcard(resolver, zone):
+    """Return the zone's WildcardFingerprint, or None if it has no wildcard."""
+    labels = [f"{random_label()}.{zone}" for _ in range(WILDCARD_PROBES)]
+    answers = await asyncio.gather(*(resolver.resolve(label) for label in labels))
+    probes = [(label, answer) for label, answer in zip(labels, answers) if answer.resolved]
+    if not probes:
+        return None
+    pages = await asyncio.gather(*(page_hash(label, answer) for label, answer in probes))
+    fingerprint = WildcardFingerprint(zone, [answer for _, answer in probes], pages)
+    logger.info("wildcard: %s has a wildcard record answering with %s", zone, sorted(fingerprint.addresses))
+    return fingerprint
+
+
+async def filter_wildcards(subdomains, domain, resolver=None, fingerprints=None):
+    """
+    Split subdomains into the ones to keep and the ones a wildcard answers for.
+
+    Only zones within the scanned domain are checked, only subdomains in a
+    zone that turned out to have a wildcard are resolved, and only those
+    whose answer matches the wildcard's are fetched. Callers filtering a
+    stream of batches can pass the same fingerprints dict (zone ->
+    WildcardFingerprint or None) to every call so each zone is only
+    checked once.
+
+    Returns:
+        tuple: (kept subdomains, pruned subdomains), both in input order
+    """
+    resolver = resolver or shared_resolver()
+    domain = domain.lower().rstrip('.')
+    if fingerprints is None:
+        fingerprints = {}
+
+    zones = {zone for zone in (parent_zone(name) for name in subdomains)
+             if zone and (zone == domain or zone.endswith('.' + domain)) and zone not in fingerprints}
+    fingerprints.update(zip(zones, await asyncio.gather(*(detect_wildcard(resolver, zone) for zone in zones))))
+    if not any(fingerprints.get(parent_zone(name)) for name in subdomains):
+        return list(subdomains), []
+
+    http_slots = asyncio.Semaphore(WILDCARD_HTTP_MAX_IN_FLIGHT)
+
+    async def is_wildcard(name):
+        fingerprint = fingerprints.get(parent_zone(name))
+        if fingerprint is None:
+            return False
+        answer = await resolver.resolve(name)
+        if not fingerprint.matches_dns(answer):
+            return False
+        async with http_slots:
+            page = await page_hash(name, answer)
+        return fingerprint.matches_page(page)
+
+    verdicts = await asyncio.gather(*(is_wildcard(name) for name in subdomains))
+    kept = [name for name, pruned in zip(subdomains, verdicts) if not pruned]
+    pruned = [name for name, pruned in zip(subdomains, verdicts) if pruned]
+    logger.info("wildcard: Pruned %s of %s subdomains of %s answered by a wildcard", len(pruned), len(subdomains), domain)
+    return kept, pruned
@@ -1,17 +1,22 @@
 from celery import Celery
+import logging
 import os
 from dotenv import load_dotenv
+from app.logging_config import configure_logging
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+
+logger = logging.getLogger(__name__)
 
 # Get Redis connection details
 broker_url = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 result_backend = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
 # Print Redis connection details for debugging
-print(f"Celery broker URL: {broker_url}")
-print(f"Celery result backend: {result_backend}")
+logger.info("Celery broker URL: %s", broker_url)
+logger.info("Celery result backend: %s", result_backend)
 
 # Create Celery instance
 celery = Celery(
@@ -46,34 +51,47 @@ celery.conf.update(
 # Optional: Load tasks module
 celery.autodiscover_tasks(['app.tasks'])
 
-# Print Celery configuration for debugging
-print("Celery configuration:")
-for key, value in celery.conf.items():
-    print(f"  {key}: {value}")
+# Log Celery configuration for debugging
+if logger.isEnabledFor(logging.DEBUG):
+    for key, value in celery.conf.items():
+        logger.debug("Celery config %s: %s", key, value)
 
 # Set up signal handlers for debugging
-from celery.signals import task_received, task_prerun, task_success, task_failure, task_revoked, worker_ready
+from celery.signals import (task_received, task_prerun, task_success, task_failure, task_revoked, worker_ready,
+                            setup_logging)
+
+@setup_logging.connect
+def setup_logging_handler(**kwargs):
+    # Keep our handlers and levels instead of Celery's default logging setup
+    configure_logging()
 
 @task_received.connect
 def task_received_handler(request, **kwargs):
-    print(f"Task received: {request.id}, {request.task}")
+    logger.debug("Task received: %s, %s", request.id, request.task)
 
 @task_prerun.connect
 def task_prerun_handler(task_id, task, **kwargs):
-    print(f"Task about to run: {task_id}, {task.__name__}")
+    logger.debug("Task about to run: %s, %s", task_id, task.__name__)
 
 @task_success.connect
 def task_success_handler(sender, result, **kwargs):
-    print(f"Task succeeded: {sender.request.id}, result: {result}")
+    logger.info("Task succeeded: %s", sender.request.id)
+    # Results can hold every URL or port of a scan; only summarise them
+    if logger.isEnabledFor(logging.DEBUG):
+        summary = sorted(result) if isinstance(result, dict) else type(result).__name__
+        logger.debug("Task %s result fields: %s", sender.request.id, summary)
 
 @task_failure.connect
 def task_failure_handler(sender, task_id, exception, traceback, **kwargs):
-    print(f"Task failed: {task_id}, exception: {exception}")
+    logger.error("Task failed: %s, exception: %s", task_id, exception)
 
 @task_revoked.connect
 def task_revoked_handler(request, terminated, signum, expired, **kwargs):
-    print(f"Task revoked: {request.id}, terminated: {terminated}")
+    logger.info("Task revoked: %s, terminated: %s", request.id, terminated)
 
 @worker_ready.connect
 def worker_ready_handler(**kwargs):
-    print("Celery worker is ready!")
+    logger.info("Celery worker is ready!")
+    # Fingerprint tool binaries once so tasks pick the right flags immediately
+    from app.capabilities import fingerprint_all
+    fingerprint_all()
@@ -175,6 +175,10 @@ else
     echo "Skipping initialization."
 fi
 
-# Start Gunicorn
+# Fingerprint tool versions and flags once; workers read the cached result
+echo "Fingerprinting tool capabilities..."
+python -c "from app.capabilities import fingerprint_all; fingerprint_all()" || echo "Tool fingerprinting failed, workers will probe on demand"
+
+# Start Gunicorn; threaded workers keep /events streams from blocking other requests
 echo "Starting Gunicorn..."
-exec gunicorn --bind 0.0.0.0:8001 --workers 4 --timeout 120 --log-level debug wsgi:app
+exec gunicorn --bind 0.0.0.0:8001 --workers 4 --worker-class gthread --threads 16 --timeout 120 --log-level debug wsgi:app
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+IP-level port scan deduplication test.
+
+Resolves subdomains against the stub DNS server from test_wildcard_dns,
+checks that plan_port_scan asks for each shared IP once, skips CDN
+addresses and reuses recent scans, and that ports stored for an IP reach
+every subdomain behind it. Run with pytest or directly:
+python test_port_dedup.py
+"""
+import os
+import tempfile
+
+import app.database as database
+from test_wildcard_dns import StubDnsServer, WILDCARD_ADDRESSES
+
+HOSTS = ['www.example.com', 'a.wild.example.com', 'b.wild.example.com', 'c.wild.example.com', 'api.example.com']
+
+
+def test_shared_ips_are_scanned_once():
+    from app.tasks import plan_port_scan
+
+    old_db_file = database.DB_FILE
+    old_resolvers = os.environ.get('DNS_RESOLVERS')
+    with StubDnsServer() as server, tempfile.TemporaryDirectory() as data_dir:
+        database.close_db_connection()
+        database.DB_FILE = os.path.join(data_dir, 'ports.db')
+        os.environ['DNS_RESOLVERS'] = f"{server.address[0]}:{server.address[1]}"
+        try:
+            assert database.init_db()
+            domain_id = database.add_domain('example.com')
+            subdomain_ids = database.upsert_subdomains(domain_id, HOSTS)
+
+            # The three wildcard hosts share the wildcard's addresses; api doesn't resolve
+            targets, cdn_hosts = plan_port_scan(subdomain_ids)
+            assert cdn_hosts == []
+            wildcard_ips = [target for target in targets if target in WILDCARD_ADDRESSES]
+            assert wildcard_ips and len(targets) == len(wildcard_ips) + 2
+            assert '10.0.0.5' in targets and targets[-1] == 'api.example.com'
+
+            ip_ids = database.get_ip_ids(targets)
+            assert database.record_ip_ports({ip_ids[address]: [22, 80] for address in wildcard_ips})
+            database.fan_out_ip_ports(list(ip_ids.values()))
+            for host in HOSTS[1:4]:
+                assert database.get_naabu_results(subdomain_ids[host]) == [22, 80]
+            # www's IP has no stored ports, so it isn't marked scanned
+            scanned = {row['Subdomain']: row['NaabuScanned'] for row in database.get_scanned_subdomains(domain_id)}
+            assert scanned['www.example.com'] == 0 and scanned['a.wild.example.com'] == 1
+
+            # Scanned IPs are reused; 10.0.0.5 found nothing and is asked for again
+            assert plan_port_scan(subdomain_ids) == (['10.0.0.5', 'api.example.com'], [])
+        finally:
+            database.close_db_connection()
+            database.DB_FILE = old_db_file
+            if old_resolvers is None:
+                del os.environ['DNS_RESOLVERS']
+            else:
+                os.environ['DNS_RESOLVERS'] = old_resolvers
+
+
+def test_cdn_addresses_are_not_scanned():
+    from app.cdn import is_cdn_address
+
+    assert is_cdn_address('104.16.1.1')
+    assert is_cdn_address('2606:4700::1111')
+    assert not is_cdn_address('10.0.0.5')
+    assert not is_cdn_address('not-an-ip')
+
+
+if __name__ == "__main__":
+    test_shared_ips_are_scanned_once()
+    test_cdn_addresses_are_not_scanned()
+    print("Shared IPs are port scanned once")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Query plan regression test for the history queries.
+
+Runs each history function against a scratch database, captures the SQL it
+executes and checks EXPLAIN QUERY PLAN for full table scans or temporary
+sort B-trees. Run with pytest or directly: python test_query_plans.py
+"""
+import os
+import re
+import tempfile
+
+import app.database as database
+
+# Tables that grow with scan results and must always be searched by index
+LARGE_TABLES = ('SUBDOMAINS', 'GAU_TABLE', 'NAABU_TABLE', 'NUCLEI_TABLE')
+
+TABLE_ALIASES = {'s': 'SUBDOMAINS', 'd': 'DOMAINS'}
+
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)')
+
+
+def seed():
+    """Add a few domains with scanned subdomains."""
+    for n in range(5):
+        domain = f"example{n}.com"
+        domain_id = database.add_domain(domain)
+        subdomain_ids = database.upsert_subdomains(domain_id, [f"host{i}.{domain}" for i in range(50)])
+        subdomain_id = subdomain_ids[f"host1.{domain}"]
+        database.add_gau_results_batch(subdomain_id, [f"https://host1.{domain}/{i}" for i in range(20)])
+        database.add_naabu_results_batch(subdomain_id, [22, 80, 443])
+        database.add_nuclei_result(subdomain_id, "exposed-panel", "high", "details")
+        for scan_type in ('GauScanned', 'NaabuScanned', 'NucleiScanned'):
+            database.update_subdomain_scan_status(subdomain_id, scan_type, 1)
+    return domain_id, subdomain_id
+
+
+def capture_queries(conn, calls):
+    """Run each call and collect the SELECT statements it executed."""
+    statements = []
+
+    def trace(statement):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    conn.set_trace_callback(trace)
+    try:
+        for call in calls:
+            call()
+    finally:
+        conn.set_trace_callback(None)
+    return statements
+
+
+def plan_problems(conn, statement):
+    """Return the plan steps of a statement that scan a large table or sort in a temp B-tree."""
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}"):
+        detail = row[3]
+        match = SCAN_PATTERN.match(detail)
+        if match and TABLE_ALIASES.get(match.group(1), match.group(1)) in LARGE_TABLES:
+            problems.append(detail)
+        if 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems
+
+
+def test_history_queries_use_indexes():
+    """Every history query must be served by an index."""
+    old_db_file = database.DB_FILE
+    with tempfile.TemporaryDirectory() as data_dir:
+        database.close_db_connection()
+        database.DB_FILE = os.path.join(data_dir, 'plans.db')
+        try:
+            assert database.init_db()
+            conn = database.get_db_connection()
+            domain_id, subdomain_id = seed()
+
+            statements = capture_queries(conn, [
+                database.get_domains_with_scans,
+                lambda: database.get_scanned_subdomains(domain_id),
+                lambda: database.get_subdomain_details(subdomain_id),
+                lambda: database.get_gau_results(subdomain_id),
+                lambda: database.get_naabu_results(subdomain_id),
+                lambda: database.get_nuclei_results(subdomain_id),
+                lambda: database.get_domains_page(after="example1.com", limit=2),
+                lambda: database.get_subdomains_page(domain_id, after="host1", limit=10),
+                lambda: database.get_subdomains_page(domain_id, limit=10, search="host", status_code="2"),
+                lambda: database.get_gau_results_page(subdomain_id, after="https://", limit=10, search="/1"),
+            ])
+            assert statements, "No history queries were captured"
+
+            failures = {}
+            for statement in statements:
+                problems = plan_problems(conn, statement)
+                if problems:
+                    failures[' '.join(statement.split())] = problems
+            assert not failures, f"History queries without a usable index: {failures}"
+        finally:
+            database.close_db_connection()
+            database.DB_FILE = old_db_file
+
+
+if __name__ == "__main__":
+    test_history_queries_use_indexes()
+    print("All history queries use indexes")
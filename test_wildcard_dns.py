@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Wildcard DNS detection and resolution tests against a local stub DNS server.
+
+The stub serves example.com without a wildcard and wild.example.com with a
+round-robin wildcard behind a CNAME, and a stub web server on the wildcard's
+addresses serves a parked page for every name but one real site. Checks
+that only the names the wildcard answers for are pruned, and that the
+resolution stage drops names that don't exist and caches answers. Run with
+pytest or directly: python test_wildcard_dns.py
+"""
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import app.wildcard as wildcard
+from app.dns_resolver import Resolver, DnsError, build_query, parse_response, read_name, TYPE_A, TYPE_CNAME, TYPE_SOA
+from app.wildcard import filter_wildcards
+
+WILDCARD_ZONE = 'wild.example.com'
+WILDCARD_TARGET = 'lb.example.net'
+# Loopback, so the stub web server can listen on them
+WILDCARD_ADDRESSES = ['127.0.0.1', '127.0.0.2']
+
+# A real site behind the wildcard's load balancer: same DNS answer, its own page
+REAL_SITE = 'shop.wild.example.com'
+
+# Negative answers carry an SOA whose MINIMUM field caps their caching
+SOA_TTL = 600
+SOA_MINIMUM = 60
+
+# Explicit A records; everything else outside the wildcard zone is NXDOMAIN
+RECORDS = {
+    'www.example.com': '10.0.0.5',
+    'real.wild.example.com': '10.0.0.9',
+}
+
+
+def encode_name(name):
+    return b''.join(bytes([len(label)]) + label.encode() for label in name.split('.')) + b'\x00'
+
+
+def a_record(name_bytes, address):
+    return name_bytes + struct.pack('!HHIH', TYPE_A, 1, 300, 4) + socket.inet_aton(address)
+
+
+class StubDnsServer:
+    """Answer A queries on a local UDP port from RECORDS and the wildcard zone."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.address = self.sock.getsockname()
+        self.queries = []
+        self._rotation = 0
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except OSError:
+                return
+            self.sock.sendto(self.answer(data), addr)
+
+    def answer(self, query):
+        query_id = struct.unpack('!H', query[:2])[0]
+        name, offset = read_name(query, 12)
+        question = query[12:offset + 4]
+        self.queries.append(name)
+
+        answers = []
+        if name in RECORDS:
+            answers.append(a_record(b'\xc0\x0c', RECORDS[name]))
+        elif name.endswith('.' + WILDCARD_ZONE):
+            target = encode_name(WILDCARD_TARGET)
+            answers.append(b'\xc0\x0c' + struct.pack('!HHIH', TYPE_CNAME, 1, 300, len(target)) + target)
+            self._rotation += 1
+            answers.append(a_record(target, WILDCARD_ADDRESSES[self._rotation % len(WILDCARD_ADDRESSES)]))
+
+        authority = []
+        if not answers:
+            rdata = encode_name('ns.example.com') + encode_name('admin.example.com') + struct.pack(
+                '!IIIII', 1, 3600, 600, 86400, SOA_MINIMUM)
+            authority.append(encode_name('example.com') + struct.pack('!HHIH', TYPE_SOA, 1, SOA_TTL, len(rdata)) + rdata)
+
+        rcode = 0 if answers else 3
+        header = struct.pack('!HHHHHH', query_id, 0x8180 | rcode, 1, len(answers), len(authority), 0)
+        return header + question + b''.join(answers) + b''.join(authority)
+
+
+class StubHttpHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        host = self.headers.get('Host', '').split(':')[0]
+        body = b'Welcome to the shop' if host == REAL_SITE else f"{host} is parked".encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubHttpServer:
+    """Serve pages on every wildcard address at one port, and point the wildcard filter at it."""
+
+    def __init__(self):
+        self.servers = [ThreadingHTTPServer((WILDCARD_ADDRESSES[0], 0), StubHttpHandler)]
+        self.port = self.servers[0].server_address[1]
+        self.servers += [ThreadingHTTPServer((address, self.port), StubHttpHandler) for address in WILDCARD_ADDRESSES[1:]]
+        self._old_ports = wildcard.WILDCARD_HTTP_PORTS
+
+    def __enter__(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        wildcard.WILDCARD_HTTP_PORTS = (('http', self.port),)
+        return self
+
+    def __exit__(self, *exc_info):
+        wildcard.WILDCARD_HTTP_PORTS = self._old_ports
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+SUBDOMAINS = [
+    'www.example.com',
+    'api.example.com',
+    'real.wild.example.com',
+    'junk1.wild.example.com',
+    'junk2.wild.example.com',
+    'junk3.wild.example.com',
+]
+
+
+def test_wildcard_subdomains_are_pruned():
+    """Names the wildcard answers for are pruned; explicit and apex names are kept."""
+    with StubDnsServer() as server, StubHttpServer():
+        resolver = Resolver(nameservers=[server.address], timeout=1, retries=1)
+        kept, pruned = asyncio.run(filter_wildcards(SUBDOMAINS, 'example.com', resolver))
+
+    assert kept == ['www.example.com', 'api.example.com', 'real.wild.example.com']
+    assert pruned == ['junk1.wild.example.com', 'junk2.wild.example.com', 'junk3.wild.example.com']
+    # The apex zone has no wildcard, so its subdomains are never resolved
+    assert 'www.example.com' not in server.queries and 'api.example.com' not in server.queries
+
+
+def test_real_site_on_wildcard_address_is_kept():
+    """A name that resolves like the wildcard but serves its own page is kept."""
+    with StubDnsServer() as server, StubHttpServer():
+        resolver = Resolver(nameservers=[server.address], timeout=1, retries=1)
+        kept, pruned = asyncio.run(filter_wildcards(SUBDOMAINS + [REAL_SITE], 'example.com', resolver))
+
+    assert REAL_SITE in kept
+    assert pruned == ['junk1.wild.example.com', 'junk2.wild.example.com', 'junk3.wild.example.com']
+
+
+def test_unreachable_resolver_keeps_everything():
+    """DNS failures must never lose subdomains."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    address = sock.getsockname()
+    try:
+        # Bound but never read, so every query times out
+        resolver = Resolver(nameservers=[address], timeout=0.2, retries=0)
+        kept, pruned = asyncio.run(filter_wildcards(SUBDOMAINS, 'example.com', resolver))
+    finally:
+        sock.close()
+
+    assert kept == SUBDOMAINS
+    assert pruned == []
+
+
+def test_prune_wildcard_subdomains_writes_results():
+    """The scan stage rewrites subdomains.txt and records the pruned names."""
+    from app.tools import prune_wildcard_subdomains
+
+    with StubDnsServer() as server, StubHttpServer(), tempfile.TemporaryDirectory() as scan_dir:
+        old_resolvers = os.environ.get('DNS_RESOLVERS')
+        os.environ['DNS_RESOLVERS'] = f"{server.address[0]}:{server.address[1]}"
+        try:
+            kept, pruned = prune_wildcard_subdomains('example.com', SUBDOMAINS, scan_dir)
+        finally:
+            if old_resolvers is None:
+                del os.environ['DNS_RESOLVERS']
+            else:
+                os.environ['DNS_RESOLVERS'] = old_resolvers
+
+        with open(os.path.join(scan_dir, 'subdomains.txt')) as f:
+            assert f.read().split() == kept
+        with open(os.path.join(scan_dir, 'wildcard_pruned.txt')) as f:
+            assert f.read().split() == pruned
+    assert len(pruned) == 3
+
+
+def test_answers_are_cached_for_their_ttl():
+    """Repeat lookups are served from the cache; negative answers use the SOA minimum."""
+    with StubDnsServer() as server:
+        resolver = Resolver(nameservers=[server.address], timeout=1, retries=1)
+
+        async def lookups():
+            first = await resolver.resolve('www.example.com')
+            missing = await resolver.resolve('missing.example.com')
+            await resolver.resolve('www.example.com')
+            await resolver.resolve('missing.example.com')
+            return first, missing
+
+        found, missing = asyncio.run(lookups())
+
+    assert found.addresses == {'10.0.0.5'} and found.ttl == 300
+    assert not missing.resolved and not missing.failed and missing.ttl == SOA_MINIMUM
+    assert server.queries == ['www.example.com', 'missing.example.com']
+
+
+def test_truncated_response_raises_dns_error():
+    """Cut-off datagrams are reported as DnsError, not struct or index errors."""
+    server = StubDnsServer()
+    try:
+        response = server.answer(build_query('real.wild.example.com', TYPE_A, 1234))
+    finally:
+        server.sock.close()
+
+    assert parse_response(response, 1234).records
+    for length in (13, len(response) - 2, len(response) - 12):
+        try:
+            parse_response(response[:length], 1234)
+        except DnsError:
+            continue
+        raise AssertionError(f"A response cut to {length} bytes was accepted")
+
+
+def test_resolve_subdomains_drops_nonexistent_names():
+    """Only resolvable names are kept for probing; lookup failures are kept too."""
+    from app.tools import resolve_subdomains
+
+    with StubDnsServer() as server, tempfile.TemporaryDirectory() as scan_dir:
+        old_resolvers = os.environ.get('DNS_RESOLVERS')
+        os.environ['DNS_RESOLVERS'] = f"{server.address[0]}:{server.address[1]}"
+        try:
+            resolvable, unresolvable, records = resolve_subdomains(
+                ['www.example.com', 'api.example.com', 'real.wild.example.com'], scan_dir)
+        finally:
+            if old_resolvers is None:
+                del os.environ['DNS_RESOLVERS']
+            else:
+                os.environ['DNS_RESOLVERS'] = old_resolvers
+
+        with open(os.path.join(scan_dir, 'unresolved.txt')) as f:
+            assert f.read().split() == ['api.example.com']
+
+    assert resolvable == ['www.example.com', 'real.wild.example.com']
+    assert unresolvable == ['api.example.com']
+    assert records['www.example.com'] == {'a': ['10.0.0.5'], 'aaaa': [], 'cname': []}
+    assert records['api.example.com'] == {'a': [], 'aaaa': [], 'cname': []}
+
+
+if __name__ == "__main__":
+    test_wildcard_subdomains_are_pruned()
+    test_real_site_on_wildcard_address_is_kept()
+    test_unreachable_resolver_keeps_everything()
+    test_prune_wildcard_subdomains_writes_results()
+    test_answers_are_cached_for_their_ttl()
+    test_truncated_response_raises_dns_error()
+    test_resolve_subdomains_drops_nonexistent_names()
+    print("Wildcard DNS detection and resolution work against the stub server")
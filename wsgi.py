@@ -1,19 +1,22 @@
+import logging
 import os
 import sys
 
-# Print current directory and Python path for debugging
-print(f"Current directory: {os.getcwd()}")
-print(f"Python path: {sys.path}")
-
-# Import the Flask application
+# Import the Flask application (this also configures logging)
 from app import create_app
 
+logger = logging.getLogger(__name__)
+
+# Current directory and Python path for debugging
+logger.debug("Current directory: %s", os.getcwd())
+logger.debug("Python path: %s", sys.path)
+
 # Create the Flask application instance
-print("Creating Flask application...")
+logger.info("Creating Flask application...")
 app = create_app()
-print(f"Flask application created: {app}")
+logger.debug("Flask application created: %s", app)
 
 # Run the application if executed directly
 if __name__ == '__main__':
-    print("Starting Flask application...")
+    logger.info("Starting Flask application...")
     app.run(host='0.0.0.0', port=8001, debug=True)